@@ -1,5 +1,6 @@
 from django.db import models
 from django_comments.models import Comment
+from django.contrib.contenttypes.models import ContentType
 
 from django.utils.safestring import mark_safe
 import django.contrib.staticfiles.templatetags.staticfiles as ST
@@ -44,4 +45,76 @@ class RatedComment(Comment):
         r = '<img src="%s" %s>' % (self.get_icon(modifier=modifier), height)
         return mark_safe(r)
     
-    
\ No newline at end of file
+    
+    
+
+class RatingSummary(models.Model):
+    """
+    Denormalized rating counts and verdict of all (not removed) comments
+    attached to one object. Kept up to date by signals on RatedComment.
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_pk = models.CharField(max_length=255)
+
+    fresh = models.IntegerField(default=0)
+    rotten = models.IntegerField(default=0)
+    neutral = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+    percent = models.FloatField(default=0)
+    verdict = models.CharField(max_length=10, default='neutral')
+
+    class Meta:
+        unique_together = ('content_type', 'object_pk')
+
+    def calculate(self, ratings):
+        """
+        Set counts, score and verdict.
+        @param ratings - dict, {rating : number of comments}
+        """
+        self.fresh = ratings.get(1, 0)
+        self.rotten = ratings.get(-1, 0)
+        self.neutral = ratings.get(0, 0)
+        self.total = self.fresh + self.rotten + self.neutral
+
+        self.verdict = 'neutral'
+        self.percent = 0
+        
+        if self.fresh + self.rotten > 0:
+            self.percent = 100. * self.fresh / (self.fresh + self.rotten)
+            if self.percent > 65:
+                self.verdict = 'fresh'
+            elif self.percent < 35:
+                self.verdict = 'rotten'
+            else:
+                self.verdict = 'mixed'
+
+    @classmethod
+    def update(cls, content_type_id, object_pk):
+        """Re-count the comments of one object and save its summary"""
+        comments = RatedComment.objects.filter(content_type__pk=content_type_id,
+                                               object_pk=object_pk,
+                                               is_removed=False)
+        ratings = dict( comments.order_by().values_list('rating')\
+                        .annotate(models.Count('pk')) )
+
+        if not ratings:
+            cls.objects.filter(content_type__pk=content_type_id,
+                               object_pk=object_pk).delete()
+            return None
+
+        r, created = cls.objects.get_or_create(content_type_id=content_type_id,
+                                               object_pk=object_pk)
+        r.calculate(ratings)
+        r.save()
+        return r
+
+
+def comment_changed(sender, instance, **kwargs):
+    """update rating summary after saving or deleting a comment"""
+    RatingSummary.update(instance.content_type_id, instance.object_pk)
+
+## Comment catches is_removed flips saved through the base class
+for sender in (RatedComment, Comment):
+    models.signals.post_save.connect(comment_changed, sender=sender)
+    models.signals.post_delete.connect(comment_changed, sender=sender)
@@ -1,3 +1,5 @@
+import collections, operator
+
 from django.utils.safestring import mark_safe
 from django import template
 import django.utils.html as html
@@ -42,49 +44,77 @@ def recentcomments(n=10):
 
 def get_comments(obj):
     """all comments associated to obj"""
+    if hasattr(obj, '_comment_list'):  ## see attach_comment_summaries
+        return obj._comment_list
+
     ct = CT.ContentType.objects.get_for_model(obj._meta.model)
     comments = CM.RatedComment.objects.filter(content_type__pk=ct.id,
                                               object_pk=obj.id,
                                               is_removed=False)
     return comments
 
+def get_summary(obj):
+    """
+    @return RatingSummary -- comment ratings of obj (unsaved and empty 
+    if there are no comments)
+    """
+    if hasattr(obj, '_comment_summary'):  ## see attach_comment_summaries
+        return obj._comment_summary
+
+    ct = CT.ContentType.objects.get_for_model(obj._meta.model)
+    r = CM.RatingSummary.objects.filter(content_type__pk=ct.id, 
+                                        object_pk=obj.id).first()
+    return r or CM.RatingSummary()
+
+def attach_comment_summaries(objects):
+    """
+    Fetch the comment summaries and comments of many objects (e.g. one
+    page of a table) with one query each and attach them to the objects.
+    Objects can be of different models.
+    """
+    byType = collections.defaultdict(list)
+    for o in objects:
+        ct = CT.ContentType.objects.get_for_model(o._meta.model)
+        byType[ct.id].append(o)
+    
+    if not byType:
+        return
+
+    q = [ models.Q(content_type__pk=ct, 
+                   object_pk__in=[unicode(o.pk) for o in objs])
+          for ct, objs in byType.items() ]
+    q = reduce(operator.or_, q)
+
+    summaries = dict( ((s.content_type_id, s.object_pk), s) 
+                      for s in CM.RatingSummary.objects.filter(q) )
+
+    comments = collections.defaultdict(list)
+    if summaries:
+        qs = CM.RatedComment.objects.filter(q, is_removed=False)
+        for c in qs.order_by('submit_date'):
+            comments[(c.content_type_id, c.object_pk)].append(c)
+
+    for ct, objs in byType.items():
+        for o in objs:
+            key = (ct, unicode(o.pk))
+            o._comment_summary = summaries.get(key, CM.RatingSummary())
+            o._comment_list = comments[key]
+
 def comment_vote_count(obj):
     """
     Return number of rotten, fresh, neutral (no rating)
     @return dict - {'rotten':int, 'fresh':int, 'neutral':int}
     """
-    d = {'fresh':0, 'rotten':0, 'neutral':0, 'comments':[]}
-    
-    comments = get_comments(obj)
-    d['comments'] = comments
-
-    if comments.count() == 0:
-        return d
-    
-    d['neutral'] = comments.filter(rating=0).count()
-    d['fresh'] = comments.filter(rating=1).count()
-    d['rotten'] = comments.filter(rating=-1).count()
-    
+    s = get_summary(obj)
+    d = {'fresh':s.fresh, 'rotten':s.rotten, 'neutral':s.neutral, 
+         'comments':get_comments(obj)}
     return d
 
 def comment_vote_stats(obj):
     """@return dict"""
+    s = get_summary(obj)
     votes = comment_vote_count(obj)
-    total = votes['fresh'] + votes['rotten'] + votes['neutral']
-
-    verdict = 'neutral'
-    percent = 0
-    
-    if votes['fresh'] + votes['rotten'] > 0:
-        percent = 100. * votes['fresh'] / (votes['fresh'] + votes['rotten'])
-        if percent > 65:
-            verdict = 'fresh'
-        elif percent < 35:
-            verdict = 'rotten'
-        else:
-            verdict = 'mixed'
-    
-    votes.update({'total':total, 'verdict':verdict, 'percent':percent})
+    votes.update({'total':s.total, 'verdict':s.verdict, 'percent':s.percent})
     return votes
     
 
@@ -156,7 +186,7 @@ def comment_info_icon(obj, height=0, url=''):
     votes['plural'] = '' if votes['total'] == 1 else 's'
     comments = votes['comments']
     
-    if not comments.count():
+    if not votes['total']:
         return ''
 
     title = ''
@@ -26,10 +26,11 @@ from .utils.customadmin import ViewFirstModelAdmin
 from .utils import adminFilters as filters
 
 from . import forms
+from .utils import importExcel
 from .forms import selectLookups as L
 
 from .adminBase import UserRecordMixin, UserRecordProtectedMixin, \
-     RequestFormMixin, export_csv, UpdateManyMixin
+     RequestFormMixin, export_csv, UpdateManyMixin, XlsExportMixin
 
 from . import adminUser  ## trigger extension of User
 from . import adminComponents ## trigger registration of component admin interfaces
@@ -161,8 +162,10 @@ admin.site.register( M.Unit, UnitAdmin )
 
 
 
-class LocationAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin, UpdateManyMixin):
+class LocationAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin, UpdateManyMixin,
+                    XlsExportMixin):
     form = forms.LocationForm
+    xls_parser = importExcel.ImportXlsLocation
     
     change_form_template = 'admin/rotmic/change_form_viewfirst.html'  ## adapt breadcrums to view first admin
 
@@ -187,15 +190,17 @@ class LocationAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin
 
     save_as = True
     
-    actions = ['make_update']
+    actions = ['make_update', 'make_xlsx']
     exclude_from_update = ['displayId']
     model_lookup = L.LocationLookup
     
 admin.site.register( M.Location, LocationAdmin )
 
 
-class RackAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin, UpdateManyMixin):
+class RackAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin, UpdateManyMixin,
+                XlsExportMixin):
     form = forms.RackForm
+    xls_parser = importExcel.ImportXlsRack
 
     change_form_template = 'admin/rotmic/change_form_viewfirst.html'  ## adapt breadcrums to view first admin
     
@@ -219,7 +224,7 @@ class RackAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin, Up
 
     save_as = True
 
-    actions = ['make_update']
+    actions = ['make_update', 'make_xlsx']
     exclude_from_update = ['displayId']
     model_lookup = L.RackLookup
 
@@ -234,13 +239,16 @@ class RackAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin, Up
                               % (url, unicode(x)) )
     showLocationUrl.allow_tags = True
     showLocationUrl.short_description = 'Location'
+    showLocationUrl.select_related = ('location',)
     
 
 admin.site.register( M.Rack, RackAdmin )
 
 
-class ContainerAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin, UpdateManyMixin):
+class ContainerAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmin, UpdateManyMixin,
+                     XlsExportMixin):
     form = forms.ContainerForm
+    xls_parser = importExcel.ImportXlsContainer
 
     change_form_template = 'admin/rotmic/change_form_viewfirst.html'  ## adapt breadcrums to view first admin
 
@@ -267,7 +275,7 @@ class ContainerAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmi
 
     save_as = True
 
-    actions = ['make_update']
+    actions = ['make_update', 'make_xlsx']
     exclude_from_update = ['displayId']
     model_lookup = L.SampleContainerLookup
 
@@ -282,6 +290,7 @@ class ContainerAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmi
                               % (url, unicode(x)) )
     showLocationUrl.allow_tags = True
     showLocationUrl.short_description = 'Location'
+    showLocationUrl.select_related = ('rack__location',)
 
     def showRackUrl(self, obj):
         """Table display of linked Rack or ''"""
@@ -294,6 +303,7 @@ class ContainerAdmin(UserRecordMixin, reversion.VersionAdmin, ViewFirstModelAdmi
                               % (url, unicode(x)) )
     showRackUrl.allow_tags = True
     showRackUrl.short_description = 'Rack'
+    showRackUrl.select_related = ('rack__location',)
 
 admin.site.register( M.Container, ContainerAdmin )
 
@@ -15,7 +15,7 @@
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
 """Base Admin extensions used by many ModelAdmins"""
 
-import datetime, csv, collections
+import collections, datetime, operator
 
 import django.http as http
 
@@ -25,7 +25,6 @@ import django.contrib.admin.actions as actions
 import django.core.exceptions as core
 
 import django.contrib.messages as messages
-import django.contrib.auth.models as authmodels
 import django.db.models as models
 
 from django.contrib.admin.util import NestedObjects
@@ -35,6 +34,10 @@ import django.utils.html as html
 import django.utils.text as text
 from django.views.decorators.csrf import csrf_protect
 
+from rotmic.models import SearchIndex
+from rotmic.utils.csvexport import iterCsv
+import rotmic.utils.xlsexport as xlsexport
+
 
 class UserRecordMixin:
     """
@@ -72,34 +75,37 @@ class UserRecordProtectedMixin(UserRecordMixin):
 
     permit_delete = ['registeredBy',]
     
+    ## max. number of objects per model checked with a single query
+    delete_chunksize = 500
+    
     actions = ['delete_selected']
 
+    def not_authorized(self, user, queryset, fields=None):
+        """
+        @param queryset: QuerySet, objects of the model managed by this admin
+        @param fields: [str], user or user-list (m2m) fields, default: permit_delete
+        @return QuerySet, those objects of queryset that do not list the user
+        in any of the given fields (none at all if user is superuser)
+        """
+        fields = fields or self.permit_delete
+        
+        if user.is_superuser:
+            return queryset.none()
+        
+        listed = [ models.Q( **{ fieldname.replace('.', '__') : user } )
+                   for fieldname in fields ]
+        return queryset.exclude( reduce(operator.or_, listed) )
+
     def is_authorized(self, user, obj, fields=None):
         """
         @return True, if user is listed in any of the given fields or 
         if user is superuser
         """
-        fields = fields or self.permit_delete
-        userpk = user.pk
-        
         if user.is_superuser:
             return True
         
-        for fieldname in fields:
-            f = eval('obj.%s' % fieldname)
-          
-            if isinstance(f, authmodels.User):
-                if f.pk == userpk:
-                    return True
-
-            elif isinstance(f, models.Manager):
-                if f.filter(id=userpk).exists():
-                    return True
-            else:
-                raise models.ImproperlyConfigured(\
-                    'Cannot match %s to any field of %r' % (fieldname, obj) )
-        
-        return False
+        q = obj._meta.concrete_model._default_manager.filter(pk=obj.pk)
+        return not self.not_authorized(user, q, fields=fields).exists()
         
 
     def has_delete_permission(self, request, obj=None):
@@ -125,17 +131,42 @@ class UserRecordProtectedMixin(UserRecordMixin):
         Find all objects related to ``objs`` that should also be deleted. ``objs``
         must be a homogenous iterable of objects (e.g. a QuerySet).
         """
+        if isinstance(objs, models.query.QuerySet):
+            ## the collector follows parent links of multi-table inheritance
+            ## (and back) one object at a time unless they are already cached;
+            ## child instances carry all fields of their parent anyway
+            parents = [ f for f in objs.model._meta.parents.values() if f ]
+            objs = list( objs )
+            for obj in objs:
+                for f in parents:
+                    parent = f.rel.to( **dict( [ (pf.attname, getattr(obj, pf.attname))
+                                                for pf in f.rel.to._meta.concrete_fields ] ) )
+                    setattr(obj, f.get_cache_name(), parent)
+                    setattr(parent, f.related.get_cache_name(), obj)
+
         collector = NestedObjects(using=DEFAULT_DB_ALIAS)
         collector.collect(objs)
 
+        ## one query per model for all collected objects of this model
+        collected = collections.OrderedDict()
+        for model, obj in collector.instances_with_model():
+            collected.setdefault(obj.__class__, []).append(obj.pk)
+
+        denied = set()
+        for klass, pks in collected.items():
+            admin_instance = admin.site._registry.get(klass, None)
+
+            if admin_instance and hasattr(admin_instance, 'not_authorized'):
+                for i in range(0, len(pks), self.delete_chunksize):
+                    q = klass._default_manager.filter(pk__in=pks[i:i+self.delete_chunksize])
+                    denied.update( [ (klass, pk) for pk in 
+                        admin_instance.not_authorized(user, q).values_list('pk', flat=True) ] )
+
         blocked = []
         
         for model, obj in collector.instances_with_model():
-            admin_instance = admin.site._registry.get(obj.__class__, None)
-
-            if admin_instance and hasattr(admin_instance, 'is_authorized'):
-                if not admin_instance.is_authorized(user, obj):
-                    blocked += [obj]
+            if (obj.__class__, obj.pk) in denied:
+                blocked += [obj]
 
         return blocked
     
@@ -165,19 +196,15 @@ class UserRecordProtectedMixin(UserRecordMixin):
     def delete_selected(self, request, queryset):
         """
         Override the built-in admin.site.delete_selected action to check
-        each object against the is_authorized method.
+        all objects against permit_delete (see not_authorized).
 
         Note: this admin-specific action is only used if 'delete_selected'
         is explicitely included in actions=[...]. Otherwise, the site-wide
         default method is used.
         """
-        blocked = []
+        blocked = list( self.not_authorized(request.user, queryset) )
         blocked_related = []
         
-        for obj in queryset:
-            if not self.is_authorized(request.user, obj):
-                blocked += [ obj ]        
-        
         if not blocked:
             
             blocked_related = self.related_not_authorized(request.user, queryset)
@@ -267,6 +294,18 @@ class RequestFormMixin:
         return ModelFormWithRequestWrapper
 
 
+class FullTextSearchMixin:
+    """
+    ModelAdmin mixin looking up the search box text in the full-text search
+    index (rotmic.models.SearchIndex) of components or samples rather than
+    running a substring query for each of the search_fields. search_fields
+    only has to be non-empty for the search box to be shown.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        return SearchIndex.search( queryset, search_term ), False
+
+
 class UpdateManyMixin:
     """ModelAdmin mixin adding an action method for the multi-object update dialog"""
 
@@ -282,36 +321,42 @@ class UpdateManyMixin:
     make_update.short_description = 'Edit selected records in parallel'
 
 
+class XlsExportMixin:
+    """
+    ModelAdmin mixin adding an action method for exporting records into an
+    Excel table which can be edited and uploaded again.
+    """
+    
+    ## ImportXls sub-class defining the table columns (xlsColumns)
+    xls_parser = None
+
+    def make_xlsx(self, request, queryset):
+        """List view action exporting the selected records as Excel table"""
+        return export_xlsx( request, queryset, self.xls_parser.xlsColumns )
+
+    make_xlsx.short_description = 'Export items as Excel table'
+
+
 def export_csv(request, queryset, fields):
     """
     Helper method for Admin make_csv action. Exports selected objects as 
-    CSV file.
+    CSV file. The file is streamed chunk by chunk (see utils.csvexport).
     fields - OrderedDict of name / field pairs, see Item.make_csv for example
     """
-    response = http.HttpResponse(mimetype='text/csv')
+    response = http.StreamingHttpResponse( iterCsv(queryset, fields),
+                                           content_type='text/csv' )
     response['Content-Disposition'] = 'attachment; filename=rotmic.csv'
-    
-    writer = csv.writer(response)
-    writer.writerow(fields.keys())
-
-    for o in queryset:
-        columns = []
-        for name,value in fields.items():
-            try:
-                value = eval("o.%s"%value)
-                
-                if type(value) not in [str, unicode] \
-                   and isinstance(value, collections.Iterable):
-                    value = ', '.join( [str(v) for v in value ] )
-                
-                columns.append( value )
-            except:
-                columns.append("")  ## capture 'None' fields
-
-        columns = [ c.encode('utf-8') if type(c) is unicode else c \
-                    for c in columns]
-            
-        writer.writerow( columns )
+    return response
 
+
+def export_xlsx(request, queryset, fields):
+    """
+    Helper method for Admin make_xlsx action. Exports selected objects as
+    Excel (.xlsx) table, streamed row by row (see utils.xlsexport).
+    fields - OrderedDict of header / field pairs, see ImportXls.xlsColumns
+    """
+    response = http.StreamingHttpResponse( xlsexport.iterXlsx(queryset, fields),
+                                           content_type=xlsexport.CONTENT_TYPE )
+    name = queryset.model._meta.object_name.lower()
+    response['Content-Disposition'] = 'attachment; filename=rotmic_%s.xlsx' % name
     return response
-    
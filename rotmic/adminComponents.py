@@ -20,6 +20,7 @@ from collections import OrderedDict
 
 from django.contrib import admin, messages
 from django.utils import safestring, html
+from django.db.models import Count
 import django.contrib.staticfiles.templatetags.staticfiles as ST
 from django.http import HttpResponseRedirect
 
@@ -32,9 +33,17 @@ from . import initialTypes as I
 from .templatetags import rotmicfilters as F
 from .utils import adminFilters as filters
 from .utils import ids
+from .utils import importExcel
+from .utils import jobs as J
 from .utils.customadmin import ViewFirstModelAdmin
 
-from .adminBase import UserRecordProtectedMixin, RequestFormMixin, export_csv, UpdateManyMixin
+from .adminBase import UserRecordProtectedMixin, RequestFormMixin, export_csv, UpdateManyMixin, \
+     XlsExportMixin, FullTextSearchMixin
+
+
+def _sortedMarkers(markers):
+    """sort a list of markers by displayId"""
+    return sorted(markers, key=lambda m: m.displayId)
 
 
 class ComponentAttachmentInline(admin.TabularInline):
@@ -44,7 +53,9 @@ class ComponentAttachmentInline(admin.TabularInline):
     extra = 1
     max_num = 5
 
-class ComponentAdmin( UserRecordProtectedMixin, RequestFormMixin, ViewFirstModelAdmin, UpdateManyMixin ):
+class ComponentAdmin( UserRecordProtectedMixin, RequestFormMixin, FullTextSearchMixin,
+                      ViewFirstModelAdmin, UpdateManyMixin,
+                      XlsExportMixin ):
     """
     Derived from ViewFirstModelAdmin -- Custom version of admin.ModelAdmin
     which shows a read-only View for a given object instead of the normal
@@ -143,14 +154,18 @@ class ComponentAdmin( UserRecordProtectedMixin, RequestFormMixin, ViewFirstModel
         return cat + '/ ' + unicode(obj.componentType.name)
     showType.allow_tags = True
     showType.short_description = 'Type'
+    showType.select_related = ('componentType__subTypeOf',)
 
     def showFirstAuthor(self, obj):
-        r = u'%s' % obj.authors.first()
-        if obj.authors.count() > 1:
+        ## sort prefetched authors in python; authors.first() would re-query
+        authors = sorted(obj.authors.all(), key=lambda u: u.pk)
+        r = u'%s' % (authors[0] if authors else None)
+        if len(authors) > 1:
             r += '+'
         return r
     showFirstAuthor.allow_tags = True
     showFirstAuthor.short_description = 'Authors'
+    showFirstAuthor.prefetch_related = ('authors',)
 
     def showSampleStatus(self, obj):
         fyes = ST.static('admin/img/icon-yes.gif')
@@ -171,6 +186,7 @@ class DnaComponentAdmin( reversion.VersionAdmin, ComponentAdmin):
     """Admin interface description for DNA constructs."""
     inlines = [ ComponentAttachmentInline ]
     form = forms.DnaComponentForm
+    xls_parser = importExcel.ImportXlsDna
     
     change_list_template = "admin/rotmic/dnacomponent/change_list.html"
     
@@ -197,16 +213,23 @@ class DnaComponentAdmin( reversion.VersionAdmin, ComponentAdmin):
                     'showComments', #4
                     'registrationDate', #4
                     'showFirstAuthor', #5
-                    'showVectorUrl', 'showMarkerUrls', #9 ## Time sink!!
+                    'showVectorUrl', 'showMarkerUrls', #9
                     'showDescription', #9
                     'showType', #9
-                    'showSampleStatus', #12 Time sink!!
+                    'length', 'gccontent', #11
+                    'showSampleStatus', #12
                     'showEdit' #13
                    )
+    ## Note: relations and counts needed by each column are declared on the
+    ## show... methods and fetched once per page (see ViewFirstModelAdmin)
+    
+    ## large text fields not needed by any table column
+    list_defer = ('sequence', 'genbank', 'genbankParsed')
     
     list_filter = ( filters.DnaCategoryListFilter, filters.DnaTypeListFilter, 
                     'status', 
                     filters.MarkerTypeFilter, filters.MarkerListFilter,
+                    filters.SequenceLengthFilter, filters.GCContentFilter,
                     'projects', filters.SortedAuthorFilter)
     
     search_fields = ('displayId', 'name', 'description', 
@@ -218,7 +241,7 @@ class DnaComponentAdmin( reversion.VersionAdmin, ComponentAdmin):
     
     ordering = ('displayId', 'name')
     
-    actions = ComponentAdmin.actions + ['make_csv', 'make_genbank']
+    actions = ComponentAdmin.actions + ['make_csv', 'make_xlsx', 'make_genbank']
     
     ## custom class variable for table generation
     csv_fields = OrderedDict( ComponentAdmin.csv_fields.items() + 
@@ -252,15 +275,17 @@ class DnaComponentAdmin( reversion.VersionAdmin, ComponentAdmin):
                               % (url, description, name))
     showVectorUrl.allow_tags = True
     showVectorUrl.short_description = 'Base Vector'
+    showVectorUrl.select_related = ('vectorBackbone',)
     
-    ## profiles to 0.030 s  * 100 for a full table; culprite is allMarkers
-    ##@profilehooks.profile(filename='/tmp/djangoprofile.out', immediate=True)
     def showMarkerUrls(self, obj):
         """Table display of Vector Backbone markers"""
         assert isinstance(obj, M.DnaComponent), 'object missmatch'
         urls = []
         
-        for m in obj.allMarkers():
+        ## same as allMarkers() but served from the prefetched index
+        markers = [ i.marker for i in obj.markerIndex.all() ]
+        
+        for m in _sortedMarkers(markers):
             u = m.get_absolute_url()
             urls += [ '<a href="%s" title="%s">%s</a>' \
                                 % (u, m.description, m.name)]
@@ -268,10 +293,17 @@ class DnaComponentAdmin( reversion.VersionAdmin, ComponentAdmin):
     
     showMarkerUrls.allow_tags = True
     showMarkerUrls.short_description = 'Markers'
+    showMarkerUrls.prefetch_related = ('markerIndex__marker',)
 
     def showSampleStatus(self, obj):
-        n_dna = obj.samples.count()
-        n_cells = obj.cellSamples.count()
+        ## use page-wide counts if available (see annotate below)
+        n_dna = getattr(obj, 'n_dnasamples', None)
+        if n_dna is None:
+            n_dna = obj.samples.count()
+
+        n_cells = getattr(obj, 'n_cellsamples', None)
+        if n_cells is None:
+            n_cells = obj.cellSamples.count()
 
         ## don't show icons for non-plasmid constructs unless there are
         ## samples registered.
@@ -294,6 +326,10 @@ class DnaComponentAdmin( reversion.VersionAdmin, ComponentAdmin):
 
     showSampleStatus.allow_tags = True    
     showSampleStatus.short_description = 'Smpls' 
+    showSampleStatus.select_related = ('componentType__subTypeOf',)
+    showSampleStatus.annotate = {
+        'n_dnasamples': Count('dna_samples', distinct=True),
+        'n_cellsamples': Count('as_plasmid_in_cell__cell_samples', distinct=True)}
 
 
     def make_csv(self, request, queryset):
@@ -316,6 +352,7 @@ class CellComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
     """Admin interface description for DNA constructs."""
     inlines = [ ComponentAttachmentInline ]
     form = forms.CellComponentForm
+    xls_parser = importExcel.ImportXlsCell
     
     change_list_template = "admin/rotmic/cellcomponent/change_list.html"
 
@@ -349,14 +386,14 @@ class CellComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
     
     ordering = ('displayId', 'name',)
     
-    actions = ['make_csv'] + ComponentAdmin.actions
+    actions = ['make_csv', 'make_xlsx'] + ComponentAdmin.actions
     
     ## custom class variable for table generation
     csv_fields = OrderedDict( ComponentAdmin.csv_fields.items() + 
                               [
                                ('Plasmid','plasmid.displayId'),
                                ('Markers',"markers.values_list('displayId', flat=True)"),
-                               ('n Samples', 'allSamplesCount()'),
+                               ('n Samples', 'cell_samples.count()'),
                                ('Description','description')
                               ])
 
@@ -375,18 +412,24 @@ class CellComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
                               % (url, x.description, x.displayId, x.name))
     showPlasmidUrl.allow_tags = True
     showPlasmidUrl.short_description = 'Plasmid'
+    showPlasmidUrl.select_related = ('plasmid',)
     
     def showMarkerUrls(self, obj):
         """Table display of Vector Backbone markers"""
         assert isinstance(obj, M.CellComponent), 'object missmatch'
         urls = []
-        for m in obj.allMarkers():
+
+        ## same as allMarkers() but served from the prefetched index
+        markers = [ i.marker for i in obj.markerIndex.all() ]
+
+        for m in _sortedMarkers(markers):
             u = m.get_absolute_url()
             urls += [ html.mark_safe('<a href="%s" title="%s">%s</a>' \
                                 % (u, m.description, m.name))]
         return ', '.join(urls)    
     showMarkerUrls.allow_tags = True
     showMarkerUrls.short_description = 'Markers'
+    showMarkerUrls.prefetch_related = ('markerIndex__marker',)
 
     def make_csv(self, request, queryset):
         return export_csv( request, queryset, self.csv_fields)
@@ -400,6 +443,7 @@ class OligoComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
     """Admin interface description for DNA constructs."""
     inlines = [ ComponentAttachmentInline ]
     form = forms.OligoComponentForm
+    xls_parser = importExcel.ImportXlsOligo
     
     change_list_template = "admin/rotmic/oligocomponent/change_list.html"
 
@@ -434,7 +478,8 @@ class OligoComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
     
     ordering = ('displayId', 'name',)
     
-    actions = ['make_csv'] + ComponentAdmin.actions
+    actions = ['make_csv', 'make_xlsx', 'find_templates', 'link_templates'] + \
+              ComponentAdmin.actions
 
     ## custom class variable for table generation
     csv_fields = OrderedDict( [('ID', 'displayId'),
@@ -469,6 +514,26 @@ class OligoComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
         return export_csv( request, queryset, self.csv_fields)
     make_csv.short_description = 'Export items as CSV'
 
+    def primerJob(self, request, queryset, link=False):
+        """Start background job searching binding sites (see utils.primers)"""
+        ids = list( queryset.values_list('id', flat=True) )
+        job = J.enqueue('primersites', request.user, 
+                        title='binding sites of %i oligos' % len(ids),
+                        modelName='oligocomponent',
+                        oligos=ids, mismatches=2, link=link)
+        J.start(job)
+        return HttpResponseRedirect(job.get_absolute_url())
+
+    def find_templates(self, request, queryset):
+        """List view action reporting binding sites of the selected oligos"""
+        return self.primerJob(request, queryset)
+    find_templates.short_description = 'Find binding sites in DNA constructs'
+
+    def link_templates(self, request, queryset):
+        """List view action adding DNA constructs with binding sites as templates"""
+        return self.primerJob(request, queryset, link=True)
+    link_templates.short_description = 'Link DNA constructs with binding sites as templates'
+
     
 admin.site.register(M.OligoComponent, OligoComponentAdmin)
 
@@ -477,6 +542,7 @@ class ChemicalComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
     """Admin interface description for DNA constructs."""
     inlines = [ ComponentAttachmentInline ]
     form = forms.ChemicalComponentForm
+    xls_parser = importExcel.ImportXlsChemical
     
     change_list_template = "admin/rotmic/chemicalcomponent/change_list.html"
 
@@ -510,7 +576,7 @@ class ChemicalComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
     
     ordering = ('displayId', 'name')
     
-    actions = ['make_csv'] + ComponentAdmin.actions
+    actions = ['make_csv', 'make_xlsx'] + ComponentAdmin.actions
 
     ## custom class variable for table generation
     csv_fields = OrderedDict( ComponentAdmin.csv_fields.items() + 
@@ -535,6 +601,7 @@ class ProteinComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
     """Admin interface description for DNA constructs."""
     inlines = [ ComponentAttachmentInline ]
     form = forms.ProteinComponentForm
+    xls_parser = importExcel.ImportXlsProtein
     
     change_list_template = "admin/rotmic/proteincomponent/change_list.html"
 
@@ -555,10 +622,15 @@ class ProteinComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
 
     list_display = ('displayId', 'name', 'showStatus', 'showComments',
                     'registrationDate', 'showFirstAuthor',
-                    'showDescription','showSampleStatus','showEdit')
+                    'showDescription', 'length', 'mass', 'isoelectric',
+                    'showSampleStatus','showEdit')
+    
+    ## large text fields not needed by any table column
+    list_defer = ('sequence', 'genbank', 'genbankParsed')
     
     list_filter = ( filters.ProteinCategoryListFilter, filters.ProteinTypeListFilter, 
-                    'status', 'projects', filters.SortedAuthorFilter)
+                    'status', filters.MolWeightFilter, filters.IsoelectricFilter,
+                    'projects', filters.SortedAuthorFilter)
     
     search_fields = ('displayId', 'name', 'description','projects__name')
     
@@ -566,13 +638,18 @@ class ProteinComponentAdmin( reversion.VersionAdmin, ComponentAdmin ):
     
     ordering = ('displayId', 'name')
     
-    actions = ['make_csv', 'make_genbank'] + ComponentAdmin.actions
+    actions = ['make_csv', 'make_xlsx', 'make_genbank'] + ComponentAdmin.actions
 
     ## custom class variable for table generation
     csv_fields = OrderedDict( ComponentAdmin.csv_fields.items() + 
                               [
                                ('n Samples', 'protein_samples.count()'),
                                ('Description','description'),
+                               ('Length', 'sequenceLength'),
+                               ('MW', 'molWeight'),
+                               ('pI', 'isoelectricPoint'),
+                               ('E280 reduced', 'e280Reduced'),
+                               ('E280 S-S', 'e280Oxidized'),
                                ('Sequence', 'sequence'),                               
                               ])
  
@@ -27,8 +27,10 @@ from . import forms
 
 from .utils.customadmin import ViewFirstModelAdmin
 from .utils import adminFilters as filters
+from .utils import importExcel
 
-from .adminBase import UserRecordProtectedMixin, RequestFormMixin, export_csv, UpdateManyMixin
+from .adminBase import UserRecordProtectedMixin, RequestFormMixin, export_csv, UpdateManyMixin, \
+     XlsExportMixin, FullTextSearchMixin
 
 
 class SampleAttachmentInline(admin.TabularInline):
@@ -72,7 +74,9 @@ class SampleProvenanceInline(admin.StackedInline):
         }),
     )
 
-class SampleAdmin( UserRecordProtectedMixin, RequestFormMixin, ViewFirstModelAdmin, UpdateManyMixin ):
+class SampleAdmin( UserRecordProtectedMixin, RequestFormMixin, FullTextSearchMixin,
+                   ViewFirstModelAdmin, UpdateManyMixin,
+                   XlsExportMixin ):
     form = forms.SampleForm     
     
     permit_delete = ['registeredBy', 'preparedBy'] ## creator, author or superuser can delete
@@ -133,8 +137,10 @@ class SampleAdmin( UserRecordProtectedMixin, RequestFormMixin, ViewFirstModelAdm
         """
         Return actual sub-class instances instead of generic Sample super-class
         This method builds on the custom InheritanceManager replacing Sample.objects
+        Sub-classes are loaded with one extra query per sample type rather 
+        than by joining all sample tables (see InheritanceQuerySet).
         """
-        return super(SampleAdmin,self).queryset(request).select_subclasses()
+        return super(SampleAdmin,self).queryset(request).prefetch_subclasses()
         
     def showRack(self, o):
         if not o.container.rack:
@@ -145,6 +151,7 @@ class SampleAdmin( UserRecordProtectedMixin, RequestFormMixin, ViewFirstModelAdm
                               % (url, x.name, x.displayId) )
     showRack.allow_tags = True
     showRack.short_description = 'Rack'
+    showRack.select_related = ('container__rack',)
         
     def showLocation(self, o):
         if not o.container.rack.location:
@@ -159,6 +166,7 @@ class SampleAdmin( UserRecordProtectedMixin, RequestFormMixin, ViewFirstModelAdm
                               % (url, title, x.displayId) )
     showLocation.allow_tags = True
     showLocation.short_description = 'Location'
+    showLocation.select_related = ('container__rack__location',)
 
     def showDescription(self, obj):
         """
@@ -206,6 +214,7 @@ admin.site.register( M.Sample, SampleAdmin )
 
 class DnaSampleAdmin( reversion.VersionAdmin, SampleAdmin ):
     form = forms.DnaSampleForm
+    xls_parser = importExcel.ImportXlsDnaSample
     
     change_list_template = 'admin/rotmic/dnasample/change_list.html'
     ## change_list_template = reversion.VersionAdmin.change_list_template ## revert change from SampleAdmin
@@ -238,7 +247,7 @@ class DnaSampleAdmin( reversion.VersionAdmin, SampleAdmin ):
                    filters.DnaSampleRackFilter, filters.DnaSampleContainerFilter,
                    'dna__projects', filters.SortedPreparedByFilter )
     
-    actions = SampleAdmin.actions + ['make_sequencing']
+    actions = SampleAdmin.actions + ['make_xlsx', 'make_sequencing']
     
     search_fields = SampleAdmin.search_fields + ['dna__displayId', 'dna__name']
         
@@ -260,6 +269,8 @@ admin.site.register( M.DnaSample, DnaSampleAdmin )
 
 class CellSampleAdmin( reversion.VersionAdmin, SampleAdmin ):
     form = forms.CellSampleForm
+    xls_parser = importExcel.ImportXlsCellSample
+    actions = SampleAdmin.actions + ['make_xlsx']
     
     ##change_list_template = reversion.VersionAdmin.change_list_template ## revert change from SampleAdmin
     change_list_template = 'admin/rotmic/cellsample/change_list.html'
@@ -310,6 +321,8 @@ admin.site.register( M.CellSample, CellSampleAdmin )
 
 class OligoSampleAdmin( reversion.VersionAdmin, SampleAdmin ):
     form = forms.OligoSampleForm
+    xls_parser = importExcel.ImportXlsOligoSample
+    actions = SampleAdmin.actions + ['make_xlsx']
     
     ##change_list_template = reversion.VersionAdmin.change_list_template ## revert change from SampleAdmin
     change_list_template = 'admin/rotmic/oligosample/change_list.html'
@@ -352,6 +365,8 @@ admin.site.register( M.OligoSample, OligoSampleAdmin )
 
 class ChemicalSampleAdmin( reversion.VersionAdmin, SampleAdmin ):
     form = forms.ChemicalSampleForm
+    xls_parser = importExcel.ImportXlsChemicalSample
+    actions = SampleAdmin.actions + ['make_xlsx']
     
     ## change_list_template = reversion.VersionAdmin.change_list_template ## revert change from SampleAdmin
     change_list_template = 'admin/rotmic/chemicalsample/change_list.html'
@@ -394,6 +409,8 @@ admin.site.register( M.ChemicalSample, ChemicalSampleAdmin )
 
 class ProteinSampleAdmin( reversion.VersionAdmin, SampleAdmin ):
     form = forms.ProteinSampleForm
+    xls_parser = importExcel.ImportXlsProteinSample
+    actions = SampleAdmin.actions + ['make_xlsx']
     
     ## change_list_template = reversion.VersionAdmin.change_list_template ## revert change from SampleAdmin
     change_list_template = 'admin/rotmic/proteinsample/change_list.html'
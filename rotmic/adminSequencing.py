@@ -15,6 +15,7 @@
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
 
 from django.contrib import admin
+from django.http import HttpResponseRedirect
 import django.utils.html as html
 
 import reversion
@@ -24,6 +25,7 @@ import rotmic.templatetags.rotmicfilters as F
 from . import forms
 
 from .utils import adminFilters as filters
+from .utils import jobs as J
 
 from .adminBase import UserRecordMixin, RequestFormMixin, export_csv, UpdateManyMixin
 
@@ -35,9 +37,11 @@ class SequencingRunInline(admin.TabularInline):
 
     fieldsets = (
         (None,
-         { 'fields': ('f', 'primer', 'description')
+         { 'fields': ('f', 'primer', 'description', 'showAnalysis')
            }),
     )
+
+    readonly_fields = ('showAnalysis',)
     
 class SequencingAdmin(UserRecordMixin, RequestFormMixin, reversion.VersionAdmin):
     form = forms.SequencingForm
@@ -68,6 +72,8 @@ class SequencingAdmin(UserRecordMixin, RequestFormMixin, reversion.VersionAdmin)
                       'comments','evaluation',
                       'orderedBy__username',
                       'sample__container__displayId')
+
+    actions = ['analyse_traces']
     
     def showSample(self, obj):
         """Table display of linked sample ''"""
@@ -82,4 +88,14 @@ class SequencingAdmin(UserRecordMixin, RequestFormMixin, reversion.VersionAdmin)
     showSample.allow_tags = True
     showSample.short_description = 'Sample'
 
+    def analyse_traces(self, request, queryset):
+        """List view action starting a background analysis of trace files"""
+        ids = list( queryset.values_list('id', flat=True) )
+        job = J.enqueue('traceanalysis', request.user,
+                        title='trace files of %i sequencings' % len(ids),
+                        modelName='sequencing', sequencings=ids)
+        J.start(job)
+        return HttpResponseRedirect(job.get_absolute_url())
+    analyse_traces.short_description = 'Analyse trace files'
+
 admin.site.register(M.Sequencing, SequencingAdmin)
\ No newline at end of file
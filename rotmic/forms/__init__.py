@@ -28,6 +28,6 @@ from sampleForms import SampleForm, DnaSampleForm, CellSampleForm, \
 from sequencingForms import SequencingForm, SequencingRunForm
 
 from uploadForms import TableUploadForm, GenbankUploadForm, TracesUploadForm,\
-     GenbankProteinUploadForm
+     GenbankProteinUploadForm, LibraryUploadForm, ProteinLibraryUploadForm
 
 from updateForms import UpdateManyForm
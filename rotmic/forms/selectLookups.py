@@ -13,8 +13,6 @@
 ## GNU Affero General Public License for more details.
 ## You should have received a copy of the GNU Affero General Public
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
-import itertools
-
 from django import forms
 from django.contrib.auth.models import User
 
@@ -27,6 +25,7 @@ import rotmic.models as M
 import rotmic.initialTypes as T
 import rotmic.initialUnits as U
 import rotmic.initialComponents as IC
+import rotmic.utils.lookupIndex as lookupIndex
 
 
 class FixedSelectMultipleWidget( sforms.AutoComboboxSelectMultipleWidget ):
@@ -42,22 +41,32 @@ class FixedSelectMultipleWidget( sforms.AutoComboboxSelectMultipleWidget ):
 ##        return not set(new_values) == set(old_values)
 
 
-class DnaLookup(ModelLookup):
-    """Lookup definition for selectable auto-completion fields"""
-    model = M.DnaComponent
+class IndexedLookup(ModelLookup):
+    """
+    Auto-completion of component IDs and names from the in-memory index of
+    each process (see utils.lookupIndex) instead of a database query per 
+    keystroke. Matches are ranked: exact ID, ID prefix, word start in name,
+    anywhere in name. Items are index entries (pk, displayId, name, ...);
+    selected values are still validated against the database (get_item).
+    Filters are restricted to componentType and componentType__subTypeOf.
+    """
     search_fields = ('displayId__startswith', 'name__icontains')
-    
+
+    def get_query(self, request, term):
+        return lookupIndex.search( self.model, term, self.filters )
+
     def get_item_id(self,item):
         return item.pk
 
+
+class DnaLookup(IndexedLookup):
+    """Lookup definition for selectable auto-completion fields"""
+    model = M.DnaComponent
+
 registry.register(DnaLookup)
 
-class OligoLookup(ModelLookup):
+class OligoLookup(IndexedLookup):
     model = M.OligoComponent
-    search_fields = ('displayId__startswith', 'name__icontains')
-    
-    def get_item_id(self,item):
-        return item.pk
 
 registry.register(OligoLookup)
 
@@ -67,97 +76,63 @@ class SequencingOligoLookup(OligoLookup):
 registry.register(SequencingOligoLookup)
 
 
-class ChemicalLookup(ModelLookup):
+class ChemicalLookup(IndexedLookup):
     """Lookup definition for selectable auto-completion fields"""
     model = M.ChemicalComponent
-    search_fields = ('displayId__startswith', 'name__icontains')
-    
-    def get_item_id(self,item):
-        return item.pk
 
 registry.register(ChemicalLookup)
 
 
-class VectorLookup(ModelLookup):
+class VectorLookup(IndexedLookup):
     """Lookup definition for selectable auto-completion fields"""
     model = M.DnaComponent
-    search_fields = ('displayId__startswith', 'name__icontains')
-    
     filters = {'componentType__subTypeOf': T.dcVectorBB }
     
     def get_query(self, request, term):
-        """
-        Special case: sort 'unknown vector' to top.
-        See: http://stackoverflow.com/questions/431628/how-to-combine-2-or-more-querysets-in-a-django-view
-        """
-        q = super(VectorLookup, self).get_query(request, term)
-
-        rest = q.exclude(id=IC.vectorUnknown.id)
-        unknown = q.filter(id=IC.vectorUnknown.id)
-        
-        r = list(itertools.chain(unknown, rest))
-        return r    
-    
-    def get_item_id(self,item):
-        return item.pk
+        """Special case: sort 'unknown vector' to top."""
+        r = super(VectorLookup, self).get_query(request, term)
+
+        unknown = IC.vectorUnknown.id
+        return [ e for e in r if e.pk == unknown ] + \
+               [ e for e in r if e.pk != unknown ]
 
 registry.register(VectorLookup)
 
 
-class PlasmidLookup(ModelLookup):
+class PlasmidLookup(IndexedLookup):
     """Lookup definition for selectable auto-completion fields"""
     model = M.DnaComponent
-    search_fields = ('displayId__startswith', 'name__icontains')
     filters = {'componentType__subTypeOf': T.dcPlasmid }
-    
-    def get_item_id(self,item):
-        return item.pk
 
 registry.register(PlasmidLookup)
 
 
-class MarkerLookup(ModelLookup):
+class MarkerLookup(IndexedLookup):
     """Lookup definition for selectable auto-completion fields"""
     model = M.DnaComponent
-    search_fields = ('displayId__startswith', 'name__icontains')
     filters = {'componentType__subTypeOf': T.dcMarker }
-    
-    def get_item_id(self,item):
-        return item.pk
 
 registry.register(MarkerLookup)
 
 
-class ProteinLookup(ModelLookup):
+class ProteinLookup(IndexedLookup):
     """Lookup definition for selectable auto-completion fields"""
     model = M.ProteinComponent
-    search_fields = ('displayId__startswith', 'name__icontains')
-    
-    def get_item_id(self,item):
-        return item.pk
 
 registry.register(ProteinLookup)
 
 
-class SampleDnaLookup(ModelLookup):
+class SampleDnaLookup(IndexedLookup):
     """Lookup definition for selectable auto-completion fields"""
     model = M.DnaComponent
-    search_fields = ('displayId__startswith', 'name__icontains')
     filters = {'componentType__subTypeOf__in': [T.dcPlasmid, T.dcFragment] }
-    
-    def get_item_id(self,item):
-        return item.pk
 
 registry.register(SampleDnaLookup)
 
-class SampleCellLookup(ModelLookup):
+class SampleCellLookup(IndexedLookup):
     """Lookup definition for selectable auto-completion fields"""
     model = M.CellComponent
-    search_fields = ('displayId__startswith', 'name__icontains')
     ##filters = {'componentType__subTypeOf__in': [T.dcPlasmid, T.dcFragment] }
-    
-    def get_item_id(self,item):
-        return item.pk
 
 registry.register(SampleCellLookup)
 
@@ -14,10 +14,7 @@
 ## You should have received a copy of the GNU Affero General Public
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
 from datetime import datetime
-import re
-
-from Bio import SeqIO
-import StringIO
+import collections, json, re
 
 import django.forms as forms
 from django.contrib.auth.models import User
@@ -28,18 +25,41 @@ import selectable.forms as sforms
 from rotmic.utils.filefields import DocumentFormField
 from rotmic.utils.multiFile import MultiFileField
 import rotmic.utils.reporting as R
+import rotmic.utils.genbank as G
+import rotmic.utils.lookupIndex as LI
 import selectLookups as L
 import rotmic.initialTypes as T
 
 import rotmic.models as M
 
 
+def normalize(s):
+    """lower-case ID and remove leading zeros"""
+    r = s.lower()
+    r = re.sub('^0+', '', r, ) #remove leading zeros
+    # remove leading zeros after letters
+    ## \g puts the named group from the pattern match back into the string
+    r = re.sub('(?P<letters>[a-z]+)0+(?P<number>[0-9]+)', '\g<letters>\g<number>', r)
+    return r
+
+
 class TableUploadForm(forms.Form):
     """Form for uploading Excel Tables"""
     
     tableFile = DocumentFormField(label='Excel file',
                                   extensions=['xls','xlsx'])
     
+    atomic = forms.BooleanField(label='all or nothing', initial=True,
+                                required=False,
+                                help_text='Import nothing if there is an error in any of the rows.\n'+\
+                                'Otherwise, rows with errors are skipped and all other rows are imported.')
+    
+    update = forms.BooleanField(label='update existing', initial=False,
+                                required=False,
+                                help_text='Rows with the ID of an existing entry change that entry '+\
+                                '(e.g. in a table from "Export items as Excel table").\n'+\
+                                'Otherwise, such rows are reported as errors.')
+    
     
 
 class UploadFormBase(forms.Form):
@@ -53,12 +73,7 @@ class UploadFormBase(forms.Form):
 
     def normalize(self, s):
         """lower-case ID and remove leading zeros"""
-        r = s.lower()
-        r = re.sub('^0+', '', r, ) #remove leading zeros
-        # remove leading zeros after letters
-        ## \g puts the named group from the pattern match back into the string
-        r = re.sub('(?P<letters>[a-z]+)0+(?P<number>[0-9]+)', '\g<letters>\g<number>', r)
-        return r
+        return normalize(s)
 
     def add_error(self, field, msg):
         """
@@ -208,10 +223,7 @@ this trace.
     
     def findprimer(self, fname, primers=[]):
         """try identifying a sequencing primer ID in the filename"""
-        for p in primers:
-            if p.displayId in fname:
-                return p
-        return None
+        return findprimer(fname, primers)
     
     def mapTracesToSamples(self, files):
         """map given InMemoryFileUpload files to samples by name"""
@@ -238,25 +250,55 @@ this trace.
         for key in ['orderedBy', 'orderedAt', 'evaluation', 'comments']:
             kwargs[key] = self.cleaned_data[key]
         
-        kwargs['registeredBy'] = self.request.user
-        kwargs['registeredAt'] = datetime.now()
-        
-        kwargs['comments'] += '\n(Created through trace file upload)'
+        createSequencing(sample, traces, self.request.user, 
+                         matchPrimer=self.cleaned_data['matchPrimer'], **kwargs)
+
+
+def findprimer(fname, primers=[]):
+    """try identifying a sequencing primer ID in the filename"""
+    for p in primers:
+        if p.displayId in fname:
+            return p
+    return None
+
+def createSequencing(sample, traces, user, matchPrimer=True, **kwargs):
+    """
+    Create and save new sequencing and sequencingRun instances
+    @param sample: DnaSample
+    @param traces: [ File ], trace files
+    @param user: User, registering the new records
+    @param matchPrimer: bool, try to extract sequencing primer from file names
+    @param kwargs: orderedBy, orderedAt, evaluation, comments
+    @return Sequencing
+    """
+    kwargs['registeredBy'] = user
+    kwargs['registeredAt'] = datetime.now()
+    
+    kwargs['comments'] += '\n(Created through trace file upload)'
 
-        r = M.Sequencing(sample=sample, **kwargs)
-        r.save()
+    r = M.Sequencing(sample=sample, **kwargs)
+    r.save()
 
-        seqprimers = M.OligoComponent.objects.filter(componentType=T.ocSequencing)
+    seqprimers = M.OligoComponent.objects.filter(componentType=T.ocSequencing)
+    
+    for f in traces:
         
-        for f in traces:
-            
-            if self.cleaned_data['matchPrimer']:
-                primer = self.findprimer(f.name, seqprimers)
+        primer = None
+        if matchPrimer:
+            primer = findprimer(f.name, seqprimers)
+
+        run = M.SequencingRun(parent=r, f=f, description='multiple file upload',
+                              primer=primer)
+        run.save()
+    
+    return r
 
-            run = M.SequencingRun(parent=r, f=f, description='multiple file upload',
-                                  primer=primer)
-            run.save()
 
+## one record of an uploaded genbank file: LOCUS name, record string
+GenbankRecord = collections.namedtuple('GenbankRecord', ['name', 'original'])
+
+LOCUS = re.compile(r'LOCUS\s+(\S+)')
+RECORD_END = re.compile(r'^//\s*$', re.M)
 
 class GenbankUploadForm(UploadFormBase):
     
@@ -301,41 +343,31 @@ Example:
         return sdic
     
     def clean_genbank(self):
-        """Convert uploaded file(s) into list of genbank record objects"""
+        """
+        Split uploaded file(s) into single genbank records and read the record
+        name from each LOCUS line. Records are only parsed (in parallel) by
+        the background job attaching them.
+        @return [ GenbankRecord ]
+        """
         data = self.cleaned_data['genbank']
         
         r = []
-        concat = ''
-        try:
-            ## BioPython genbank writing is sensitive to all kind of errors
-            ## we therefore first concatenate all genbank files into one big string
-            ## then parse it record by record which allows us to store
-            ## the **original** genbank string along with the Biopython object
-            for f in data:
-                concat += ''.join(f.readlines()).strip()
-            
-            if concat:
-                
-                records = concat.split('//')[:-1]  ## skip '' split fragment after last //
-                records = [ s + '//' for s in records ]
-    
-                for i, s in enumerate(records):
-                    f = StringIO.StringIO(s)
-                    seqrecord = SeqIO.parse( f, 'gb' ).next()
-    
-                    seqrecord.original = s
-                    r += [ seqrecord ]
-
-        except StopIteration, why:
-            raise forms.ValidationError('Empty or corrupted genbank record #%i: %s' % \
-                                        (i+1, why))
-        except ValueError, why:
-            raise forms.ValidationError('Error parsing genbank record #%i: %s' % \
-                                        (i+1, why))
-        except Exception, why:
-            raise forms.ValidationError("Unknown error parsing %r: %r" % \
-                                        (f, why))
-            
+        for f in data:
+            s = ''.join(f.readlines()).strip()
+
+            for record in RECORD_END.split(s):
+                record = record.strip()
+                if not record:
+                    continue
+
+                locus = LOCUS.match(record)
+                if not locus:
+                    raise forms.ValidationError(
+                        'Empty or corrupted genbank record #%i in %s' % \
+                        (len(r)+1, f.name))
+
+                r += [ GenbankRecord(locus.group(1), record + '\n//') ]
+
         return r
 
 
@@ -363,44 +395,21 @@ Example:
             dna = self.findDna(gb.name, sdic)
 
             if dna:
-                if r[dna] != None:
+                if r[dna] is not None:
                     self.add_error('genbank',
                         'Duplicate entries: records %s and %s both match to the same construct %s' %\
                         (r[dna].name, gb.name, dna.displayId))
 
                 r[dna] = gb
 
-        if None in r.values():
-            missing = [ x.displayId for x in r.keys() if r[x] == None ]
+        missing = [ x.displayId for x in r.keys() if r[x] is None ]
+        if missing:
             self.add_error('genbank',
                            'Could not find record for the following constructs: '+\
                            ', '.join(missing))
         
         return r
 
-    def replaceGenbank(self, dna, seqrecord):
-        """
-        extract genbank file from upload field
-        @return True if this replaces an existing record, False otherwise
-        """
-        replaced = False
-        try:
-            dna.sequence = seqrecord.seq.tostring()
-            dna.name = dna.name or seqrecord.name
-            dna.description = dna.description or seqrecord.description
-
-            replaced = bool(dna.genbank) ## empty? 
-            
-            dna.genbank = seqrecord.original ## custom variable created in clean_genbank           
-            dna.save()
-            
-        except ValueError, why:
-            msg = 'Error attaching genbank record: %r' % why
-            self._errors['genbank'] = self.error_class([msg])
-
-        return replaced
-    
-    
 class GenbankProteinUploadForm(GenbankUploadForm):
     
     constructs = forms.ModelMultipleChoiceField(M.ProteinComponent.objects.all(), 
@@ -410,3 +419,147 @@ class GenbankProteinUploadForm(GenbankUploadForm):
                     label='Protein constructs', 
                     initial=None, 
                     help_text='\nStart typing construct ID or name to restrict the choice')
+
+
+def replaceGenbank(dna, gb, parsed):
+    """
+    Attach a genbank record to a DnaComponent or ProteinComponent (without
+    saving it).
+    @param gb: str, single genbank record
+    @param parsed: dict, parsing result (see utils.genbank.prepareRecord)
+    @return True if this replaces an existing record, False otherwise
+    """
+    dna.sequence = parsed['sequence']
+    dna.name = dna.name or parsed['name']
+    dna.description = dna.description or parsed['description']
+
+    replaced = bool(dna.genbank) ## empty? 
+    
+    dna.genbank = gb
+    ## spare GenbankMixin.updateParsedGenbank from parsing the record again
+    dna.genbankHash = G.contentHash(gb)
+    dna.genbankParsed = json.dumps(parsed)
+
+    return replaced
+
+
+def replaceFasta(dna, parsed):
+    """
+    Replace the sequence of a DnaComponent or ProteinComponent by the one of
+    a FASTA record (without saving it). An attached genbank record is
+    removed if the sequence changes.
+    @param parsed: dict, see utils.genbank.prepareLibraryRecord
+    @return True if this replaces an existing sequence, False otherwise
+    """
+    replaced = bool(dna.sequence)
+
+    if (dna.sequence or '').upper() != parsed['sequence'].upper():
+        dna.genbank = ''
+    dna.sequence = parsed['sequence']
+    dna.name = dna.name or parsed['name']
+    dna.description = dna.description or parsed['description']
+
+    return replaced
+
+
+class LibraryMatcher(object):
+    """
+    Match the record names of a library file to constructs. A record name
+    matches a construct if it starts with the construct ID (compared as in
+    UploadFormBase.findDna) or, failing that, if it equals the construct
+    name (ignoring case; only names used by a single construct count).
+    """
+
+    def __init__(self, model):
+        entries = LI.index( model ).entries
+
+        self.ids = dict( [ (normalize(e.displayId), e.pk) for e in entries ] )
+
+        self.names = {}
+        for e in entries:
+            self.addName( e.name, e.pk )
+
+    def addName(self, name, pk):
+        key = (name or '').strip().lower()
+        if key:
+            ## None marks names shared by several constructs
+            self.names[key] = pk if key not in self.names else None
+
+    def add(self, construct):
+        """Make a new construct available for matching"""
+        self.ids[ normalize(construct.displayId) ] = construct.pk
+        self.addName( construct.name, construct.pk )
+
+    def match(self, name):
+        """@return int -- pk of matching construct or None"""
+        frag = normalize( re.split(UploadFormBase.ID_SEPARATORS, name)[0] )
+        return self.ids.get( frag ) or self.names.get( name.strip().lower() )
+
+
+class LibraryUploadForm(UploadFormBase):
+    """
+    Attach the records of a single multi-record genbank or FASTA file to
+    existing DNA constructs or register them as new constructs.
+    """
+
+    ## file size limit in bytes; the file is processed record by record
+    MAX_SIZE = 200e6
+
+    library = DocumentFormField(label='Library file',
+                    extensions=['gb', 'gbk', 'genbank', 'fasta', 'fa', 'fas', 'fna',
+                                'faa', 'txt'],
+                    size=MAX_SIZE,
+                    help_text="""A single file with many genbank or FASTA records.
+Each record is matched to a construct by its name (genbank LOCUS or first 
+word of the FASTA header). The name has to start with the construct ID 
+(lower or upper case, leading zeros can vary) or has to be identical to the 
+construct name.""")
+
+    create = forms.BooleanField(label='create new', initial=False,
+                    required=False,
+                    help_text='Register records without matching construct as new constructs.\n'+\
+                    'Otherwise, such records are reported and skipped.')
+
+    componentType = forms.ModelChoiceField(M.DnaComponentType.objects.all(),
+                    required=False, label='Type',
+                    help_text='Type of new constructs')
+
+    status = forms.ChoiceField(label='Status',
+                    choices=M.DnaComponent.STATUS_CHOICES,
+                    initial='available', required=False,
+                    help_text='Status of new constructs')
+
+    def clean_library(self):
+        """Only check the first line -- records are read by the background job"""
+        f = self.cleaned_data['library']
+
+        first = ''
+        for line in f:
+            if line.strip():
+                first = line
+                break
+        f.seek(0)
+
+        if not (first.startswith('LOCUS') or first.startswith('>')):
+            raise forms.ValidationError(
+                'Expecting a genbank (LOCUS ...) or FASTA (>...) file.')
+        return f
+
+    def clean(self):
+        data = super(LibraryUploadForm, self).clean()
+
+        if data.get('create') and not data.get('componentType'):
+            self.add_error('componentType', 'Please select a type for new constructs.')
+        return data
+
+
+class ProteinLibraryUploadForm(LibraryUploadForm):
+
+    componentType = forms.ModelChoiceField(M.ProteinComponentType.objects.all(),
+                    required=False, label='Type',
+                    help_text='Type of new constructs')
+
+    status = forms.ChoiceField(label='Status',
+                    choices=M.ProteinComponent.STATUS_CHOICES,
+                    initial='available', required=False,
+                    help_text='Status of new constructs')
@@ -0,0 +1,42 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""Fill in sequence-derived columns of DNA constructs and proteins"""
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+import rotmic.models as M
+
+
+class Command(NoArgsCommand):
+    help = 'Calculate length, GC content, hash (DNA) and MW, pI, extinction (proteins)'\
+           ' of stored sequences.'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--all', action='store_true', dest='all', default=False,
+                    help='re-calculate all records, not only missing values'),
+        make_option('--chunksize', type='int', dest='chunksize', default=1000,
+                    help='number of sequences processed at once (default: 1000)'),
+    )
+
+    def handle_noargs(self, **options):
+        for model in (M.DnaComponent, M.ProteinComponent):
+            n = model.backfillSequenceStats( chunksize=options['chunksize'],
+                                             missing=not options['all'] )
+        
+            if int(options.get('verbosity', 1)) > 0:
+                self.stdout.write('Updated %i %s records.' 
+                                  % (n, model._meta.verbose_name))
@@ -0,0 +1,30 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""Re-create the full-text search index from scratch"""
+
+from django.core.management.base import NoArgsCommand
+
+import rotmic.models as M
+
+
+class Command(NoArgsCommand):
+    help = 'Rebuild the search documents of all components and samples (SearchIndex).'
+
+    def handle_noargs(self, **options):
+        n = M.SearchIndex.rebuild()
+        
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write('Indexed %i components and samples.' % n)
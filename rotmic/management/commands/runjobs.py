@@ -0,0 +1,67 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""Worker process(es) running queued background jobs (uploads)"""
+import signal, sys
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+import rotmic.utils.jobs as J
+
+
+class Command(NoArgsCommand):
+    help = 'Run queued background jobs (Excel import, genbank and trace uploads).'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--processes', type='int', dest='processes', default=1,
+                    help='number of worker processes (default: 1)'),
+        make_option('--sleep', type='float', dest='sleep', default=5,
+                    help='seconds between polls for new jobs (default: 5)'),
+        make_option('--once', action='store_true', dest='once', default=False,
+                    help='run all queued jobs in this process, then exit'),
+    )
+
+    def handle_noargs(self, **options):
+        verbose = int(options.get('verbosity', 1)) > 0
+        J.IN_WORKER = True  ## jobs may start process pools (see J.poolSize)
+
+        if options['once']:
+            n = J.runPending()
+            if verbose:
+                self.stdout.write('Ran %i jobs.' % n)
+            return
+
+        processes = max(1, options['processes'])
+        if verbose:
+            self.stdout.write('Starting %i job worker(s).' % processes)
+
+        if processes == 1:
+            J.work( sleep=options['sleep'] )
+            return
+
+        workers = J.startWorkers( processes, sleep=options['sleep'] )
+
+        def stop(signum, frame):
+            for p in workers:
+                p.terminate()
+            for p in workers:
+                p.join()
+            sys.exit(0)
+        
+        signal.signal(signal.SIGTERM, stop)
+
+        for p in workers:
+            p.join()
@@ -28,8 +28,19 @@ from rotmic.models.componentTypes import ComponentType, DnaComponentType, \
 from rotmic.models.components import Component, DnaComponent, CellComponent, \
      OligoComponent, ChemicalComponent, ProteinComponent
 
+from rotmic.models.markerIndex import DnaMarkerIndex, CellMarkerIndex
+
+from rotmic.models.kmerIndex import KmerIndex
+
+from rotmic.models.lookupVersion import LookupVersion
+
+from rotmic.models.idCounter import IdCounter
+
 from rotmic.models.samples import Sample, DnaSample, CellSample, OligoSample,\
-     ChemicalSample, ProteinSample, SampleProvenance, SampleProvenanceType
+     ChemicalSample, ProteinSample, SampleProvenance, SampleProvenanceType,\
+     PEDIGREE_DEPTH
+
+from rotmic.models.occupancy import ContainerOccupancy, splitPosition
 
 from rotmic.models.sequencing import SequencingRun, Sequencing
 
@@ -37,3 +48,6 @@ from rotmic.models.storage import Location, Rack, Container
 
 from rotmic.models.projects import Project
 
+from rotmic.models.jobs import Job, JobFile
+
+from rotmic.models.searchIndex import SearchIndex
@@ -55,6 +55,7 @@ class ComponentType( models.Model ):
         if self.subTypeOf:
             return self.subTypeOf.category()
         return self
+    category.select_related = ('subTypeOf',)
     
 
     class Meta:
@@ -15,16 +15,14 @@
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
 
 from datetime import datetime
-import re
+import re, json
 
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import Signal
 from django.utils.safestring import mark_safe
 import django.utils.html as html
 from django.contrib.auth.models import User
 
-import Bio.SeqUtils.ProtParam as PP
-import Bio.SeqUtils.MeltingTemp as TM
-import Bio.SeqUtils as SeqUtils
 from Bio.Seq import Seq
 from Bio.Alphabet import generic_dna
 
@@ -32,14 +30,16 @@ from .usermixin import UserMixin, ReadonlyUrlMixin
 
 import rotmic.templatetags.rotmicfilters as F
 import rotmic.utils.inheritance as I
+import rotmic.utils.genbank as G
+import rotmic.utils.sequtils as sequtils
 from rotmic.models.componentTypes import DnaComponentType
+from rotmic.models.idCounter import IdCounter
 
-def _extractNumbers( queryset, pattern ):
-    matches = [ pattern.match( o.displayId ) for o in queryset ]
-    numbers = [ int(x.groups()[0]) for x in matches if x is not None ]
-    numbers.sort()
-    return numbers    
-
+## sent by Component.saveMany before and after saving a batch of records of
+## one class -- per-record post_save handlers skip the instances of a batch
+## (flagged by _savingMany) and update their index once for the whole batch
+pre_save_many = Signal(providing_args=['instances'])
+post_save_many = Signal(providing_args=['instances'])
 
 class Component(UserMixin, ReadonlyUrlMixin):
     """
@@ -111,24 +111,61 @@ class Component(UserMixin, ReadonlyUrlMixin):
     showDescription.short_description = 'Description'
     
     @staticmethod
-    def nextAvailableId(user, prefix=None, category_id=None):
+    def idPrefix(user, category_id=None):
         """
-        determine the next free ID for given user and component category.
+        default ID prefix for given user and component category.
         
         category_id - int, pk of ComponentType instance selected in Category field
         This parameter is ignored in this default implementation.
         """
-        prefix = prefix or user.profile.prefix
-        objects = Component.objects.filter( displayId__startswith=prefix )
+        return user.profile.prefix
 
-        if objects.count() == 0:
-            return '%s%04i' % (prefix, 1)
+    @classmethod
+    def reserveIds(cls, user, n, prefix=None, category_id=None):
+        """
+        Reserve n new IDs for given user and component category (see IdCounter).
+        @return [ str ]
+        """
+        prefix = prefix or cls.idPrefix(user, category_id=category_id)
+        return IdCounter.reserve(prefix, n)
 
-        pattern = re.compile(prefix+'([0-9]+)')
-        numbers = _extractNumbers( objects, pattern ) or [0]
-        
-        return '%s%04i' % (prefix, numbers[-1]+1)
-        
+    @classmethod
+    def nextAvailableId(cls, user, prefix=None, category_id=None):
+        """
+        Reserve the next free ID for given user and component category.
+        """
+        return cls.reserveIds(user, 1, prefix=prefix, category_id=category_id)[0]
+
+    def save(self, *args, **kwargs):
+        super(Component, self).save(*args, **kwargs)
+        if not self.__dict__.get('_savingMany'):
+            IdCounter.observe(self.displayId)
+
+    @classmethod
+    def saveMany(cls, components):
+        """
+        Save several components of one class. ID counters and the indices
+        kept in sync by signal handlers (search, k-mer and marker index,
+        lookup stamps) are updated once for the whole batch (see
+        pre_save_many / post_save_many) rather than record by record.
+        The rows themselves are still saved one by one.
+        @param components: [ Component ], instances of the same class
+        """
+        if not components:
+            return
+        model = type(components[0])
+
+        for o in components:
+            o._savingMany = True
+        try:
+            pre_save_many.send(sender=model, instances=components)
+            for o in components:
+                o.save()
+            IdCounter.observeMany([ o.displayId for o in components ])
+            post_save_many.send(sender=model, instances=components)
+        finally:
+            for o in components:
+                o.__dict__.pop('_savingMany', None)
 
     class Meta:
         app_label = 'rotmic'
@@ -162,7 +199,105 @@ class StatusMixinDna(models.Model):
         abstract = True
     
 
-class DnaComponent(Component, StatusMixinDna):
+def _backfill( model, fields, calculate, chunksize=1000, missing=True ):
+    """
+    Re-calculate sequence-derived fields of a component model in batches.
+    @param fields: (str,), field names, fields[0] is None if not yet calculated
+    @param calculate: function( [ sequence ] ) -> [ tuple of field values ]
+    @param missing: bool, only update records without these values
+    @return int -- number of updated records
+    """
+    ## order_by('pk') would follow the parent link to Component.ordering
+    qs = model.objects.order_by('id')
+    if missing:
+        qs = qs.filter(**{fields[0]: None})
+
+    n, last = 0, 0
+    while True:
+        rows = list( qs.filter(id__gt=last)\
+                     .values_list('id', 'sequence')[:chunksize] )
+        if not rows:
+            return n
+
+        stats = calculate( [ seq for pk, seq in rows ] )
+        with transaction.atomic():
+            for (pk, seq), values in zip( rows, stats ):
+                model.objects.filter(pk=pk).update( **dict(zip(fields, values)) )
+
+        n += len( rows )
+        last = rows[-1][0]
+
+
+class GenbankMixin(models.Model):
+    """
+    Keep a parsed copy (features, colors, sequence) of the genbank record 
+    in the (sub-class) field 'genbank'. The copy is re-built on save 
+    whenever the content hash of the genbank record has changed.
+    """
+    genbankHash = models.CharField(max_length=40, blank=True, editable=False,
+                                   help_text='SHA1 of parsed genbank record')
+
+    genbankParsed = models.TextField(blank=True, editable=False,
+                                     help_text='JSON of parsed genbank record')
+
+    def updateParsedGenbank(self):
+        """
+        Re-parse the genbank record if it has changed since the last
+        call and re-check whether sequence and genbank record match.
+        A record that cannot be parsed is kept as {'error': message} so
+        that it is not parsed again.
+        """
+        if not self.genbank:
+            self.genbankHash = self.genbankParsed = ''
+            return
+
+        h = G.contentHash(self.genbank)
+
+        if h == self.genbankHash and self.genbankParsed:
+            d = json.loads(self.genbankParsed)
+        else:
+            d, error = G.prepareRecord(self.genbank)
+            if error:
+                d = {'error': error}
+
+        if 'error' not in d:
+            d['mismatch'] = bool(self.sequence) and self.sequence != d['sequence']
+        
+        self.genbankHash = h
+        self.genbankParsed = json.dumps(d)
+
+    def parsedGenbank(self):
+        """
+        @return GenbankInMemory or None -- parsed genbank record, with
+        additional field 'mismatch' (True if sequence and genbank don't match)
+        @raise GenbankError, if the record cannot be parsed
+        """
+        if not self.genbank:
+            return None
+
+        if not (self.genbankParsed and
+                self.genbankHash == G.contentHash(self.genbank)):
+            ## modified by queryset.update() -- parse a copy in memory only,
+            ## it is stored by the next save()
+            self.updateParsedGenbank()
+        
+        d = json.loads(self.genbankParsed)
+        if 'error' in d:
+            raise G.GenbankError(d['error'])
+
+        r = G.GenbankInMemory(self.genbank, parsed=d)
+        r.mismatch = d['mismatch']
+        return r
+
+    def save(self, *args, **kwargs):
+        self.updateParsedGenbank()
+        return super(GenbankMixin, self).save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class DnaComponent(Component, StatusMixinDna, GenbankMixin):
     """
     Description of a stretch of DNA.
     """
@@ -197,6 +332,19 @@ class DnaComponent(Component, StatusMixinDna):
                                      null=True, blank=True,
                                      on_delete=models.SET_NULL)  ## do not remove DC if protein is deleted
     
+    ## sequence properties, updated on save (see updateSequenceStats);
+    ## back-filled by migration 0053 (or ./manage.py backfillseqstats)
+    sequenceLength = models.PositiveIntegerField('Length', null=True, 
+                                                 editable=False, db_index=True,
+                                                 help_text='nucleotide count')
+
+    sequenceGC = models.FloatField('GC', null=True, editable=False, 
+                                   db_index=True, help_text='GC content in %')
+
+    sequenceHash = models.CharField(max_length=40, blank=True, editable=False,
+                                    db_index=True, 
+                                    help_text='SHA1 of cleaned-up sequence')
+    
     
     @property
     def samples(self):
@@ -226,23 +374,21 @@ class DnaComponent(Component, StatusMixinDna):
         return list(dnasamples) + list(self.cellSamples)
 
     @staticmethod
-    def nextAvailableId(user, prefix=None, category_id=None):
+    def idPrefix(user, category_id=None):
         """
-        determine the next free ID for given user and component category.
+        default ID prefix for given user and component category.
         category_id - int, pk of ComponentType instance selected in Category field
         """
         import rotmic.initialTypes as T  ## local import to avoid recursion
         
         cat = DnaComponentType.objects.get(id=category_id)
         
-        default_prefix = user.profile.dcPrefix or user.profile.prefix
+        prefix = user.profile.dcPrefix or user.profile.prefix
 
         if cat.id in [T.dcMarker.id, T.dcVectorBB.id]:
-            default_prefix += cat.name.lower()[0] 
-        
-        prefix = prefix or default_prefix
+            prefix += cat.name.lower()[0] 
         
-        return Component.nextAvailableId(user, prefix)
+        return prefix
 
     def relatedDnaDict(self):
         """
@@ -262,12 +408,18 @@ class DnaComponent(Component, StatusMixinDna):
     
  
     def allSamplesCount(self):
+        if getattr(self, 'n_dnasamples', None) is not None:  ## see annotate
+            return self.n_dnasamples + self.n_cellsamples
+        
         dna = self.dna_samples.count()
         
         sample_ids= self.as_plasmid_in_cell.values_list('cell_samples', flat=True)
         sample_ids = [ i for i in sample_ids if i ] ## filter out None
         
         return dna + len(sample_ids)
+    allSamplesCount.annotate = {
+        'n_dnasamples': models.Count('dna_samples', distinct=True),
+        'n_cellsamples': models.Count('as_plasmid_in_cell__cell_samples', distinct=True)}
 
     def save(self, *args, **kwargs):
         """
@@ -281,21 +433,38 @@ class DnaComponent(Component, StatusMixinDna):
 ##        if category != 'Fragment':
 ##            self.translatesTo = None
         
+        self.updateSequenceStats()
         return super(DnaComponent,self).save(*args, **kwargs)
 
+    ## fields calculated by sequtils.seqstats
+    STATS_FIELDS = ('sequenceLength', 'sequenceGC', 'sequenceHash')
+
+    def updateSequenceStats(self):
+        """Re-calculate length, GC content and hash of the sequence"""
+        stats = sequtils.seqstats( [self.sequence] )[0]
+        for name, value in zip( self.STATS_FIELDS, stats ):
+            setattr( self, name, value )
+
+    @classmethod
+    def backfillSequenceStats(cls, chunksize=1000, missing=True):
+        """
+        Calculate length, GC content and hash of stored sequences in 
+        batches, without loading complete model instances.
+        @param missing: bool, only update records without these values
+        @return int -- number of updated records
+        """
+        return _backfill( cls, cls.STATS_FIELDS, sequtils.seqstats,
+                          chunksize=chunksize, missing=missing )
+
 
     def allMarkers( self ):
         """
         @return: QuerySet(DnaComponent)
         All markers contained in this DC directly or within a linked
-        vector backbone.
-        Note: using queryset combination and limiting count() etc is speeding
-        up this code
+        vector backbone. Looked up from the pre-computed DnaMarkerIndex.
         """
-        r = self.markers.all()  ## queryset
-        if self.vectorBackbone:
-            r = r | self.vectorBackbone.allMarkers() ## combine querysets
-        return r
+        return DnaComponent.objects.filter(
+            id__in=self.markerIndex.values('marker'))
     
     def allProteins( self ):
         """
@@ -323,18 +492,18 @@ class DnaComponent(Component, StatusMixinDna):
 
     def length( self ):
         """@return int, nt count"""
-        if not self.sequence:
-            return 0
-        return len(self.sequence)
+        if self.sequenceLength is None:
+            self.updateSequenceStats()
+        return self.sequenceLength
+    length.admin_order_field = 'sequenceLength'
     
     def gccontent(self):
         """@return float, GC content of sequence in %"""
-        r = 0.0
-        try:
-            r = SeqUtils.GC(self.sequence)
-        except:
-            pass
-        return round(r, 0)
+        if self.sequenceGC is None:
+            self.updateSequenceStats()
+        return round(self.sequenceGC, 0)
+    gccontent.admin_order_field = 'sequenceGC'
+    gccontent.short_description = 'GC %'
 
     class Meta:
         app_label = 'rotmic'
@@ -385,25 +554,20 @@ class CellComponent(Component, StatusMixinDna):
         return self.cell_samples
 
     @staticmethod
-    def nextAvailableId(user, prefix=None, category_id=None):
+    def idPrefix(user, category_id=None):
         """
-        determine the next free ID for given user and (ignored) component category.
+        default ID prefix for given user and (ignored) component category.
         """
-        default_prefix = user.profile.ccPrefix or user.profile.prefix + 'c'
-        prefix = prefix or default_prefix
-        
-        return Component.nextAvailableId(user, prefix)
+        return user.profile.ccPrefix or user.profile.prefix + 'c'
 
     def allMarkers( self ):
         """
-        @return: [DnaComponent]
+        @return: QuerySet(DnaComponent)
         All markers contained in this cell directly or within a linked
-        plasmid.
+        plasmid. Looked up from the pre-computed CellMarkerIndex.
         """
-        r = self.markers.all() ## potentially empty queryset
-        if self.plasmid:
-            r = r | self.plasmid.allMarkers()  ## combine queryset, more efficient than [] + []
-        return r
+        return DnaComponent.objects.filter(
+            id__in=self.markerIndex.values('marker'))
 
     class Meta:
         app_label = 'rotmic'
@@ -411,7 +575,7 @@ class CellComponent(Component, StatusMixinDna):
         ordering = ['displayId']
 
 
-class ProteinComponent(Component, StatusMixinDna):
+class ProteinComponent(Component, StatusMixinDna, GenbankMixin):
     """
     Description of a protein or protein fragment.
     """
@@ -427,6 +591,31 @@ class ProteinComponent(Component, StatusMixinDna):
                                       blank=False,
                                       on_delete=models.PROTECT)
 
+    ## sequence properties, updated on save (see updateSequenceStats);
+    ## back-filled by migration 0054 (or ./manage.py backfillseqstats)
+    sequenceLength = models.PositiveIntegerField('Length', null=True, 
+                                                 editable=False, db_index=True,
+                                                 help_text='amino acid count')
+
+    molWeight = models.FloatField('MW', null=True, editable=False, 
+                                  db_index=True, help_text='molecular weight in Da')
+
+    isoelectricPoint = models.FloatField('pI', null=True, editable=False,
+                                         db_index=True)
+
+    cysteinePairs = models.PositiveIntegerField(null=True, editable=False,
+                                    help_text='max. number of S-S bonds')
+
+    e280Reduced = models.PositiveIntegerField(null=True, editable=False,
+                                    help_text='extinction at 280 nm without S-S bonds')
+
+    e280Oxidized = models.PositiveIntegerField(null=True, editable=False,
+                                    help_text='extinction at 280 nm with all S-S bonds')
+
+    ## fields calculated by sequtils.protstats
+    STATS_FIELDS = ('sequenceLength', 'molWeight', 'isoelectricPoint', 
+                    'cysteinePairs', 'e280Reduced', 'e280Oxidized')
+
     @property
     def samples(self):
         """
@@ -435,72 +624,76 @@ class ProteinComponent(Component, StatusMixinDna):
         """
         return self.protein_samples
 
+    def save(self, *args, **kwargs):
+        self.updateSequenceStats()
+        return super(ProteinComponent, self).save(*args, **kwargs)
+
+    def updateSequenceStats(self):
+        """Re-calculate length, mass, pI and extinction of the sequence"""
+        stats = sequtils.protstats( [self.sequence] )[0]
+        for name, value in zip( self.STATS_FIELDS, stats ):
+            setattr( self, name, value )
+
+    @classmethod
+    def backfillSequenceStats(cls, chunksize=1000, missing=True):
+        """
+        Calculate the properties of all stored sequences in batches (see
+        DnaComponent.backfillSequenceStats).
+        @return int -- number of updated records
+        """
+        return _backfill( cls, cls.STATS_FIELDS, sequtils.protstats,
+                          chunksize=chunksize, missing=missing )
+
+    def _stat(self, name):
+        """@return value of a stored property, calculated if still missing"""
+        if getattr( self, name ) is None:
+            self.updateSequenceStats()
+        return getattr( self, name )
+
     @staticmethod
-    def nextAvailableId(user, prefix=None, category_id=None):
+    def idPrefix(user, category_id=None):
         """
-        determine the next free ID for given user and component category.
+        default ID prefix for given user and component category.
         category_id is ignored
         """
-        default_prefix = user.profile.pcPrefix or user.profile.prefix + 'p'
-        prefix = prefix or default_prefix
-        
-        return Component.nextAvailableId(user, prefix)
+        return user.profile.pcPrefix or user.profile.prefix + 'p'
 
     def length( self ):
         """@return int, amino acid count"""
-        if not self.sequence:
-            return 0
-        return len(self.sequence)
+        return self._stat('sequenceLength')
+    length.admin_order_field = 'sequenceLength'
     
     def mass( self ):
-        """@return float, ProtParam molecular weight"""
-        if not self.sequence:
-            return 0.0
-        try:
-            return round(PP.ProteinAnalysis(self.sequence).molecular_weight(),2)
-        except:
-            return 0.0
+        """@return float, ProtParam molecular weight (0 if not calculable)"""
+        return self._stat('molWeight')
+    mass.admin_order_field = 'molWeight'
+    mass.short_description = 'MW'
     
     def isoelectric( self ):
         """@return float, ProtParam iso-electric point"""
-        if not self.sequence:
-            return 0.0
-        try:
-            r = PP.ProteinAnalysis(self.sequence).isoelectric_point()
-            return round(r, 2)
-        except:
-            return 0.0
+        return self._stat('isoelectricPoint')
+    isoelectric.admin_order_field = 'isoelectricPoint'
+    isoelectric.short_description = 'pI'
     
     def maxSS( self ):
         """
         @return int, number of maximally possible S-S bonds (n_cys/2)
         """
-        if not self.sequence:
-            return 0
-        return divmod( self.sequence.upper().count('C'), 2 )[0] ## full pairs only
+        return self._stat('cysteinePairs')
         
     def e280reduced( self ):
         """
         E(Prot) = Numb(Tyr)*Ext(Tyr) + Numb(Trp)*Ext(Trp) + Numb(Cystine)*Ext(Cystine)
         where (for proteins in water measured at 280 nm): Ext(Tyr) = 1490, Ext(Trp) = 5500, Ext(Cystine) = 125;
-        @return float, extinction coefficient at 280 nm assuming no S-S bonds [/M/cm]
+        @return int, extinction coefficient at 280 nm assuming no S-S bonds [/M/cm]
         """
-        if not self.sequence:
-            return 0
-        eY = 1490
-        eW = 5500
-        nY = self.sequence.upper().count('Y')
-        nW = self.sequence.upper().count('W')        
-        return eY*nY + eW*nW
+        return self._stat('e280Reduced')
     
     def e280ss( self ):
         """
-        @return extinction at 280 nm [/M/cm] assuming all Cys are involved in S-S bonds
+        @return int, extinction at 280 nm [/M/cm] assuming all Cys are involved in S-S bonds
         """
-        if not self.sequence:
-            return 0
-        eSS = 125
-        return self.e280reduced() + self.maxSS() * eSS
+        return self._stat('e280Oxidized')
 
     class Meta:
         app_label = 'rotmic'
@@ -579,15 +772,12 @@ class OligoComponent(Component, StatusMixinCommercial):
         return self.oligo_samples
     
     @staticmethod
-    def nextAvailableId(user, prefix=None, category_id=None):
+    def idPrefix(user, category_id=None):
         """
-        determine the next free ID for given user and component category.
+        default ID prefix for given user and component category.
         category_id -- ignored
         """
-        default_prefix = user.profile.ocPrefix or user.profile.prefix + 'o'
-        prefix = prefix or default_prefix
-        
-        return Component.nextAvailableId(user, prefix)
+        return user.profile.ocPrefix or user.profile.prefix + 'o'
 
     def tm_nn(self, dnaconc=500, saltconc=50):
         """
@@ -595,10 +785,7 @@ class OligoComponent(Component, StatusMixinCommercial):
         saltconc - float, [salt] mM
         @return float, nearest neighbore dna/dna melting temperature
         """
-        if not self.sequence:
-            return 0
-        r = TM.Tm_staluc(self.sequence, dnac=dnaconc, saltc=saltconc)
-        return round(r,1)
+        return sequtils.tm_nn(self.sequence, dnaconc=dnaconc, saltconc=saltconc)
         
 
     class Meta:
@@ -631,15 +818,12 @@ class ChemicalComponent(Component, StatusMixinCommercial):
         return self.chemical_samples
 
     @staticmethod
-    def nextAvailableId(user, prefix=None, category_id=None):
+    def idPrefix(user, category_id=None):
         """
-        determine the next free ID for given user and component category.
+        default ID prefix for given user and component category.
         category_id is ignored
         """
-        default_prefix = user.profile.chPrefix or user.profile.prefix + 'r'
-        prefix = prefix or default_prefix
-        
-        return Component.nextAvailableId(user, prefix)
+        return user.profile.chPrefix or user.profile.prefix + 'r'
 
     class Meta:
         app_label = 'rotmic'
@@ -0,0 +1,166 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Per-prefix counters handing out new Component IDs (displayId) like
+'rg0012'. A new number is reserved with a single UPDATE that increments
+the counter in place -- the database serializes concurrent reservations
+(row lock on PostgreSQL / MySQL, database write lock on SQLite) so that no
+ID is ever handed out twice.
+
+Counters are created on first use from the highest ID in use. Saving a
+Component moves the counter past its (possibly hand-typed) ID. Re-create
+all counters from the existing IDs with::
+
+    ./manage.py rebuildids
+"""
+import re
+
+from django.db import models, transaction, IntegrityError
+
+## leading digits of the remainder of an ID after its prefix
+ex_number = re.compile('([0-9]+)')
+
+
+def numberedPrefixes(displayId):
+    """
+    All possible splits of an ID into prefix and number.
+    @param displayId: str, e.g. 'rg0012b'
+    @return dict { str : int } -- e.g. { 'rg' : 12, 'rg0' : 12, 'rg00' : 12 }
+    """
+    r = {}
+    for i in range(1, len(displayId)):
+        m = ex_number.match(displayId, i)
+        if m:
+            r[ displayId[:i] ] = int(m.group(1))
+    return r
+
+
+class IdCounter(models.Model):
+    """
+    Highest number handed out (or in use) for one ID prefix.
+    """
+    id_format = '%s%04i'
+
+    prefix = models.CharField(max_length=20, unique=True)
+
+    last = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return self.id_format % (self.prefix, self.last)
+
+    @staticmethod
+    def highestInUse(prefix):
+        """
+        @return int -- highest number of all Component IDs with this prefix
+        """
+        from .components import Component  ## local import to avoid recursion
+        
+        ids = Component.objects.filter(displayId__startswith=prefix)\
+                               .values_list('displayId', flat=True)
+        numbers = [ numberedPrefixes(i).get(prefix, 0) for i in ids ]
+        return max( numbers or [0] )
+
+    @classmethod
+    def seed(cls, prefix):
+        """Create the counter for a new prefix (unless it already exists)"""
+        try:
+            with transaction.atomic():
+                cls.objects.create(prefix=prefix, last=cls.highestInUse(prefix))
+        except IntegrityError:
+            pass  ## created by a concurrent request
+
+    @classmethod
+    def reserve(cls, prefix, n=1):
+        """
+        Atomically reserve the next n IDs for a prefix.
+        @param prefix: str, ID prefix, e.g. 'rg'
+        @param n: int, number of IDs to reserve
+        @return [ str ] -- n new IDs, e.g. ['rg0013', 'rg0014']
+        """
+        with transaction.atomic():
+            counter = cls.objects.filter(prefix=prefix)
+
+            if not counter.update(last=models.F('last') + n):
+                cls.seed(prefix)
+                counter.update(last=models.F('last') + n)
+
+            last = counter.values_list('last', flat=True)[0]
+
+        return [ cls.id_format % (prefix, i) for i in range(last-n+1, last+1) ]
+
+    @classmethod
+    def observe(cls, displayId):
+        """
+        Move existing counters past a used ID (e.g. typed in by hand).
+        @param displayId: str, ID of a saved Component
+        """
+        cls.observeMany([displayId])
+
+    @classmethod
+    def observeMany(cls, displayIds):
+        """
+        Move existing counters past several used IDs (see observe).
+        @param displayIds: [ str ], IDs of saved Components
+        """
+        numbers = {}
+        for i in displayIds:
+            for prefix, n in numberedPrefixes(i).items():
+                numbers[prefix] = max(n, numbers.get(prefix, 0))
+        if not numbers:
+            return
+
+        ## few counters but possibly many prefixes -- match them here
+        counters = set( cls.objects.values_list('prefix', flat=True) )
+        for prefix in counters.intersection( numbers ):
+            cls.objects.filter(prefix=prefix, last__lt=numbers[prefix])\
+                       .update(last=numbers[prefix])
+
+    @classmethod
+    def rebuild(cls, prefixes=[]):
+        """
+        Re-create all counters from the Component IDs in use (in a fixed
+        number of queries). Counters are created for all existing counter
+        prefixes, the given prefixes and the non-numeric start of every ID.
+        Numbers reserved but never used are released.
+        @param prefixes: [ str ], additional prefixes
+        @return int -- number of counters
+        """
+        from .components import Component  ## local import to avoid recursion
+
+        ids = list( Component.objects.values_list('displayId', flat=True) )
+
+        last = dict.fromkeys( cls.objects.values_list('prefix', flat=True), 0 )
+        last.update( dict.fromkeys(prefixes, 0) )
+        for i in ids:
+            m = re.match('([^0-9]+)[0-9]', i)
+            if m:
+                last.setdefault( m.group(1), 0 )
+
+        for i in ids:
+            for prefix, number in numberedPrefixes(i).items():
+                if prefix in last and number > last[prefix]:
+                    last[prefix] = number
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [ cls(prefix=p, last=n) for p, n in last.items() ] )
+
+        return len(last)
+
+    class Meta:
+        app_label = 'rotmic'
+        verbose_name = 'ID counter'
@@ -0,0 +1,209 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Background jobs (Excel import, genbank and trace file upload) and their
+progress and result reports. See rotmic.utils.jobs for the job runner.
+"""
+import datetime, json, threading
+
+from django.db import models, connection, transaction
+from django.utils import timezone
+from django.contrib.auth.models import User
+from django.core.urlresolvers import reverse
+import django.contrib.messages as messages
+
+
+class Job(models.Model):
+    """
+    A queued, running or finished background job. The job runner updates
+    the progress fields while the job is running; the job page polls them
+    through the jobStatus view.
+    """
+    STATUS_CHOICES = ( ('queued', 'queued'),
+                       ('running', 'running'),
+                       ('done', 'done'),
+                       ('failed', 'failed') )
+
+    user = models.ForeignKey(User, related_name='+')
+
+    ## name of a task registered in rotmic.utils.jobs
+    task = models.CharField(max_length=50)
+
+    title = models.CharField(max_length=200, blank=True)
+
+    ## lower-case model name of the affected records, e.g. 'dnacomponent'
+    modelName = models.CharField(max_length=50, blank=True)
+
+    ## JSON dict of task parameters
+    parameters = models.TextField(blank=True, default='')
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES,
+                              default='queued')
+
+    ## host and process id of the worker running this job
+    worker = models.CharField(max_length=100, blank=True)
+
+    createdAt = models.DateTimeField(auto_now_add=True)
+
+    startedAt = models.DateTimeField(null=True, blank=True)
+
+    modifiedAt = models.DateTimeField(auto_now=True)
+
+    total = models.IntegerField(default=0, help_text='number of items')
+
+    processed = models.IntegerField(default=0)
+
+    imported = models.IntegerField(default=0)
+
+    failed = models.IntegerField(default=0)
+
+    ## JSON list of [ message level, text ]
+    report = models.TextField(blank=True, default='')
+
+    def __init__(self, *args, **kwargs):
+        super(Job, self).__init__(*args, **kwargs)
+        self._report = json.loads(self.report or '[]')
+        self._parameters = json.loads(self.parameters or '{}')
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.title or self.task, self.status)
+
+    def get_absolute_url(self):
+        return reverse('job', args=(self.id,))
+
+    def param(self, key, default=None):
+        """@return value of task parameter key"""
+        return self._parameters.get(key, default)
+
+    def setParameters(self, **kwargs):
+        """Update task parameters (JSON-serializable values only)"""
+        self._parameters.update(kwargs)
+
+    @property
+    def atomic(self):
+        """all-or-nothing import (see ImportXls.run)"""
+        return self.param('atomic', True)
+
+    def addMessage(self, level, msg):
+        """
+        Record a message for the final report.
+        @param level: int, django.contrib.messages level (e.g. messages.ERROR)
+        @param msg: unicode
+        """
+        self._report.append( [level, msg] )
+
+    def reportedMessages(self):
+        """@return [ (int, unicode) ] -- message level and text"""
+        return [ tuple(m) for m in self._report ]
+
+    def errors(self):
+        """@return [ unicode ] -- error messages only"""
+        return [ m for level, m in self._report if level >= messages.ERROR ]
+
+    def isFinished(self):
+        return self.status in ('done', 'failed')
+
+    def percent(self):
+        """@return int -- percentage of processed items"""
+        if not self.total:
+            return 0
+        return min(100, 100 * self.processed / self.total)
+
+    def asDict(self):
+        """@return dict -- current state for the polling view"""
+        return { 'status' : self.status, 'total' : self.total,
+                 'processed' : self.processed, 'imported' : self.imported,
+                 'failed' : self.failed, 'percent' : self.percent(),
+                 'errors' : self.errors()[:50] }
+
+    def save(self, *args, **kwargs):
+        self.report = json.dumps(self._report)
+        self.parameters = json.dumps(self._parameters)
+        super(Job, self).save(*args, **kwargs)
+
+    def __saveOwnConnection(self):
+        try:
+            self.save()
+        finally:
+            connection.close()
+
+    def publish(self):
+        """
+        Save the current state such that it becomes visible to other
+        requests. Inside a running all-or-nothing import, the record is
+        saved from a helper thread with its own database connection
+        (outside the import transaction). Not possible with SQLite, which
+        locks the whole database during the import transaction.
+        """
+        if not transaction.get_connection().in_atomic_block:
+            self.save()
+
+        elif connection.vendor != 'sqlite':
+            t = threading.Thread( target=self.__saveOwnConnection )
+            t.start()
+            t.join()
+
+    @classmethod
+    def failStale(cls, timeout):
+        """
+        Mark running jobs as failed that have not published any progress
+        for timeout seconds -- their worker was most likely stopped or
+        restarted in the middle of the job.
+        @param timeout: int, seconds
+        @return int -- number of jobs marked as failed
+        """
+        limit = timezone.now() - datetime.timedelta(seconds=timeout)
+        n = 0
+        for job in cls.objects.filter(status='running', modifiedAt__lt=limit):
+            job.addMessage( messages.ERROR,
+                u'The job was interrupted (no progress since %s). '
+                u'Please check which records were changed and upload again.'
+                % timezone.localtime(job.modifiedAt).strftime('%Y-%m-%d %H:%M') )
+
+            ## unless the job has moved on in the meantime
+            n += cls.objects.filter(id=job.id, status='running',
+                                    modifiedAt=job.modifiedAt)\
+                            .update(status='failed', report=json.dumps(job._report),
+                                    modifiedAt=timezone.now())
+        return n
+
+    def deleteFiles(self):
+        """Remove uploaded input files from storage"""
+        for f in self.files.all():
+            f.f.delete(save=False)
+            f.delete()
+
+    class Meta:
+        app_label = 'rotmic'
+        ordering = ['-createdAt']
+        verbose_name = 'Background job'
+
+
+class JobFile(models.Model):
+    """Uploaded file kept in storage until its job has finished"""
+
+    job = models.ForeignKey(Job, related_name='files')
+
+    f = models.FileField(upload_to='jobs/', max_length=200)
+
+    ## original file name
+    name = models.CharField(max_length=200)
+
+    def __unicode__(self):
+        return self.name
+
+    class Meta:
+        app_label = 'rotmic'
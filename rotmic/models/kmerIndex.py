@@ -0,0 +1,323 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+K-mer index of DNA construct and oligo sequences for sequence search.
+
+Each K-mer (K nucleotides, encoded as integer with 2 bits per base) starting
+at every STEP-th position of a sequence is recorded together with its
+position. Any query of at least MIN_LENGTH nucleotides contains one of the
+recorded K-mers of each matching sequence within its first STEP positions
+(and another one within its last STEP positions). Candidate sequences are
+looked up by these K-mers (for both strands of the query) and then searched
+for exact matches. Sequences of plasmids and vector backbones are treated
+as circular: K-mers spanning the origin are indexed and matches may span the
+origin.
+
+The table is kept up to date by the signal handlers at the end of this
+module. Rebuild it from scratch with::
+
+    ./manage.py rebuildkmers
+"""
+from django.db import models, transaction, connection
+
+import rotmic.utils.sequtils as sequtils
+
+from .components import Component, DnaComponent, OligoComponent, \
+     pre_save_many, post_save_many
+from .componentTypes import DnaComponentType
+
+K = 12
+STEP = 4
+
+## shortest sequence that can be searched
+MIN_LENGTH = K + STEP - 1
+
+## component classes with indexed sequences
+INDEXED = (DnaComponent, OligoComponent)
+
+## categories of DnaComponentType with circular sequences
+CIRCULAR = ('Plasmid', 'Vector Backbone')
+
+_CODE = { 'A':0, 'C':1, 'G':2, 'T':3 }
+
+
+def kmers( seq, step=1, k=K ):
+    """
+    K-mers of a sequence (K-mers containing anything else than A, C, G, T
+    are skipped).
+    @param seq: str, upper-case nucleotide sequence
+    @param step: int, only report K-mers starting at multiples of step
+    @return generator of (int, int) -- position, K-mer code
+    """
+    mask = (1 << 2 * k) - 1
+    code, run = 0, 0
+    for i, c in enumerate( seq ):
+        b = _CODE.get( c )
+        if b is None:
+            run = 0
+            continue
+        code = ((code << 2) | b) & mask
+        run += 1
+        if run >= k and (i - k + 1) % step == 0:
+            yield i - k + 1, code
+
+
+def isCircular( component ):
+    """@return True if the sequence of a DnaComponent is circular"""
+    return isinstance( component, DnaComponent ) and \
+           component.componentType.category().name in CIRCULAR
+
+
+def _sequence( component ):
+    """@return str -- cleaned-up, upper-case sequence ('' if none)"""
+    return sequtils.cleanseq( component.sequence or '' ).encode('ascii', 'replace')
+
+
+def _indexed( seq, circular=False ):
+    """
+    @return [ (int, int) ] -- position and code of all indexed K-mers
+    """
+    if circular and len( seq ) >= K:
+        seq = seq + seq[:K-1]
+    return list( kmers( seq, step=STEP ) )
+
+
+def context( seq, start, length, circular=False, flank=10 ):
+    """
+    @return str -- matching stretch of seq (upper case) with flanking
+            nucleotides (lower case), across the origin of a circular seq
+    """
+    if circular:
+        r = sequtils.recenter_sequence( seq, start - flank,
+                                        stop=length + 2 * flank )
+        left = flank
+    else:
+        left = min( start, flank )
+        r = seq[ start - left : start + length + flank ]
+    return r[:left].lower() + r[left:left+length] + r[left+length:].lower()
+
+
+def findAll( seq, query, circular=False ):
+    """
+    @return [ int ] -- 0-based start of each (possibly overlapping)
+            occurrence of query in seq (incl. occurrences spanning the origin
+            of a circular seq)
+    """
+    n = len( seq )
+    if circular:
+        seq = seq + seq[:len(query)-1]
+
+    r = []
+    i = seq.find( query )
+    while i != -1 and i < n:
+        r.append( i )
+        i = seq.find( query, i + 1 )
+    return r
+
+
+class KmerIndex(models.Model):
+    """
+    Position of one K-mer in the sequence of a DnaComponent or OligoComponent
+    """
+    component = models.ForeignKey(Component, related_name='+',
+                                  on_delete=models.CASCADE)
+
+    kmer = models.IntegerField()
+
+    position = models.IntegerField()
+
+    @classmethod
+    def _insert(cls, rows):
+        """
+        Add index entries without creating a model instance for each of them.
+        @param rows: [ (int, int, int) ] -- component pk, K-mer code, position
+        """
+        qn = connection.ops.quote_name
+        sql = 'INSERT INTO %s (%s, %s, %s) VALUES (%%s, %%s, %%s)' % \
+              (qn(cls._meta.db_table), qn('component_id'), qn('kmer'), qn('position'))
+        if rows:
+            connection.cursor().executemany( sql, rows )
+
+    @classmethod
+    def updateMany(cls, components):
+        """Re-index the sequences of several DnaComponents or OligoComponents"""
+        components = [ o for o in components if isinstance(o, INDEXED) ]
+        if not components:
+            return
+
+        cls.objects.filter(component__in=[ o.pk for o in components ]).delete()
+
+        cls._insert( [ (o.pk, code, p) for o in components
+                       for p, code in _indexed( _sequence(o), isCircular(o) ) ] )
+
+    @classmethod
+    def update(cls, component):
+        """Re-index the sequence of a single DnaComponent or OligoComponent"""
+        cls.updateMany( [component] )
+
+    @classmethod
+    def rebuild(cls, chunksize=500):
+        """
+        Re-create the whole index.
+        @return int -- number of indexed sequences
+        """
+        circular = set( [ t.id for t in DnaComponentType.objects.all()
+                          if t.category().name in CIRCULAR ] )
+        n = 0
+        with transaction.atomic():
+            cls.objects.all().delete()
+
+            for model in INDEXED:
+                fields = ['id', 'sequence', 'componentType_id']
+                for pk, seq, t in model.objects.exclude(sequence=None)\
+                                     .values_list(*fields).iterator():
+                    seq = sequtils.cleanseq( seq ).encode('ascii', 'replace')
+                    entries = [ (pk, code, p) for p, code in _indexed(
+                                    seq, model is DnaComponent and t in circular) ]
+                    for i in range( 0, len(entries), chunksize ):
+                        cls._insert( entries[i:i+chunksize] )
+                    n += bool( entries )
+        return n
+
+    @classmethod
+    def candidateSets(cls, queries, chunksize=500):
+        """
+        Look up the components which may contain any of several sequences.
+        @param queries: [ str ], upper-case DNA sequences of at least MIN_LENGTH
+        @return [ set of int ] -- for each query, pk of components carrying
+                an indexed K-mer of both the beginning and the end of the
+                query (on either strand)
+        """
+        probes = []
+        for i, query in enumerate( queries ):
+            for s in (query, sequtils.dna2revcomplement( query )):
+                probes.append( (i, set( code for p, code in kmers( s[:MIN_LENGTH] ) ),
+                                   set( code for p, code in kmers( s[-MIN_LENGTH:] ) )) )
+
+        codes = list( set().union( *[ head | tail for i, head, tail in probes ] ) )
+        found = {}
+        for i in range( 0, len(codes), chunksize ):
+            for pk, code in cls.objects.filter(kmer__in=codes[i:i+chunksize])\
+                               .values_list('component_id', 'kmer').distinct():
+                found.setdefault( code, set() ).add( pk )
+
+        r = [ set() for query in queries ]
+        for i, head, tail in probes:
+            r[i] |= set().union( *[ found.get(c, set()) for c in head ] ) & \
+                    set().union( *[ found.get(c, set()) for c in tail ] )
+        return r
+
+    @classmethod
+    def candidates(cls, query):
+        """
+        @param query: str, upper-case DNA sequence of at least MIN_LENGTH
+        @return set of int -- pk of components which may contain query
+        """
+        return cls.candidateSets( [query] )[0]
+
+    @classmethod
+    def search(cls, query, models=(DnaComponent, OligoComponent), chunksize=200):
+        """
+        Find all DNA constructs and/or oligos containing a sequence.
+        @param query: str, DNA sequence (at least MIN_LENGTH nucleotides)
+        @param models: classes of components to search
+        @return [ (component, [ (int, str, str) ]) ] -- matching components
+                with 1-based start position (on the forward strand), strand
+                ('+' or '-') and sequence context (see context()) of each
+                match; sorted by component ID
+        @raise ValueError, if query is too short or not a DNA sequence
+        """
+        query = sequtils.cleanseq( query ).encode('ascii', 'replace')
+        if len( query ) < MIN_LENGTH:
+            raise ValueError('Search sequence must have at least %i nucleotides.'
+                             % MIN_LENGTH)
+        if not sequtils.isdna( query ):
+            raise ValueError('Search sequence must only contain A, C, G and T.')
+
+        revcomp = sequtils.dna2revcomplement( query )
+        pks = list( cls.candidates( query ) )
+        r = []
+
+        for model in models:
+            related = ['componentType__subTypeOf'] if model is DnaComponent else []
+            for i in range( 0, len(pks), chunksize ):
+                for o in model.objects.filter(pk__in=pks[i:i+chunksize])\
+                                      .select_related(*related):
+                    seq = _sequence( o )
+                    circular = isCircular( o )
+
+                    hits = [ (p+1, strand, context(seq, p, len(query), circular))
+                             for strand, q in (('+', query), ('-', revcomp))
+                             for p in findAll(seq, q, circular) ]
+                    if hits:
+                        r.append( (o, sorted(hits)) )
+
+        r.sort( key=lambda x: x[0].displayId )
+        return r
+
+    def __unicode__(self):
+        return u'%s: %i' % (self.component_id, self.position)
+
+    class Meta:
+        app_label = 'rotmic'
+        index_together = [ ('kmer', 'component') ]
+        verbose_name = 'Sequence k-mer index'
+
+
+## Signal handlers keeping the index in sync
+
+def _indexKey( sender, o ):
+    """@return tuple -- values the index of a construct depends on"""
+    if sender is DnaComponent:
+        return (o.sequence, o.componentType_id)
+    return (o.sequence,)
+
+def _oldKeys( sender, objects ):
+    """@return { int : tuple } -- index keys of objects as saved in the database"""
+    fields = ['id', 'sequence', 'componentType_id'][:len(_indexKey(sender, objects[0])) + 1]
+    return dict( [ (r[0], tuple(r[1:])) for r in
+                   sender.objects.filter(pk__in=[ o.pk for o in objects if o.pk ])\
+                                 .values_list(*fields) ] )
+
+def component_presave(sender, instance, raw=False, **kwargs):
+    """remember the previous sequence (and type) of a modified construct"""
+    if instance.pk and not raw and not instance.__dict__.get('_savingMany'):
+        instance._kmerOld = _oldKeys( sender, [instance] ).get( instance.pk )
+
+def component_saved(sender, instance, raw=False, **kwargs):
+    if raw or instance.__dict__.get('_savingMany'):
+        return  ## see components_saved
+    old = instance.__dict__.pop('_kmerOld', None)
+    if old != _indexKey( sender, instance ):
+        KmerIndex.update( instance )
+
+def components_presave(sender, instances, **kwargs):
+    """Component.saveMany -- previous sequences of a whole batch"""
+    old = _oldKeys( sender, instances )
+    for o in instances:
+        o._kmerOld = old.get( o.pk )
+
+def components_saved(sender, instances, **kwargs):
+    """Component.saveMany -- re-index all new or changed sequences at once"""
+    KmerIndex.updateMany( [ o for o in instances
+                            if o.__dict__.pop('_kmerOld', None) != _indexKey( sender, o ) ] )
+
+
+for componentClass in INDEXED:
+    models.signals.pre_save.connect(component_presave, sender=componentClass)
+    models.signals.post_save.connect(component_saved, sender=componentClass)
+    pre_save_many.connect(components_presave, sender=componentClass)
+    post_save_many.connect(components_saved, sender=componentClass)
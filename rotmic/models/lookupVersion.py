@@ -0,0 +1,140 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Version stamps of the in-memory auto-completion indices (see
+rotmic.utils.lookupIndex). Each web server process keeps its own copy of
+the ID and name index of a component model and re-loads it whenever the
+stamp in this table has moved on. The signal handlers at the end of this
+module bump the stamp of a model whenever one of its records (or one of
+its component types) is saved or deleted, in any process. Bulk imports
+(background jobs) collect their changes and bump each stamp only once,
+after the import (see LookupVersion.deferred).
+"""
+import contextlib, threading
+
+from django.db import models, transaction, IntegrityError
+
+from .components import DnaComponent, CellComponent, OligoComponent, \
+     ChemicalComponent, ProteinComponent, post_save_many
+
+## component models with an auto-completion index
+INDEXED = (DnaComponent, CellComponent, OligoComponent, ChemicalComponent,
+           ProteinComponent)
+
+## models changed inside LookupVersion.deferred() blocks of this thread
+_deferred = threading.local()
+
+
+class LookupVersion(models.Model):
+    """
+    Number of changes to the records of one model (since the stamp was created).
+    """
+    model = models.CharField(max_length=50, unique=True)
+
+    version = models.IntegerField(default=0)
+
+    @classmethod
+    def current(cls, model):
+        """
+        @param model: Model class
+        @return int -- current version stamp of model (0 if never changed)
+        """
+        r = cls.objects.filter(model=model.__name__)\
+                       .values_list('version', flat=True)
+        return r[0] if r else 0
+
+    @classmethod
+    def bump(cls, model):
+        """Record a change to the records of model"""
+        name = model.__name__
+        stamp = cls.objects.filter(model=name)
+
+        if not stamp.update(version=models.F('version') + 1):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(model=name, version=1)
+            except IntegrityError:
+                ## created by a concurrent request
+                stamp.update(version=models.F('version') + 1)
+
+    @classmethod
+    @contextlib.contextmanager
+    def deferred(cls):
+        """
+        Record changes made inside the block and bump the stamp of each
+        changed model once, when the (outermost) block is left. Long import
+        transactions inside the block then neither lock the stamps (and
+        with them ordinary saves of other users) nor invalidate the indices
+        of other processes record by record::
+
+            with LookupVersion.deferred():
+                with transaction.atomic():
+                    ... save many components ...
+        """
+        if getattr(_deferred, 'models', None) is not None:
+            yield
+            return
+
+        _deferred.models = set()
+        try:
+            yield
+        finally:
+            changed, _deferred.models = _deferred.models, None
+            for model in changed:
+                cls.bump( model )
+
+    @classmethod
+    def changed(cls, model):
+        """Bump the stamp of model now or at the end of a deferred() block"""
+        pending = getattr(_deferred, 'models', None)
+        if pending is None:
+            cls.bump( model )
+        else:
+            pending.add( model )
+
+    def __unicode__(self):
+        return u'%s: %i' % (self.model, self.version)
+
+    class Meta:
+        app_label = 'rotmic'
+        verbose_name = 'Lookup version'
+
+
+## Signal handlers keeping the stamps up to date
+
+def component_changed(sender, instance, **kwargs):
+    if not instance.__dict__.get('_savingMany'):
+        LookupVersion.changed( sender )
+
+def components_saved(sender, instances, **kwargs):
+    """Component.saveMany -- one stamp for the whole batch"""
+    LookupVersion.changed( sender )
+
+def type_changed(sender, instance, **kwargs):
+    """Changed (parent) types affect the filters of lookups"""
+    for model in INDEXED:
+        if model._meta.get_field('componentType').rel.to is sender:
+            LookupVersion.changed( model )
+
+
+for componentClass in INDEXED:
+    models.signals.post_save.connect(component_changed, sender=componentClass)
+    models.signals.post_delete.connect(component_changed, sender=componentClass)
+    post_save_many.connect(components_saved, sender=componentClass)
+
+    typeClass = componentClass._meta.get_field('componentType').rel.to
+    models.signals.post_save.connect(type_changed, sender=typeClass)
+    models.signals.post_delete.connect(type_changed, sender=typeClass)
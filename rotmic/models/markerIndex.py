@@ -0,0 +1,272 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Denormalized (construct -> effective marker) tables. The effective markers
+of a DNA construct are its own markers plus, recursively, those of its vector
+backbone. The effective markers of a cell are its genomic markers plus the
+effective markers of its plasmid.
+
+The tables are kept up to date by the signal handlers at the end of this
+module. Rebuild them from scratch with::
+
+    ./manage.py rebuildmarkers
+"""
+import collections
+
+from django.db import models, transaction
+
+from .components import DnaComponent, CellComponent, \
+     pre_save_many, post_save_many
+
+
+class MarkerIndex(models.Model):
+    """
+    Base class for construct -> effective marker tables. Sub-classes
+    define a ForeignKey to the construct and name it in owner_field.
+    """
+    owner_field = None
+
+    marker = models.ForeignKey(DnaComponent, related_name='+',
+                               on_delete=models.CASCADE)
+
+    @classmethod
+    def markerIds(cls, owner):
+        """@return set of int -- pk of all indexed markers of owner"""
+        r = cls.objects.filter(**{cls.owner_field: owner})
+        return set( r.values_list('marker_id', flat=True) )
+
+    @classmethod
+    def sync(cls, owner, marker_ids):
+        """
+        Replace the index entries of owner by the given markers.
+        @param owner: DnaComponent or CellComponent
+        @param marker_ids: set of int, pk of the effective markers
+        @return True if the index of owner has changed
+        """
+        current = cls.markerIds(owner)
+
+        obsolete = current - marker_ids
+        if obsolete:
+            cls.objects.filter(marker_id__in=obsolete,
+                               **{cls.owner_field: owner}).delete()
+
+        new = marker_ids - current
+        cls.objects.bulk_create(
+            [ cls(marker_id=m, **{cls.owner_field: owner}) for m in new ] )
+
+        return bool(obsolete or new)
+
+    class Meta:
+        app_label = 'rotmic'
+        abstract = True
+
+
+class DnaMarkerIndex(MarkerIndex):
+    """Effective markers of a DnaComponent (incl. those of its vector)"""
+    owner_field = 'dna'
+
+    dna = models.ForeignKey(DnaComponent, related_name='markerIndex',
+                            on_delete=models.CASCADE)
+
+    @classmethod
+    def update(cls, dna):
+        """
+        Re-index the markers of one DnaComponent and propagate any change
+        to plasmids using it as vector backbone and to cells carrying it.
+        """
+        ids = set( dna.markers.values_list('id', flat=True) )
+        if dna.vectorBackbone_id:
+            ids |= cls.markerIds(dna.vectorBackbone_id)
+
+        if cls.sync(dna, ids):
+            for plasmid in dna.as_vector_in_plasmid.all():
+                cls.update(plasmid)
+            for cell in dna.as_plasmid_in_cell.all():
+                CellMarkerIndex.update(cell)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Re-create the whole index from DnaComponent.markers and
+        .vectorBackbone (in a fixed number of queries).
+        @return int -- number of index entries
+        """
+        markers = collections.defaultdict(set)
+        through = DnaComponent.markers.through.objects.values_list(
+            'from_dnacomponent_id', 'to_dnacomponent_id')
+        for dna, marker in through:
+            markers[dna].add(marker)
+
+        vectors = dict( DnaComponent.objects.values_list('id','vectorBackbone_id') )
+
+        closure = {}
+        def resolve(pk, visited=()):
+            if pk not in closure:
+                r = set(markers[pk])
+                v = vectors.get(pk)
+                if v and v not in visited:  ## guard against vector cycles
+                    r |= resolve(v, visited + (pk,))
+                closure[pk] = r
+            return closure[pk]
+
+        entries = [ cls(dna_id=pk, marker_id=m)
+                    for pk in vectors for m in resolve(pk) ]
+
+        cls.objects.all().delete()
+        cls.objects.bulk_create(entries)
+        return len(entries)
+
+    class Meta:
+        app_label = 'rotmic'
+        unique_together = ('dna', 'marker')
+        verbose_name = 'DNA marker index'
+
+
+class CellMarkerIndex(MarkerIndex):
+    """Effective markers of a CellComponent (incl. those of its plasmid)"""
+    owner_field = 'cell'
+
+    cell = models.ForeignKey(CellComponent, related_name='markerIndex',
+                             on_delete=models.CASCADE)
+
+    @classmethod
+    def update(cls, cell):
+        """Re-index the markers of a single CellComponent"""
+        ids = set( cell.markers.values_list('id', flat=True) )
+        if cell.plasmid_id:
+            ids |= DnaMarkerIndex.markerIds(cell.plasmid_id)
+        cls.sync(cell, ids)
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Re-create the whole index from CellComponent.markers and the
+        (already rebuilt) DnaMarkerIndex of each plasmid.
+        @return int -- number of index entries
+        """
+        markers = collections.defaultdict(set)
+
+        through = CellComponent.markers.through.objects.values_list(
+            'cellcomponent_id', 'dnacomponent_id')
+        for cell, marker in through:
+            markers[cell].add(marker)
+
+        dnamarkers = collections.defaultdict(set)
+        for dna, marker in DnaMarkerIndex.objects.values_list('dna_id','marker_id'):
+            dnamarkers[dna].add(marker)
+
+        entries = []
+        for pk, plasmid in CellComponent.objects.values_list('id','plasmid_id'):
+            ids = markers[pk] | dnamarkers.get(plasmid, set())
+            entries += [ cls(cell_id=pk, marker_id=m) for m in ids ]
+
+        cls.objects.all().delete()
+        cls.objects.bulk_create(entries)
+        return len(entries)
+
+    class Meta:
+        app_label = 'rotmic'
+        unique_together = ('cell', 'marker')
+        verbose_name = 'Cell marker index'
+
+
+def rebuildMarkerIndex():
+    """
+    Re-create DnaMarkerIndex and CellMarkerIndex from scratch.
+    @return (int, int) -- number of DNA and cell index entries
+    """
+    with transaction.atomic():
+        return DnaMarkerIndex.rebuild(), CellMarkerIndex.rebuild()
+
+
+## Signal handlers keeping the index in sync
+
+def dna_saved(sender, instance, raw=False, **kwargs):
+    """vectorBackbone may have changed"""
+    if not raw and not instance.__dict__.get('_savingMany'):
+        DnaMarkerIndex.update(instance)
+
+def cell_saved(sender, instance, raw=False, **kwargs):
+    """plasmid may have changed"""
+    if not raw and not instance.__dict__.get('_savingMany'):
+        CellMarkerIndex.update(instance)
+
+## index and link to the component whose markers are inherited
+INHERITED = { DnaComponent : (DnaMarkerIndex, 'vectorBackbone'),
+              CellComponent : (CellMarkerIndex, 'plasmid') }
+
+def components_presave(sender, instances, **kwargs):
+    """Component.saveMany -- remember the vector backbones / plasmids of a batch"""
+    field = INHERITED[sender][1]
+    old = dict( sender.objects.filter(pk__in=[ o.pk for o in instances if o.pk ])\
+                .values_list('id', field) )
+    for o in instances:
+        o._markerOld = old.get(o.pk)
+
+def components_saved(sender, instances, **kwargs):
+    """
+    Component.saveMany -- re-index only records with a new vector backbone /
+    plasmid (markers themselves are indexed by m2m_changed)
+    """
+    index, field = INHERITED[sender]
+    for o in instances:
+        if o.__dict__.pop('_markerOld', None) != getattr(o, field + '_id'):
+            index.update(o)
+
+def _markers_changed(index, owners, reverse_name, instance, action, reverse,
+                     pk_set):
+    """
+    Common m2m_changed handler. If reverse, instance is the marker and the
+    affected constructs are given by pk_set (or, for clear(), have to be
+    recorded before the relation is cleared).
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            index.update(instance)
+        return
+
+    if action == 'pre_clear':
+        instance._markerIndexPending = list(
+            getattr(instance, reverse_name).values_list('id', flat=True) )
+        return
+
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_markerIndexPending', [])
+
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        for o in owners.filter(id__in=pk_set):
+            index.update(o)
+
+def dna_markers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _markers_changed(DnaMarkerIndex, DnaComponent.objects, 'as_marker_in_dna',
+                     instance, action, reverse, pk_set)
+
+def cell_markers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _markers_changed(CellMarkerIndex, CellComponent.objects, 'as_marker_in_cell',
+                     instance, action, reverse, pk_set)
+
+
+models.signals.post_save.connect(dna_saved, sender=DnaComponent)
+models.signals.post_save.connect(cell_saved, sender=CellComponent)
+
+for componentClass in INHERITED:
+    pre_save_many.connect(components_presave, sender=componentClass)
+    post_save_many.connect(components_saved, sender=componentClass)
+
+models.signals.m2m_changed.connect(dna_markers_changed,
+                                   sender=DnaComponent.markers.through)
+models.signals.m2m_changed.connect(cell_markers_changed,
+                                   sender=CellComponent.markers.through)
@@ -0,0 +1,257 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Denormalized table of occupied sample positions per Container. Positions
+are wells ('A01' .. 'H12') of 96 / 384 well plates or numbered slots
+('01', '02', ...) of boxes and other containers. The occupancy of one
+container is a string with one '0' (free) or '1' (occupied) character per
+position (plate wells row by row), such that next free position and similar
+queries need a single database lookup whatever the number of samples.
+
+The table is kept up to date by the signal handlers at the end of this
+module. Rebuild it from scratch with::
+
+    ./manage.py rebuildoccupancy
+"""
+import re, string, collections
+
+from django.db import models, transaction
+
+from .storage import Container
+from .samples import Sample, DnaSample, CellSample, OligoSample, \
+     ChemicalSample, ProteinSample
+
+ex_position = re.compile('([A-Za-z]{0,1})([0-9]+)([a-zA-Z]{0,3})')
+
+
+def splitPosition( position ):
+    """
+    position - str, like 'A1' or '12' or '12b'
+    @return (str, int, str) - letter, number, letter(s); ('', None, '') if
+            position doesn't follow any of these patterns
+    """
+    match = ex_position.match(position)
+    if not match:
+        return '', None, ''
+    
+    letter, number, suffix = match.groups()
+    return letter.upper(), int(number), suffix.lower()
+
+
+def positionIndex( position, geometry=None ):
+    """
+    @param position: str, sample displayId like 'B03' or '12' or '12b'
+    @param geometry: (int, int), rows and columns of a plate (None for boxes)
+    @return int -- index of well or slot, None if position doesn't fit
+    """
+    letter, number, suffix = splitPosition( position )
+    if not number:
+        return None
+
+    if geometry is None:
+        return None if letter else number - 1
+
+    rows, columns = geometry
+    row = string.ascii_uppercase.find( letter ) if letter else -1
+    if not 0 <= row < rows or number > columns:
+        return None
+    return row * columns + number - 1
+
+
+def positionName( index, geometry=None ):
+    """
+    Inverse of positionIndex.
+    @return str -- position like 'B03' (plates) or '12' (boxes)
+    """
+    if geometry is None:
+        return '%02i' % (index + 1)
+
+    row, column = divmod( index, geometry[1] )
+    return string.ascii_uppercase[row] + '%02i' % (column + 1)
+
+
+class ContainerOccupancy(models.Model):
+    """
+    Occupied positions of one container (see module documentation).
+    """
+    container = models.OneToOneField(Container, related_name='occupancy',
+                                     on_delete=models.CASCADE)
+
+    ## one '0' or '1' per position; boxes only up to the last occupied slot
+    slots = models.TextField(blank=True, default='')
+
+    @staticmethod
+    def compute(geometry, positions):
+        """
+        @param geometry: (int, int) or None, see Container.geometry
+        @param positions: [ str ], displayIds of all samples in the container
+        @return str -- slots string
+        """
+        occupied = set( positionIndex(p, geometry) for p in positions )
+        occupied.discard( None )
+
+        if geometry:
+            size = geometry[0] * geometry[1]
+        else:
+            size = max( occupied ) + 1 if occupied else 0
+
+        return ''.join( '1' if i in occupied else '0' for i in range(size) )
+
+    @classmethod
+    def update(cls, container, exclude=None, create=True):
+        """
+        Re-compute the occupancy of one container from its samples.
+        @param container: Container or int, pk of container
+        @param exclude: int, pk of a (deleted) sample to ignore
+        @param create: bool, create the entry if missing
+        @return ContainerOccupancy or None
+        """
+        if not isinstance( container, Container ):
+            container = Container.objects.get(id=container)
+
+        with transaction.atomic():
+            ## lock the row so that concurrent updates are serialized
+            r = list( cls.objects.select_for_update().filter(container=container) )
+            if not r and not create:
+                return None
+            r = r[0] if r else cls(container=container)
+            r.container = container
+
+            positions = Sample.objects.filter(container=container)\
+                                      .exclude(id=exclude)\
+                                      .values_list('displayId', flat=True)
+            r.slots = cls.compute( container.geometry(), positions )
+            r.save()
+        
+        return r
+
+    @classmethod
+    def forContainer(cls, container_id):
+        """
+        @param container_id: int, pk of Container
+        @return ContainerOccupancy -- created if missing
+        """
+        try:
+            return cls.objects.select_related('container')\
+                              .get(container_id=container_id)
+        except cls.DoesNotExist:
+            return cls.update( container_id )
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Re-create the whole table from all samples (in a fixed number of
+        queries).
+        @return int -- number of containers
+        """
+        positions = collections.defaultdict(list)
+        for pk, position in Sample.objects.values_list('container_id','displayId'):
+            positions[pk].append( position )
+
+        entries = [ cls(container=c, slots=cls.compute(c.geometry(), positions[c.id]))
+                    for c in Container.objects.all() ]
+
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create( entries )
+        return len(entries)
+
+    def geometry(self):
+        return self.container.geometry()
+
+    def isFree(self, position):
+        """
+        @param position: str, e.g. 'A01' or '12'
+        @return bool -- False if occupied or not a valid position 
+        """
+        i = positionIndex( position, self.geometry() )
+        if i is None:
+            return False
+        return i >= len(self.slots) or self.slots[i] == '0'
+
+    def firstFree(self, n):
+        """
+        @param n: int, number of positions requested
+        @return [ str ] -- the first (up to) n free positions in fill order
+                (fewer than n if a plate is running full)
+        """
+        geometry = self.geometry()
+        r = []
+        i = self.slots.find('0')
+
+        while i != -1 and len(r) < n:
+            r.append( positionName(i, geometry) )
+            i = self.slots.find('0', i + 1)
+
+        if not geometry:  ## boxes continue after the last occupied slot
+            r += [ positionName(i, geometry) 
+                   for i in range(len(self.slots), len(self.slots) + n - len(r)) ]
+        return r
+
+    def nextFree(self):
+        """@return str -- first free position, '' if the container is full"""
+        r = self.firstFree(1)
+        return r[0] if r else ''
+
+    def __unicode__(self):
+        return u'%s: %i occupied' % (self.container.displayId,
+                                     self.slots.count('1'))
+
+    class Meta:
+        app_label = 'rotmic'
+        verbose_name = 'Container occupancy'
+
+
+## Signal handlers keeping the table in sync
+
+def sample_presave(sender, instance, raw=False, **kwargs):
+    """remember the previous container of a moved sample"""
+    if instance.pk and not raw:
+        instance._occupancyOld = list( Sample.objects.filter(id=instance.pk)\
+                                       .values_list('container_id', flat=True) )
+
+def sample_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    ContainerOccupancy.update( instance.container )
+
+    for old in instance.__dict__.pop('_occupancyOld', []):
+        if old != instance.container_id:
+            ContainerOccupancy.update( old )
+
+def sample_deleted(sender, instance, **kwargs):
+    """
+    The parent Sample record may still exist at this point. Don't re-create
+    the entry of a container that is being deleted along with its samples.
+    """
+    container = Container.objects.filter(id=instance.container_id).first()
+    if container:
+        ContainerOccupancy.update( container, exclude=instance.pk, 
+                                   create=False )
+
+def container_saved(sender, instance, raw=False, **kwargs):
+    """containerType may have changed"""
+    if not raw:
+        ContainerOccupancy.update( instance )
+
+
+for sampleClass in (DnaSample, CellSample, OligoSample, ChemicalSample, 
+                    ProteinSample):
+    models.signals.pre_save.connect(sample_presave, sender=sampleClass)
+    models.signals.post_save.connect(sample_saved, sender=sampleClass)
+    models.signals.post_delete.connect(sample_deleted, sender=sampleClass)
+
+models.signals.post_save.connect(container_saved, sender=Container)
@@ -16,7 +16,7 @@
 from datetime import datetime
 import re
 
-from django.db import models
+from django.db import models, connection
 from django.db.models import Q
 import django.utils.html as html
 from django.contrib.auth.models import User, Group
@@ -51,6 +51,10 @@ class SampleProvenanceType(models.Model):
         ordering = ['isDefault', 'name']
     
 
+## default number of generations followed by Sample.pedigree
+PEDIGREE_DEPTH = 10
+
+
 class SampleProvenance(models.Model):
     """Sample History"""
     
@@ -78,6 +82,79 @@ class SampleProvenance(models.Model):
         except:
             return 'undefined Sample Provenance'
 
+    @classmethod
+    def _walkSql(cls, n, ancestors=True):
+        """
+        Recursive query following provenance records from n start samples
+        (to their sources if ancestors, otherwise to derived samples).
+        UNION drops rows already found, so each link enters the walk at
+        most once per generation -- cycles and samples reached on several
+        paths cost no more than links x generations rows.
+        """
+        qn = connection.ops.quote_name
+        near = qn(cls._meta.get_field('sample').column)
+        far = qn(cls._meta.get_field('sourceSample').column)
+        if not ancestors:
+            near, far = far, near
+
+        return """
+        WITH RECURSIVE pedigree (id, far, depth) AS (
+            SELECT p.id, p.%(far)s, 1
+            FROM %(table)s p
+            WHERE p.%(near)s IN (%(marks)s) AND p.%(far)s IS NOT NULL
+              AND p.%(far)s <> p.%(near)s
+          UNION
+            SELECT p.id, p.%(far)s, g.depth + 1
+            FROM %(table)s p JOIN pedigree g ON p.%(near)s = g.far
+            WHERE g.depth < %%s AND p.%(far)s IS NOT NULL
+              AND p.%(far)s <> p.%(near)s
+        )
+        SELECT id, MIN(depth) FROM pedigree GROUP BY id
+        """ % { 'table' : qn(cls._meta.db_table), 'near' : near, 'far' : far,
+                'marks' : ', '.join( ['%s'] * n ) }
+
+    @classmethod
+    def walk(cls, pks, ancestors=True, depth=PEDIGREE_DEPTH):
+        """
+        Follow provenance records over several generations in a single
+        recursive query (PostgreSQL, SQLite >= 3.8.3), otherwise with one
+        query per generation.
+        @param pks: [ int ], ids of start samples
+        @param ancestors: bool, follow links to source samples (True) or
+                          to derived samples (False)
+        @param depth: int, maximum number of generations
+        @return { int : int } -- SampleProvenance id -> generation of the
+                link (1 for links of the start samples), i.e. one more than
+                the fewest links between a start sample and the link
+        """
+        pks = list( pks )
+        if not pks or depth < 1:
+            return {}
+
+        if connection.vendor in ('postgresql', 'sqlite'):
+            cursor = connection.cursor()
+            cursor.execute( cls._walkSql( len(pks), ancestors ), pks + [depth] )
+            return dict( cursor.fetchall() )
+
+        near, far = ('sample', 'sourceSample') if ancestors else ('sourceSample', 'sample')
+        r = {}
+        visited = set( pks )
+        following = set( pks )  ## samples first reached in the last generation
+        for generation in range( 1, depth + 1 ):
+            links = cls.objects.filter( **{ near + '__in' : following,
+                                            far + '__isnull' : False } )\
+                               .values_list( 'id', near + '_id', far + '_id' )
+            following = set()
+            for pk, a, b in links:
+                if a != b:
+                    r[pk] = generation
+                    if b not in visited:
+                        following.add( b )
+            visited |= following
+            if not following:
+                break
+        return r
+
     class Meta:
         app_label = 'rotmic'
         verbose_name  = 'Sample History'
@@ -179,7 +256,77 @@ class Sample( UserMixin, ReadonlyUrlMixin ):
     def sourceSamples(self):
         """All samples that are registered as source in provenance records"""
         return Sample.objects.filter(sampleChilds__sample__id=self.id)
-    
+
+    def ancestors(self, depth=PEDIGREE_DEPTH):
+        """
+        @return QuerySet of Sample -- sources, their sources and so on, up
+                to depth generations back (see SampleProvenance.walk)
+        """
+        links = SampleProvenance.walk( [self.id], depth=depth )
+        return Sample.objects.filter(sampleChilds__id__in=links.keys())\
+                             .exclude(id=self.id).distinct()
+
+    def descendants(self, depth=PEDIGREE_DEPTH):
+        """
+        @return QuerySet of Sample -- samples derived from this one, samples
+                derived from those and so on, up to depth generations
+        """
+        links = SampleProvenance.walk( [self.id], ancestors=False, depth=depth )
+        return Sample.objects.filter(sampleParents__id__in=links.keys())\
+                             .exclude(id=self.id).distinct()
+
+    def pedigree(self, depth=PEDIGREE_DEPTH):
+        """
+        Ancestors and descendants of this sample with all provenance records
+        between them, loaded with a fixed number of queries (independent of
+        the number of samples and generations).
+        @param depth: int, maximum number of generations in either direction
+        @return dict with keys
+           'links'       -- [ (SampleProvenance, int) ], provenance record and
+                            its generation (negative for ancestors), with
+                            sample and sourceSample of the specific sub-class
+           'generations' -- [ (int, [ Sample ]) ], samples by generation
+                            (negative for ancestors, 0 for this sample)
+           'truncated'   -- bool, True if there are more than depth generations
+        """
+        ## one more generation tells whether the pedigree is complete
+        walked = [ (pk, -g) for pk, g in SampleProvenance.walk( [self.id], 
+                                                  depth=depth + 1 ).items() ]
+        walked += SampleProvenance.walk( [self.id], ancestors=False,
+                                         depth=depth + 1 ).items()
+
+        generation = {}  ## links within a cycle are both; keep the closer one
+        for pk, g in sorted( walked, key=lambda x: abs(x[1]) ):
+            if abs(g) <= depth:
+                generation.setdefault( pk, g )
+
+        links = list( SampleProvenance.objects.filter(id__in=generation.keys())\
+                      .select_related('provenanceType') )
+        pks = set( [self.id] )
+        for l in links:
+            pks.update( [l.sample_id, l.sourceSample_id] )
+
+        samples = Sample.objects.filter(id__in=pks)\
+                  .select_related('container', 'concentrationUnit', 'amountUnit')\
+                  .prefetch_subclasses()
+        samples = dict( [ (s.id, s) for s in samples ] )
+
+        levels = { self.id : 0 }
+        for l in sorted( links, key=lambda l: abs(generation[l.id]) ):
+            l.sample = samples[l.sample_id]
+            l.sourceSample = samples[l.sourceSample_id]
+            g = generation[l.id]
+            levels.setdefault( l.sourceSample_id if g < 0 else l.sample_id, g )
+
+        generations = {}
+        for pk, g in levels.items():
+            generations.setdefault( g, [] ).append( samples[pk] )
+
+        return { 'links' : sorted( [ (l, generation[l.id]) for l in links ],
+                                   key=lambda x: (x[1], x[0].id) ),
+                 'generations' : sorted( generations.items() ),
+                 'truncated' : max( [ abs(g) for pk, g in walked ] or [0] ) > depth }
+
     
     def sameSamples(self):
         """
@@ -243,6 +390,7 @@ class Sample( UserMixin, ReadonlyUrlMixin ):
         return html.mark_safe('<a href="%s" title="%s">%s</a>' % (url, title, r))
     showExtendedId.allow_tags = True
     showExtendedId.short_description = u'Box : ID'
+    showExtendedId.select_related = ('container',)
     
     def showContent(self):
         """Table display of linked content or ''"""
@@ -267,12 +415,14 @@ class Sample( UserMixin, ReadonlyUrlMixin ):
         unit = unicode(self.concentrationUnit or '')
         return conc + ' '+ unit
     showConcentration.short_description = 'Concentration' 
+    showConcentration.select_related = ('concentrationUnit',)
     
     def showAmount(self):
         amount = unicode( self.amount or '' )
         unit   = unicode( self.amountUnit or '' )
         return amount + ' '+ unit
     showAmount.short_description = 'Amount' 
+    showAmount.select_related = ('amountUnit',)
     
     def showAliquots(self):
         """@return: str; number of aliquots"""
@@ -293,6 +443,27 @@ class Sample( UserMixin, ReadonlyUrlMixin ):
     showStatus.allow_tags = True
     showStatus.short_description = 'Status'
 
+    def asDict(self):
+        """
+        @return dict -- summary for JSON views (needs no further queries if
+        the content and unit relations have been loaded with the sample)
+        """
+        x = self.content
+        return { 'id' : self.id, 'position' : self.displayId,
+                 'url' : self.get_absolute_url(),
+                 'type' : self.showType(),
+                 'content' : x.displayId if x else '',
+                 'contentName' : x.name if x else '',
+                 'contentUrl' : x.get_absolute_url() if x else '',
+                 'status' : self.status,
+                 'statusLabel' : self.get_status_display(),
+                 'concentration' : self.concentration,
+                 'concentrationUnit' : unicode(self.concentrationUnit or ''),
+                 'amount' : self.amount,
+                 'amountUnit' : unicode(self.amountUnit or ''),
+                 'aliquots' : self.aliquotNr,
+                 'description' : self.description }
+
     class Meta:
         app_label = 'rotmic'
         verbose_name  = 'Sample'
@@ -323,30 +494,35 @@ class DnaSample( Sample ):
     @property
     def content(self):
         return self.dna
+    content.fget.select_related = ('dna',)
 
     def showContent(self):
         return super(DnaSample, self).showContent()
     showContent.allow_tags = True
     showContent.short_description = 'DNA construct'
+    showContent.select_related = ('dna',)
     
     def showSequencing(self):
         """
         Show sequencing evaluation of highest priority:
         confirmed > inconsistent > ambiguous > problems > not analyzed
         """
-        if self.sequencing.count() == 0:
+        seqs = self.sequencing.all()  ## filter in python to benefit from prefetch
+        if not seqs:
             return u''
         eval_priority = [ x[0] for x in Sequencing.EVALUATIONS ]
 
         for e in eval_priority:
-            x = self.sequencing.filter(evaluation=e).first()
+            x = [ s for s in seqs if s.evaluation == e ]
             if x:
+                x = x[0]
                 r = html.mark_safe('<a href="%s">%s</a>' % 
                                    (x.get_absolute_url(), x.showEvaluationIcon()))
                 return r
         return u'other'
     showSequencing.allow_tags = True
     showSequencing.short_description = 'Seq'
+    showSequencing.prefetch_related = ('sequencing',)
     
     def showSequencingAll(self):
         """
@@ -393,10 +569,12 @@ class CellSample( Sample ):
     @property
     def content(self):
         return self.cell
+    content.fget.select_related = ('cell',)
 
     def showContent(self):
         return super(CellSample, self).showContent()
     showContent.short_description = 'Cell'
+    showContent.select_related = ('cell',)
 
     class Meta:
         app_label = 'rotmic'
@@ -427,10 +605,12 @@ class OligoSample( Sample ):
     @property
     def content(self):
         return self.oligo
+    content.fget.select_related = ('oligo',)
 
     def showContent(self):
         return super(OligoSample, self).showContent()
     showContent.short_description = 'Oligo'
+    showContent.select_related = ('oligo',)
 
     class Meta:
         app_label = 'rotmic'
@@ -461,10 +641,12 @@ class ChemicalSample( Sample ):
     @property
     def content(self):
         return self.chemical
+    content.fget.select_related = ('chemical',)
 
     def showContent(self):
         return super(ChemicalSample, self).showContent()
     showContent.short_description = 'Chemical'
+    showContent.select_related = ('chemical',)
 
     class Meta:
         app_label = 'rotmic'
@@ -495,10 +677,12 @@ class ProteinSample( Sample ):
     @property
     def content(self):
         return self.protein
+    content.fget.select_related = ('protein',)
 
     def showContent(self):
         return super(ProteinSample, self).showContent()
     showContent.short_description = 'Protein'
+    showContent.select_related = ('protein',)
 
     class Meta:
         app_label = 'rotmic'
@@ -0,0 +1,472 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Full-text search index with one search document per component and sample.
+The document collects ID, name, description, project, vector and marker
+names of a component; or ID, container, description, solvent, experiment
+number, preparing user and content of a sample. Its first line is the
+label (ID and name) of the record, which is what other documents quote.
+Renaming a user is not propagated to the documents of their samples.
+
+The database matches documents against search words:
+
+* PostgreSQL -- tsvector column with GIN index (maintained by a trigger)
+* SQLite -- FTS5 table rotmic_searchindex_fts (maintained by triggers)
+* other databases -- plain substring search over the document column
+
+(see migration 0045). The index is kept up to date by the signal handlers
+at the end of this module. Rebuild it from scratch with::
+
+    ./manage.py rebuildsearch
+"""
+import re
+
+from django.db import models, transaction, connection
+
+from .components import Component, DnaComponent, CellComponent, \
+     OligoComponent, ChemicalComponent, ProteinComponent, post_save_many
+from .samples import Sample, DnaSample, CellSample, OligoSample, \
+     ChemicalSample, ProteinSample
+from .projects import Project
+from .storage import Container
+
+ex_words = re.compile(r'[^\W_]+', re.UNICODE)
+ex_idparts = re.compile(r'[^\W\d_]+|\d+', re.UNICODE)
+
+
+def searchWords( text ):
+    """@return [ unicode ] -- lower-case search words of text"""
+    return ex_words.findall( text.lower() )
+
+
+def _label( displayId, name='' ):
+    """
+    @return unicode -- ID (plus its letter and number parts, so that 'rg0012'
+            is also found by '0012') and name
+    """
+    parts = ex_idparts.findall( displayId or '' )
+    r = [ displayId ] + ( parts if len(parts) > 1 else [] ) + [ name or '' ]
+    return u' '.join( r ).strip()
+
+def _labels( objects ):
+    return [ _label(o.displayId, o.name) for o in objects ]
+
+
+## search document of each indexed class
+## { class : ( select_related lookups, prefetch_related lookups, function ) }
+DOCUMENTS = {}
+
+def document( cls, select=(), prefetch=() ):
+    """Decorator registering the search document function of cls"""
+    def wrap(f):
+        DOCUMENTS[cls] = (select, prefetch, f)
+        return f
+    return wrap
+
+
+def _componentText( o, *more ):
+    r = [ _label(o.displayId, o.name), o.description ]
+    r += [ p.name for p in o.projects.all() ] + list( more )
+    return u'\n'.join( [ x for x in r if x ] )
+
+@document( DnaComponent, ('vectorBackbone',),
+           ('projects', 'markers', 'vectorBackbone__markers') )
+def dnaText( o ):
+    r = []
+    if o.vectorBackbone:
+        r = [ _label(o.vectorBackbone.displayId, o.vectorBackbone.name) ]
+        r += _labels( o.vectorBackbone.markers.all() )
+    return _componentText( o, *(_labels(o.markers.all()) + r) )
+
+@document( CellComponent, ('plasmid',), ('projects', 'markers') )
+def cellText( o ):
+    r = _labels( o.markers.all() )
+    if o.plasmid:
+        r += [ _label(o.plasmid.displayId, o.plasmid.name) ]
+    return _componentText( o, *r )
+
+@document( ChemicalComponent, (), ('projects',) )
+def chemicalText( o ):
+    return _componentText( o, o.cas )
+
+@document( OligoComponent, (), ('projects',) )
+def oligoText( o ):
+    return _componentText( o )
+
+@document( ProteinComponent, (), ('projects',) )
+def proteinText( o ):
+    return _componentText( o )
+
+
+def _sampleText( o, *content ):
+    u = o.preparedBy
+    r = [ _label(o.container.displayId + ' ' + o.displayId),
+          o.container.name, o.description, o.solvent, o.experimentNr,
+          u' '.join( [u.username, u.first_name, u.last_name] ) ]
+    r += [ _label(c.displayId, c.name) for c in content if c ]
+    return u'\n'.join( [ x for x in r if x ] )
+
+@document( DnaSample, ('container', 'preparedBy', 'dna') )
+def dnaSampleText( o ):
+    return _sampleText( o, o.dna )
+
+@document( CellSample, ('container', 'preparedBy', 'cell__plasmid') )
+def cellSampleText( o ):
+    return _sampleText( o, o.cell, o.cell.plasmid )
+
+@document( OligoSample, ('container', 'preparedBy', 'oligo') )
+def oligoSampleText( o ):
+    return _sampleText( o, o.oligo )
+
+@document( ChemicalSample, ('container', 'preparedBy', 'chemical') )
+def chemicalSampleText( o ):
+    return _sampleText( o, o.chemical )
+
+@document( ProteinSample, ('container', 'preparedBy', 'protein') )
+def proteinSampleText( o ):
+    return _sampleText( o, o.protein )
+
+
+## documents quoting the label of another record
+## { class : [ (indexed class, lookup pointing to the record) ] }
+DEPENDENTS = {
+    DnaComponent : [ (DnaComponent, 'vectorBackbone'),
+                     (DnaComponent, 'markers'),
+                     (DnaComponent, 'vectorBackbone__markers'),
+                     (CellComponent, 'plasmid'),
+                     (CellComponent, 'markers'),
+                     (DnaSample, 'dna'),
+                     (CellSample, 'cell__plasmid') ],
+    CellComponent : [ (CellSample, 'cell') ],
+    OligoComponent : [ (OligoSample, 'oligo') ],
+    ChemicalComponent : [ (ChemicalSample, 'chemical') ],
+    ProteinComponent : [ (ProteinSample, 'protein') ],
+    Project : [ (c, 'projects') for c in (DnaComponent, CellComponent,
+                                          OligoComponent, ChemicalComponent,
+                                          ProteinComponent) ],
+    Container : [ (c, 'container') for c in (DnaSample, CellSample,
+                                             OligoSample, ChemicalSample,
+                                             ProteinSample) ],
+    }
+
+
+def _fulltext():
+    """
+    @return str -- 'tsvector', 'fts5' or '' (no full-text index available)
+    """
+    if connection.vendor == 'postgresql':
+        return 'tsvector'
+
+    if connection.vendor == 'sqlite':
+        key = connection.settings_dict['NAME']
+        if key not in _fts5:
+            _fts5[key] = 'rotmic_searchindex_fts' in \
+                         connection.introspection.table_names()
+        return 'fts5' if _fts5[key] else ''
+    return ''
+
+_fts5 = {}
+
+
+class SearchIndex(models.Model):
+    """
+    Search document of one component or sample (exactly one of the two
+    fields is set).
+    """
+    component = models.OneToOneField(Component, null=True, related_name='+',
+                                     on_delete=models.CASCADE)
+
+    sample = models.OneToOneField(Sample, null=True, related_name='+',
+                                  on_delete=models.CASCADE)
+
+    document = models.TextField(blank=True)
+
+    @staticmethod
+    def ownerField( model ):
+        """@return str -- 'component_id' or 'sample_id'"""
+        return 'component_id' if issubclass(model, Component) else 'sample_id'
+
+    @classmethod
+    def search(cls, queryset, text):
+        """
+        Restrict a queryset of components or samples to records matching all
+        words of the search text. Words match the beginning of words in the
+        document (full-text index) or any part of it (no index).
+        @param queryset: QuerySet of a Component or Sample class
+        @param text: unicode, search text
+        @return QuerySet
+        """
+        words = searchWords( text )
+        if not words:
+            return queryset
+
+        field = cls.ownerField( queryset.model )
+        mode = _fulltext()
+
+        if not mode:
+            r = cls.objects.all()
+            for w in words:
+                r = r.filter( document__icontains=w )
+            return queryset.filter( pk__in=r.values_list(field, flat=True) )
+
+        if mode == 'tsvector':
+            match = "vector @@ to_tsquery('simple', %s)"
+            query = u' & '.join( [ w + u':*' for w in words ] )
+        else:
+            match = 'id IN (SELECT rowid FROM rotmic_searchindex_fts '\
+                    'WHERE rotmic_searchindex_fts MATCH %s)'
+            query = u' AND '.join( [ u'"%s"*' % w for w in words ] )
+
+        qn = connection.ops.quote_name
+        opts = queryset.model._meta
+        where = '%s.%s IN (SELECT %s FROM rotmic_searchindex WHERE %s)' % \
+                (qn(opts.db_table), qn(opts.pk.column), field, match)
+        return queryset.extra( where=[where], params=[query] )
+
+    @classmethod
+    def update(cls, o):
+        """
+        Re-index one component or sample. If its label has changed, also
+        re-index all documents quoting it.
+        @param o: instance of one of the classes in DOCUMENTS
+        """
+        field = cls.ownerField( type(o) )
+        doc = DOCUMENTS[ o._meta.concrete_model ][2]( o )
+
+        r = cls.objects.filter( **{field: o.pk} )
+        old = list( r.values_list('document', flat=True) )
+
+        if not old:
+            cls.objects.create( document=doc, **{field: o.pk} )
+        elif old[0] != doc:
+            r.update( document=doc )
+
+            if old[0].split('\n')[0] != doc.split('\n')[0]:
+                cls.updateDependents( o )
+
+    @classmethod
+    def updateMany(cls, objects, chunksize=500):
+        """
+        Re-index several components or samples of one class in bulk (see
+        reindex). Documents quoting records with a new label are re-indexed
+        as well.
+        @param objects: [ instances of one of the classes in DOCUMENTS ]
+        """
+        if not objects:
+            return
+        model = objects[0]._meta.concrete_model
+        field = cls.ownerField( model )
+        label = lambda doc: doc.split('\n')[0]
+
+        for i in range( 0, len(objects), chunksize ):
+            chunk = objects[i:i+chunksize]
+            r = cls.objects.filter( **{field + '__in': [ o.pk for o in chunk ]} )
+            old = dict( r.values_list(field, 'document') )
+
+            if not cls.reindex( model.objects.filter(pk__in=[ o.pk for o in chunk ]) ):
+                continue
+
+            new = dict( r.values_list(field, 'document') )
+            for o in chunk:
+                if o.pk in old and label( old[o.pk] ) != label( new[o.pk] ):
+                    cls.updateDependents( o )
+
+    @classmethod
+    def updateDependents(cls, o):
+        """Re-index all documents quoting the label of o"""
+        for model, lookup in DEPENDENTS.get( o._meta.concrete_model, [] ):
+            cls.reindex( model.objects.filter( **{lookup: o} ) )
+
+    @classmethod
+    def reindex(cls, queryset, chunksize=500):
+        """
+        Re-index all records of a queryset of one of the classes in
+        DOCUMENTS, loading related data chunk by chunk (no propagation to
+        dependent documents).
+        @return int -- number of new or changed documents
+        """
+        model = queryset.model
+        field = cls.ownerField( model )
+        select, prefetch, f = DOCUMENTS[ model ]
+
+        pks = list( queryset.values_list('pk', flat=True).distinct() )
+        n = 0
+
+        for i in range( 0, len(pks), chunksize ):
+            chunk = pks[i:i+chunksize]
+            current = dict( cls.objects.filter(**{field + '__in': chunk})\
+                            .values_list(field, 'document') )
+            objects = model.objects.filter(pk__in=chunk)\
+                      .select_related(*select).prefetch_related(*prefetch)
+            new = []
+            for o in objects:
+                doc = f( o )
+                if o.pk not in current:
+                    new += [ cls(document=doc, **{field: o.pk}) ]
+                elif current[o.pk] != doc:
+                    cls.objects.filter(**{field: o.pk}).update(document=doc)
+                    n += 1
+
+            cls.objects.bulk_create( new )
+            n += len( new )
+        return n
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Re-create the whole index.
+        @return int -- number of documents
+        """
+        with transaction.atomic():
+            cls.objects.all().delete()
+            return sum( [ cls.reindex( model.objects.all() )
+                          for model in DOCUMENTS ] )
+
+    def __unicode__(self):
+        return self.document.split('\n')[0]
+
+    class Meta:
+        app_label = 'rotmic'
+        verbose_name = 'Search index'
+
+
+## Signal handlers keeping the index in sync
+
+def _indexed( o ):
+    """@return instance of the indexed (sub-)class of component or sample o"""
+    if o._meta.concrete_model in DOCUMENTS:
+        return o
+    return type(o).objects.get_subclass( pk=o.pk )
+
+def record_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        ## loaded from a fixture, related records may still be missing
+        instance._searchRaw = True
+    elif not instance.__dict__.get('_savingMany'):
+        SearchIndex.update( instance )
+
+def records_saved(sender, instances, **kwargs):
+    """Component.saveMany -- re-index the whole batch at once"""
+    SearchIndex.updateMany( instances )
+
+def fixture_saved(sender, instance, raw=False, **kwargs):
+    """Component or Sample base record -- see record_saved"""
+    if raw:
+        instance._searchRaw = True
+
+## fields of a Project or Container quoted by other documents
+LABELS = { Project : ('name',),
+           Container : ('displayId', 'name') }
+
+def label_presave(sender, instance, raw=False, **kwargs):
+    """Remember the label of a Project or Container before it is saved"""
+    if not raw and instance.pk:
+        old = sender.objects.filter(pk=instance.pk)\
+              .values_list( *LABELS[sender] )
+        instance._searchLabel = old[0] if old else None
+
+def label_saved(sender, instance, raw=False, created=False, **kwargs):
+    """Project or Container -- re-index dependents if its label has changed"""
+    old = instance.__dict__.pop('_searchLabel', None)
+    new = tuple( [ getattr(instance, f) for f in LABELS[sender] ] )
+
+    if not raw and not created and old != new:
+        SearchIndex.updateDependents( instance )
+
+def predelete(sender, instance, **kwargs):
+    """
+    Remember records quoting a record that is about to be deleted.
+    (Many-to-many links are removed without m2m_changed signal.)
+    """
+    instance._searchPending = [
+        (model, list( model.objects.filter(**{lookup: instance})\
+                      .values_list('pk', flat=True) ))
+        for model, lookup in DEPENDENTS.get( sender, [] ) ]
+
+def deleted(sender, instance, **kwargs):
+    for model, pks in instance.__dict__.pop('_searchPending', []):
+        SearchIndex.reindex( model.objects.filter(pk__in=pks) )
+
+def _m2m_changed(instance, action, reverse, pk_set, reverse_name, owners,
+                 more=None):
+    """
+    Common m2m_changed handler. If reverse, instance is the linked object and
+    the affected records are given by pk_set (or, for clear(), have to be
+    recorded before the relation is cleared).
+    @param owners: [ class ], indexed classes on the forward side
+    @param more: func(queryset) -> queryset of further affected records
+    """
+    if action == 'pre_clear' and reverse:
+        instance._searchPending = list(
+            getattr(instance, reverse_name).values_list('id', flat=True) )
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        if instance.__dict__.get('_searchRaw'):
+            return
+        SearchIndex.update( _indexed(instance) )
+        if more:
+            SearchIndex.reindex( more( type(instance).objects.filter(pk=instance.pk) ) )
+        return
+
+    if action == 'post_clear':
+        pk_set = instance.__dict__.pop('_searchPending', [])
+
+    for model in owners:
+        r = model.objects.filter(pk__in=pk_set)
+        SearchIndex.reindex( r )
+        if more:
+            SearchIndex.reindex( more( r ) )
+
+def projects_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _m2m_changed(instance, action, reverse, pk_set, 'components',
+                 [ c for c in DOCUMENTS if issubclass(c, Component) ])
+
+def dna_markers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """documents of plasmids list the markers of their vector backbone"""
+    _m2m_changed(instance, action, reverse, pk_set, 'as_marker_in_dna',
+                 [DnaComponent],
+                 lambda r: DnaComponent.objects.filter(vectorBackbone__in=r))
+
+def cell_markers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _m2m_changed(instance, action, reverse, pk_set, 'as_marker_in_cell',
+                 [CellComponent])
+
+
+for recordClass in DOCUMENTS:
+    models.signals.post_save.connect(record_saved, sender=recordClass)
+    post_save_many.connect(records_saved, sender=recordClass)
+
+models.signals.post_save.connect(fixture_saved, sender=Component)
+models.signals.post_save.connect(fixture_saved, sender=Sample)
+
+for recordClass in DEPENDENTS:
+    models.signals.pre_delete.connect(predelete, sender=recordClass)
+    models.signals.post_delete.connect(deleted, sender=recordClass)
+
+for labelClass in LABELS:
+    models.signals.pre_save.connect(label_presave, sender=labelClass)
+    models.signals.post_save.connect(label_saved, sender=labelClass)
+
+models.signals.m2m_changed.connect(projects_changed,
+                                   sender=Component.projects.through)
+models.signals.m2m_changed.connect(dna_markers_changed,
+                                   sender=DnaComponent.markers.through)
+models.signals.m2m_changed.connect(cell_markers_changed,
+                                   sender=CellComponent.markers.through)
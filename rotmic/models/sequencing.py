@@ -15,6 +15,7 @@
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
 """Models for attaching sequencing information to samples"""
 from datetime import datetime
+import json
 
 from django.db import models
 from django.utils.safestring import mark_safe
@@ -26,6 +27,16 @@ import django.contrib.staticfiles.templatetags.staticfiles as ST
 import attachments as A
 from .usermixin import UserMixin
 
+EVALUATIONS = (('confirmed','confirmed'), ('inconsistent','inconsistent'),
+               ('ambiguous','ambiguous'), ('problems', 'seq. problems'), ('none','not analyzed') )
+
+EVALUATION_COLORS = {u'confirmed': '088A08', # green
+                     u'inconsistent': 'B40404', # red
+                     u'problems': 'FFA500', # orange
+                     u'ambiguous' : '0000FF', # blue
+                     u'none':  '000000', # black
+                     }
+
 class SequencingRun( A.Attachment ):
     """
     Representation of a single sequencing run -- basically wrapper for a trace
@@ -41,10 +52,67 @@ class SequencingRun( A.Attachment ):
     primer = models.ForeignKey( 'OligoComponent', related_name='sequencingRun',
                                 limit_choices_to={'componentType__name':'sequencing'},
                                 blank=True, null=True )
+
+    ## results of the automatic trace analysis (see utils.traces)
+    analysedAt = models.DateTimeField(null=True, blank=True, editable=False)
+
+    readLength = models.IntegerField(null=True, blank=True, editable=False,
+                                     help_text='number of quality-trimmed base calls')
+
+    quality = models.FloatField(null=True, blank=True, editable=False,
+                                help_text='mean phred quality of the trimmed read')
+
+    strand = models.CharField(max_length=1, blank=True, editable=False)
+
+    alignStart = models.IntegerField(null=True, blank=True, editable=False)
+
+    alignEnd = models.IntegerField(null=True, blank=True, editable=False)
+
+    coverage = models.IntegerField(null=True, blank=True, editable=False,
+                                   help_text='number of aligned reference nucleotides')
+
+    identity = models.FloatField(null=True, blank=True, editable=False)
+
+    ## JSON list of [ position, reference base, read base, quality ]
+    differences = models.TextField(blank=True, default='', editable=False)
+
+    evaluation = models.CharField( 'proposed evaluation', max_length=30,
+                                   choices=EVALUATIONS, default='none',
+                                   editable=False )
     
     def __unicode__(self):
         return u'trace file %i' % self.pk
 
+    def differenceList(self):
+        """@return [ (int, str, str, int) ] -- see utils.traces.Analysis"""
+        return [ tuple(d) for d in json.loads(self.differences or '[]') ]
+
+    def showAnalysis(self):
+        """summary of the automatic trace analysis"""
+        if not self.analysedAt:
+            return u'not analyzed'
+
+        r = '<span style="color: #%s;">%s</span>' % \
+            (EVALUATION_COLORS.get(self.evaluation, '000000'),
+             self.get_evaluation_display())
+
+        if self.readLength is not None:
+            r += ' %i nt read (Q%i)' % (self.readLength, self.quality or 0)
+
+        if self.coverage:
+            r += ', %s %i-%i, %.1f%% identity' % \
+                 (self.strand, self.alignStart, self.alignEnd, self.identity)
+
+            diffs = self.differenceList()
+            if diffs:
+                r += ', ' + ', '.join( [ '%i %s&gt;%s' % (p, ref, read)
+                                         for p, ref, read, q in diffs[:10] ] )
+                if len(diffs) > 10:
+                    r += ' (%i more)' % (len(diffs) - 10)
+        return html.mark_safe(r)
+    showAnalysis.allow_tags = True
+    showAnalysis.short_description = 'Analysis'
+
     class Meta:
         app_label='rotmic'
         abstract=False
@@ -64,8 +132,7 @@ class Sequencing( UserMixin ):
     Sequencing results are attached to Samples.
     """
 
-    EVALUATIONS = (('confirmed','confirmed'), ('inconsistent','inconsistent'),
-                  ('ambiguous','ambiguous'), ('problems', 'seq. problems'), ('none','not analyzed') )
+    EVALUATIONS = EVALUATIONS
 
     sample = models.ForeignKey('DnaSample', related_name='sequencing', 
                                verbose_name='Sample',
@@ -101,14 +168,8 @@ class Sequencing( UserMixin ):
         return reverse('admin:rotmic_%s_change' % classname, args=(self.id,))
 
     def showEvaluation(self):
-        color = {u'confirmed': '088A08', # green
-                 u'inconsistent': 'B40404', # red
-                 u'problems': 'FFA500', # orange
-                 u'ambiguous' : '0000FF', # blue
-                 u'none':  '000000', # black
-                 }
         r = '<span style="color: #%s;">%s</span>' %\
-                    (color.get(self.evaluation, '000000'), 
+                    (EVALUATION_COLORS.get(self.evaluation, '000000'), 
                      self.get_evaluation_display())
         return html.mark_safe( self.showEvaluationIcon() + ' ' + r)
     showEvaluation.allow_tags = True
@@ -48,7 +48,10 @@ class Location(UserMixin, ReadonlyUrlMixin):
         return r
 
     def rackCount(self):
-        return self.racks.count()
+        r = getattr(self, 'n_racks', None)  ## see showRackCount.annotate
+        if r is None:
+            r = self.racks.count()
+        return r
     
     def showRackCount(self):
         """Show number of Racks linked to pre-filtered Rack table"""
@@ -58,10 +61,13 @@ class Location(UserMixin, ReadonlyUrlMixin):
         return html.mark_safe(r)
     showRackCount.allow_tags = True
     showRackCount.short_description = 'Racks'
+    showRackCount.annotate = {'n_racks': models.Count('racks', distinct=True)}
         
 
     def containerCount(self):
-        r = Container.objects.filter(rack__location=self).count()
+        r = getattr(self, 'n_containers', None)
+        if r is None:
+            r = Container.objects.filter(rack__location=self).count()
         return r
     
     def showContainerCount(self):
@@ -72,11 +78,15 @@ class Location(UserMixin, ReadonlyUrlMixin):
         return html.mark_safe(r)
     showContainerCount.allow_tags = True
     showContainerCount.short_description = 'Boxes'
+    showContainerCount.annotate = {
+        'n_containers': models.Count('racks__containers', distinct=True)}
        
     
     def sampleCount(self):
-        from rotmic.models import Sample
-        r = Sample.objects.filter(container__rack__location=self).count()
+        r = getattr(self, 'n_samples', None)
+        if r is None:
+            from rotmic.models import Sample
+            r = Sample.objects.filter(container__rack__location=self).count()
         return r
 
     def showSampleCount(self):
@@ -87,6 +97,8 @@ class Location(UserMixin, ReadonlyUrlMixin):
         return html.mark_safe(r)
     showSampleCount.allow_tags = True
     showSampleCount.short_description = 'Samples'
+    showSampleCount.annotate = {
+        'n_samples': models.Count('racks__containers__samples', distinct=True)}
 
 
     def showVerbose(self):
@@ -127,8 +139,10 @@ class Rack(UserMixin, ReadonlyUrlMixin):
         return r
 
     def sampleCount(self):
-        from rotmic.models import Sample
-        r = Sample.objects.filter(container__rack=self).count()
+        r = getattr(self, 'n_samples', None)  ## see showSampleCount.annotate
+        if r is None:
+            from rotmic.models import Sample
+            r = Sample.objects.filter(container__rack=self).count()
         return r
     
     def showSampleCount(self):
@@ -140,9 +154,15 @@ class Rack(UserMixin, ReadonlyUrlMixin):
         return html.mark_safe(r)
     showSampleCount.allow_tags = True
     showSampleCount.short_description = 'Samples'
+    showSampleCount.select_related = ('location',)
+    showSampleCount.annotate = {
+        'n_samples': models.Count('containers__samples', distinct=True)}
     
     def containerCount(self):
-        return self.containers.count()
+        r = getattr(self, 'n_containers', None)
+        if r is None:
+            r = self.containers.count()
+        return r
     
     def showContainerCount(self):
         """Show number of containers linked to pre-filtered Container table"""
@@ -153,6 +173,9 @@ class Rack(UserMixin, ReadonlyUrlMixin):
         return html.mark_safe(r)
     showContainerCount.allow_tags = True
     showContainerCount.short_description = 'Boxes'
+    showContainerCount.select_related = ('location',)
+    showContainerCount.annotate = {
+        'n_containers': models.Count('containers', distinct=True)}
 
 
     def showVerbose(self):
@@ -203,6 +226,13 @@ class Container( UserMixin, ReadonlyUrlMixin ):
     #: optional long description
     description = models.TextField( 'Detailed description', blank=True)
 
+    ## (rows, columns) of well plates; other containers have numbered slots
+    GEOMETRY = { '96-well-plate' : (8, 12),
+                 '384-well-plate' : (16, 24) }
+
+    ## number of slots per row in the layout of freezer boxes
+    BOX_COLUMNS = 10
+
     def __unicode__(self):
         r = unicode(self.displayId)
 
@@ -210,11 +240,76 @@ class Container( UserMixin, ReadonlyUrlMixin ):
             r += ' (%s)' % self.name
         return r
 
+    def geometry(self):
+        """@return (int, int) -- rows and columns of a well plate, or None"""
+        return self.GEOMETRY.get(self.containerType)
+
+    def sampleGrid(self):
+        """
+        Samples arranged by their position on the plate or in the box. All
+        samples are loaded with one query plus one query per sample type 
+        (including content, units and author).
+        @return dict with keys
+           'columns'  -- [ str ], column labels
+           'rows'     -- [ (str, [ (str, [ Sample ]) ]) ], row label and 
+                         cells with position and samples (if any)
+           'unplaced' -- [ Sample ], samples without valid position 
+                         (all samples of 'other' containers)
+           'samples'  -- [ Sample ], all samples in displayId order
+        """
+        from rotmic.models import Sample  ## local import to avoid recursion
+        from .occupancy import positionIndex, positionName
+
+        samples = list( Sample.objects.filter(container=self)\
+                        .select_related('concentrationUnit', 'amountUnit',
+                                        'registeredBy')\
+                        .prefetch_subclasses() )
+        
+        r = { 'columns' : [], 'rows' : [], 'unplaced' : [], 'samples' : samples }
+
+        geometry = self.geometry()
+        if geometry:
+            nrows, ncolumns = geometry
+        elif self.containerType == 'box':
+            nrows, ncolumns = None, self.BOX_COLUMNS
+        else:
+            r['unplaced'] = samples
+            return r
+
+        slots = {}
+        for s in samples:
+            i = positionIndex( s.displayId, geometry )
+            if i is None:
+                r['unplaced'].append( s )
+            else:
+                slots.setdefault( i, [] ).append( s )
+
+        if nrows is None:  ## boxes: as many rows as needed
+            nrows = max( slots ) // ncolumns + 1 if slots else 1
+
+        r['columns'] = [ str(i) for i in range(1, ncolumns + 1) ]
+
+        for row in range( nrows ):
+            first = row * ncolumns
+            cells = [ (positionName(i, geometry), slots.get(i, []))
+                      for i in range(first, first + ncolumns) ]
+            label = cells[0][0][0] if geometry else cells[0][0]
+            r['rows'].append( (label, cells) )
+
+        return r
+
     def fullSampleCount(self):
         """@return int - number of samples + associated extra aliquots"""
-        d = self.samples.aggregate(aliquot_total=models.Sum('aliquotNr'),
-                                   with_aliquot=models.Count('aliquotNr'))
-        r = self.samples.count()
+        if getattr(self, 'n_samples', None) is not None:
+            ## see showSampleCount.annotate
+            d = {'n_samples': self.n_samples, 
+                 'aliquot_total': self.n_aliquots,
+                 'with_aliquot': self.n_withaliquots}
+        else:
+            d = self.samples.aggregate(n_samples=models.Count('id'),
+                                       aliquot_total=models.Sum('aliquotNr'),
+                                       with_aliquot=models.Count('aliquotNr'))
+        r = d['n_samples']
         r += (d['aliquot_total'] or 0) - d['with_aliquot']
         return r
 
@@ -243,6 +338,11 @@ class Container( UserMixin, ReadonlyUrlMixin ):
         return html.mark_safe(r)
     showSampleCount.allow_tags = True
     showSampleCount.short_description = 'Samples'
+    showSampleCount.select_related = ('rack__location',)
+    showSampleCount.annotate = {
+        'n_samples': models.Count('samples'),
+        'n_aliquots': models.Sum('samples__aliquotNr'),
+        'n_withaliquots': models.Count('samples__aliquotNr')}
 
     class Meta:
         app_label = 'rotmic'   
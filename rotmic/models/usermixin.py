@@ -73,11 +73,12 @@ class ReadonlyUrlMixin:
         Define standard URL for object views
         see: https://docs.djangoproject.com/en/dev/ref/contrib/admin/#reversing-admin-urls
         """
-        classname = self.__class__.__name__.lower()
+        ## concrete model rather than class, which may be a deferred proxy
+        classname = self._meta.concrete_model._meta.model_name
         return reverse('admin:rotmic_%s_readonly' % classname, args=(self.id,))
     
     def get_absolute_url_edit(self):
         """link to Editing Field"""
-        classname = self.__class__.__name__.lower()
+        classname = self._meta.concrete_model._meta.model_name
         return reverse('admin:rotmic_%s_change' % classname, args=(self.id,))
      
\ No newline at end of file
@@ -23,6 +23,8 @@ import forms.selectLookups as L
 import selectable.forms as sforms
 
 import rotmic.models as M
+import rotmic.utils.sequtils as sequtils
+from rotmic.models.kmerIndex import MIN_LENGTH
 
 class JQueryUIDatepickerWidget(forms.DateInput):
     """Custom widget for JQuery Calendar lookup (more robust than AdminDateWidget)"""
@@ -50,9 +52,16 @@ def linkedSearch(field, subfields=['displayId','name'], lookup='contains'):
     
     return f
 
+def fullTextSearch(qs, query):
+    """filter components or samples by all words in their search document"""
+    return M.SearchIndex.search(qs, query)
+
 class ComponentFilter(F.FilterSet):
     """Base definition for all Component subtypes"""
     
+    text = F.CharFilter(name='text', label='Any text (words or word beginnings)',
+                        action=fullTextSearch)
+
     displayId = F.CharFilter(label='ID', lookup_type='contains')
 
     name      = F.CharFilter(label='Name', lookup_type='contains')
@@ -75,7 +84,7 @@ class ComponentFilter(F.FilterSet):
     description = F.CharFilter(name='description', label='Description',
                                lookup_type='contains')
 
-    filterfields = ['componentType', 
+    filterfields = ['text', 'componentType', 
                     'displayId', 'name', 'status', 
                     'registeredBy', 'registeredAt',
                     'modifiedBy','modifiedAt',
@@ -83,12 +92,12 @@ class ComponentFilter(F.FilterSet):
     
 
 
-def searchDnaMarkers(qs, query):
-    q = Q(markers__name__contains=query) | Q(markers__displayId__contains=query) |\
-        Q(vectorBackbone__markers__name__contains=query) |\
-        Q(vectorBackbone__markers__displayId__contains=query)
+def searchMarkers(qs, query):
+    """filter DNA or cells by any of their (indexed) markers"""
+    q = Q(markerIndex__marker__name__contains=query) |\
+        Q(markerIndex__marker__displayId__contains=query)
         
-    r = qs.filter(q)
+    r = qs.filter(q).distinct()
     return r
 
 class DnaComponentFilter(ComponentFilter, F.FilterSet):
@@ -98,11 +107,11 @@ class DnaComponentFilter(ComponentFilter, F.FilterSet):
     
     marker1  = F.CharFilter(name='marker1', label='Marker 1 (name or ID)',
                             lookup_type='contains',
-                            action=searchDnaMarkers)
+                            action=searchMarkers)
 
     marker2  = F.CharFilter(name='marker2', label='Marker 2 (name or ID)',
                             lookup_type='contains',
-                            action=searchDnaMarkers)
+                            action=searchMarkers)
 
     class Meta:
         model = M.DnaComponent
@@ -117,14 +126,6 @@ class DnaComponentFilter(ComponentFilter, F.FilterSet):
 
 
     
-def searchCellMarkers(qs, query):
-    q = Q(markers__name__contains=query) | Q(markers__displayId__contains=query) |\
-        Q(plasmid__vectorBackbone__markers__name__contains=query) |\
-        Q(plasmid__vectorBackbone__markers__displayId__contains=query)
-        
-    r = qs.filter(q)
-    return r
-
 class CellComponentFilter(ComponentFilter, F.FilterSet):
     
     plasmid  = F.CharFilter(name='plasmid', label='Plasmid (name or ID)',
@@ -132,11 +133,11 @@ class CellComponentFilter(ComponentFilter, F.FilterSet):
 
     marker1  = F.CharFilter(name='marker1', label='Marker 1 (name or ID)',
                             lookup_type='contains',
-                            action=searchCellMarkers)
+                            action=searchMarkers)
 
     marker2  = F.CharFilter(name='marker2', label='Marker 2 (name or ID)',
                             lookup_type='contains',
-                            action=searchCellMarkers)
+                            action=searchMarkers)
     class Meta:
         model = M.CellComponent
         fields = ComponentFilter.filterfields
@@ -211,3 +212,25 @@ class ChemicalComponentFilter(ComponentFilter, F.FilterSet):
         s = self.filters['status']
         s.extra['choices'] = (('','--Any Status--'),) + s.extra['choices']
         s.extra['initial'] = ''
+
+
+class SequenceSearchForm(forms.Form):
+    """Find DNA constructs and oligos containing a given sequence"""
+
+    sequence = forms.CharField(label='DNA sequence', 
+                               widget=forms.Textarea(attrs={'rows':4, 'cols':80}),
+                               help_text='at least %i nucleotides; both strands are searched'\
+                               % MIN_LENGTH)
+
+    oligos = forms.BooleanField(label='Include oligos', required=False, 
+                                initial=True)
+
+    def clean_sequence(self):
+        r = sequtils.cleanseq( self.cleaned_data['sequence'] )
+
+        if len(r) < MIN_LENGTH:
+            raise forms.ValidationError('Please give at least %i nucleotides.' 
+                                        % MIN_LENGTH)
+        if not sequtils.isdna(r):
+            raise forms.ValidationError('Only A, C, G and T are allowed.')
+        return r
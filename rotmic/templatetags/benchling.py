@@ -33,7 +33,6 @@ from django.utils.safestring import mark_safe
 from django import template
 import django.utils.html as html
 
-import rotmic.utils.genbank as genbank
 
 register = template.Library()
 
@@ -101,11 +100,11 @@ def benchling(dc, element='benchlingbox'):
     annotations = ''
     errors = ''
     if dc.genbank:
-        p = genbank.GenbankInMemory(dc.genbank)
+        p = dc.parsedGenbank()
         for feature in p.features:
             annotations += benchling_annotation % feature
 
-        if sequence and sequence != p.sequence:
+        if p.mismatch:
             errors += seq_warning
             sequence = p.sequence
     
@@ -38,7 +38,6 @@ from django import template
 import django.utils.html as html
 import django.contrib.staticfiles.templatetags.staticfiles as ST
 
-import rotmic.utils.genbank as genbank
 
 register = template.Library()
 
@@ -105,11 +104,11 @@ def seqdisplay(dc, element='seqdisplay'):
     annotations = ''
     errors = ''
     if dc.genbank:
-        p = genbank.GenbankInMemory(dc.genbank)
+        p = dc.parsedGenbank()
         for feature in p.features:
             annotations += benchling_annotation % feature
 
-        if sequence and sequence != p.sequence:
+        if p.mismatch:
             errors += seq_warning
             sequence = p.sequence
     
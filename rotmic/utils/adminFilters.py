@@ -14,7 +14,6 @@
 ## You should have received a copy of the GNU Affero General Public
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
 from django.contrib import admin
-from django.db.models import Q
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth.models import User
 
@@ -51,11 +50,8 @@ class MarkerTypeFilter( admin.SimpleListFilter ):
         if not self.value():
             return q
     
-        markers = M.DnaComponent.objects.filter(componentType__name=self.value())
-        constraint = Q(markers__in=markers)\
-            | Q(vectorBackbone__markers__in=markers)
-        
-        return q.filter(constraint)
+        return q.filter(markerIndex__marker__componentType__name=self.value())\
+                .distinct()
     
 
 class MarkerListFilter( admin.SimpleListFilter):
@@ -109,10 +105,7 @@ class MarkerListFilter( admin.SimpleListFilter):
         if len(selected) == 0:
             return queryset
 
-        constraint = Q(markers__in=selected)\
-            | Q(vectorBackbone__markers__in=selected)
-        
-        return queryset.filter(constraint)
+        return queryset.filter(markerIndex__marker__in=selected).distinct()
 
 
 
@@ -231,6 +224,74 @@ class ProteinTypeListFilter( TypeListFilter ):
     _class = M.ProteinComponentType
 
 
+class RangeListFilter( admin.SimpleListFilter ):
+    """
+    Pre-filter table by ranges of a numeric (indexed) field. Sub-classes
+    define field and ranges -- ( (value, label, minimum, maximum) ), with
+    minimum inclusive, maximum exclusive and None meaning open-ended.
+    """
+    field = None
+    ranges = ()
+
+    def lookups(self, request, model_admin):
+        return ( (r[0], r[1]) for r in self.ranges )
+
+    def queryset(self, request, queryset):
+        q = queryset
+        for value, label, low, high in self.ranges:
+            if value == self.value():
+                if low is not None:
+                    q = q.filter(**{self.field + '__gte': low})
+                if high is not None:
+                    q = q.filter(**{self.field + '__lt': high})
+        return q
+
+
+class SequenceLengthFilter( RangeListFilter ):
+    """Pre-filter DNA constructs by the persisted sequence length"""
+    title = 'Length'
+    parameter_name = 'length'
+    field = 'sequenceLength'
+    ranges = ( ('none', 'no sequence', None, 1),
+               ('1k', '< 1 kb', 1, 1000),
+               ('1-5k', '1 - 5 kb', 1000, 5000),
+               ('5-10k', '5 - 10 kb', 5000, 10000),
+               ('10k', '> 10 kb', 10000, None) )
+
+
+class GCContentFilter( RangeListFilter ):
+    """Pre-filter DNA constructs by the persisted GC content"""
+    title = 'GC content'
+    parameter_name = 'gc'
+    field = 'sequenceGC'
+    ranges = ( ('40', '< 40 %', None, 40),
+               ('40-60', '40 - 60 %', 40, 60),
+               ('60', '> 60 %', 60, None) )
+
+
+class MolWeightFilter( RangeListFilter ):
+    """Pre-filter proteins by the persisted molecular weight"""
+    title = 'MW'
+    parameter_name = 'mw'
+    field = 'molWeight'
+    ranges = ( ('10k', '< 10 kDa', None, 10000),
+               ('10-30k', '10 - 30 kDa', 10000, 30000),
+               ('30-60k', '30 - 60 kDa', 30000, 60000),
+               ('60-100k', '60 - 100 kDa', 60000, 100000),
+               ('100k', '> 100 kDa', 100000, None) )
+
+
+class IsoelectricFilter( RangeListFilter ):
+    """Pre-filter proteins by the persisted iso-electric point"""
+    title = 'pI'
+    parameter_name = 'pi'
+    field = 'isoelectricPoint'
+    ranges = ( ('5', '< 5', None, 5),
+               ('5-7', '5 - 7', 5, 7),
+               ('7-9', '7 - 9', 7, 9),
+               ('9', '> 9', 9, None) )
+
+
 class RackLocationFilter( admin.SimpleListFilter ):
     """
     Custom Admin Filter for locations in Rack ChangeList.
@@ -0,0 +1,288 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Streaming CSV export of querysets. The row generator (iterValues) is also
+used by the Excel export (see xlsexport).
+
+Columns are given as expressions relative to each object, e.g.
+'registeredBy.username', 'componentType.category()' or
+"authors.values_list('username', flat=True)". Each expression is compiled
+once into an accessor function. The relations it traverses are loaded
+together with each chunk of rows rather than per object:
+
+* ForeignKey paths are added to select_related
+* values_list() / all() of ManyToMany or reverse relations are prefetched
+* count() of a (direct) relation becomes a grouped COUNT per chunk
+* methods and properties contribute the select_related, prefetch_related
+  and annotate lookups they declare (see ViewFirstModelAdmin.columnPlan)
+"""
+import ast, csv, collections, operator
+
+from django.db.models import Count
+from django.db.models.fields.related import ForeignKey, OneToOneField
+
+from rotmic.utils.customadmin import _lookups
+
+
+class ColumnError( Exception ):
+    pass
+
+
+def parseColumn( expression ):
+    """
+    Split a column expression into steps.
+    @param expression: str, e.g. "authors.values_list('username', flat=True)"
+    @return [ (str, object) ] -- ('attr', name), ('call', (args, kwargs)) 
+            or ('index', key)
+    """
+    try:
+        node = ast.parse( 'o.' + expression, mode='eval' ).body
+    except SyntaxError as why:
+        raise ColumnError( 'Invalid column %r: %s' % (expression, why) )
+
+    steps = []
+    while not isinstance( node, ast.Name ):
+        if isinstance( node, ast.Attribute ):
+            steps.append( ('attr', node.attr) )
+        elif isinstance( node, ast.Call ):
+            args = [ ast.literal_eval(a) for a in node.args ]
+            kwargs = dict( (k.arg, ast.literal_eval(k.value)) 
+                           for k in node.keywords )
+            steps.append( ('call', (args, kwargs)) )
+            node = node.func
+            continue
+        elif isinstance( node, ast.Subscript ) and \
+             isinstance( node.slice, ast.Index ):
+            steps.append( ('index', ast.literal_eval(node.slice.value)) )
+        else:
+            raise ColumnError( 'Unsupported column %r' % expression )
+        node = node.value
+
+    steps.reverse()
+    return steps
+
+
+def _relations( model ):
+    """
+    @return (dict, dict) -- { name : related model } of single-valued 
+            (forward ForeignKey / OneToOne) relations and
+            { name : (related model, query name) } of multi-valued 
+            (ManyToMany and reverse ForeignKey) relations
+    """
+    single, many = {}, {}
+    for f in model._meta.fields:
+        if isinstance( f, (ForeignKey, OneToOneField) ):
+            single[f.name] = f.rel.to
+    for f in model._meta.many_to_many:
+        many[f.name] = (f.rel.to, f.name)
+    for rel in model._meta.get_all_related_objects() + \
+               model._meta.get_all_related_many_to_many_objects():
+        if not isinstance( rel.field, OneToOneField ):
+            many[rel.get_accessor_name()] = (rel.model, 
+                                             rel.field.related_query_name())
+    return single, many
+
+
+def _apply( steps ):
+    """@return [ func(value) ] -- one function per step"""
+    r = []
+    for kind, x in steps:
+        if kind == 'attr':
+            r.append( operator.attrgetter(x) )
+        elif kind == 'call':
+            r.append( lambda v, a=x[0], kw=x[1]: v(*a, **kw) )
+        else:
+            r.append( operator.itemgetter(x) )
+    return r
+
+
+def _listing( args, kwargs ):
+    """replacement of values_list() reading from a prefetched relation"""
+    fields = args or ['pk']
+    if kwargs.get('flat'):
+        return lambda m: [ getattr(o, fields[0]) for o in m.all() ]
+    return lambda m: [ tuple(getattr(o, f) for f in fields) for o in m.all() ]
+
+
+class Column( object ):
+    """
+    A compiled column expression: accessor functions plus the lookups
+    needed to evaluate them without further queries per object.
+    """
+
+    def __init__(self, model, expression):
+        self.expression = expression
+        self.select = set()
+        self.prefetch = set()
+        self.annotate = {}
+        self.functions = self.__compile( model, parseColumn(expression) )
+
+    def __compileMany(self, path, name, queryName, method, args, kwargs):
+        """
+        @return [ func ] -- accessor for <relation>.<method>(...) or None
+        """
+        lookup = '__'.join( path + [name] )
+
+        if method == 'count' and not path:
+            attr = 'csv_n_' + name
+            self.annotate[attr] = Count( queryName, distinct=True )
+            return [ operator.attrgetter(attr) ]
+
+        self.prefetch.add( lookup )
+        
+        if method == 'count':
+            return [ operator.attrgetter(name), lambda m: len(m.all()) ]
+        if method == 'values_list':
+            return [ operator.attrgetter(name), _listing(args, kwargs) ]
+        if method == 'all':
+            return [ operator.attrgetter(name), lambda m: m.all() ]
+
+        self.prefetch.discard( lookup )
+        return None
+
+    def __compile(self, model, steps):
+        path = []
+        r = []
+
+        i = 0
+        while i < len(steps) and steps[i][0] == 'attr':
+            name = steps[i][1]
+            single, many = _relations( model )
+
+            if name in single:
+                path.append( name )
+                self.select.add( '__'.join(path) )
+                model = single[name]
+                r.append( operator.attrgetter(name) )
+                i += 1
+                continue
+
+            if name in many and len(steps) > i + 2 and \
+               steps[i+1][0] == 'attr' and steps[i+2][0] == 'call':
+                args, kwargs = steps[i+2][1]
+                f = self.__compileMany( path, name, many[name][1], 
+                                        steps[i+1][1], args, kwargs )
+                if f is not None:
+                    return r + f + _apply( steps[i+3:] )
+
+            ## method or property -- take over its declared lookups
+            f = getattr( model, name, None )
+            f = getattr( f, 'fget', f )
+            prefix = '__'.join(path) + '__' if path else ''
+            self.select.update( [ prefix + x for x in 
+                                  getattr(f, 'select_related', ()) ] )
+            self.prefetch.update( [ prefix + x for x in 
+                                    getattr(f, 'prefetch_related', ()) ] )
+            if not path:
+                self.annotate.update( getattr(f, 'annotate', {}) )
+            break
+
+        return r + _apply( steps[i:] )
+
+    def value(self, o):
+        """
+        @return unicode or str -- column value of object o ('' on error)
+        """
+        try:
+            v = o
+            for f in self.functions:
+                v = f(v)
+        except Exception:
+            return ''  ## capture 'None' fields
+
+        if v is None:
+            return ''
+        if not isinstance( v, basestring ) and \
+           isinstance( v, collections.Iterable ):
+            return u', '.join( [ unicode(x) for x in v ] )
+        return v
+
+
+class _Echo( object ):
+    """file-like object handing written lines back to the csv writer"""
+    def write(self, value):
+        return value
+
+
+def _encode( v ):
+    if isinstance( v, unicode ):
+        return v.encode('utf-8')
+    if isinstance( v, (str, int, long, float) ):
+        return v
+    return unicode(v).encode('utf-8')
+
+
+def iterValues( queryset, expressions, chunksize=500 ):
+    """
+    Generate the column values of all objects of a queryset, loading 
+    chunksize objects (and their related data) at a time.
+    @param queryset: QuerySet
+    @param expressions: [ str ], column expressions
+    @param chunksize: int, number of objects loaded at once
+    @return generator of [ value ] -- one list of column values per object
+    """
+    columns = [ Column( queryset.model, x ) for x in expressions ]
+
+    select, prefetch, annotate = set(), set(), {}
+    for c in columns:
+        select |= c.select
+        prefetch |= c.prefetch
+        annotate.update( c.annotate )
+
+    pks = list( queryset.values_list('pk', flat=True) )
+    
+    for i in range( 0, len(pks), chunksize ):
+        chunk = pks[i:i+chunksize]
+        
+        objects = queryset.filter( pk__in=chunk )
+        if select:
+            ## select_related(*fields) replaces (rather than extends) any 
+            ## previous selection (e.g. by select_subclasses) in django 1.6
+            current = objects.query.select_related
+            if isinstance( current, dict ):
+                select |= set( _lookups(current) )
+            objects = objects.select_related( *select )
+        if prefetch:
+            objects = objects.prefetch_related( *prefetch )
+        objects = list( objects )
+
+        if annotate:
+            ## one grouped query instead of GROUP BY over the joined tables
+            names = annotate.keys()
+            rows = queryset.model._default_manager.filter( pk__in=chunk )
+            rows = rows.order_by().annotate(**annotate).values_list('pk', *names)
+            values = dict( (r[0], r[1:]) for r in rows )
+            for o in objects:
+                for name, value in zip( names, values.get(o.pk, ()) ):
+                    setattr( o, name, value )
+
+        for o in objects:
+            yield [ c.value(o) for c in columns ]
+
+
+def iterCsv( queryset, fields, chunksize=500 ):
+    """
+    Generate CSV lines for all objects of a queryset (see iterValues).
+    @param queryset: QuerySet
+    @param fields: OrderedDict of { column title : column expression }
+    @param chunksize: int, number of objects loaded at once
+    @return generator of str
+    """
+    writer = csv.writer( _Echo() )
+    yield writer.writerow( [ _encode(t) for t in fields.keys() ] )
+
+    for row in iterValues( queryset, fields.values(), chunksize=chunksize ):
+        yield writer.writerow( [ _encode(v) for v in row ] )
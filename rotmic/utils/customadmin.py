@@ -35,6 +35,17 @@ import rotmic.models as M
 import rotmic.templatetags.rotmicfilters as F
 
 
+def _lookups(field_dict, prefix=''):
+    """
+    Convert a nested select_related dict {'a':{'b':{}}, 'c':{}} into
+    lookup strings ['a__b', 'c']
+    """
+    r = []
+    for name, sub in field_dict.items():
+        r += _lookups(sub, prefix + name + '__') or [ prefix + name ]
+    return r
+
+
 class ViewFirstChangeList( ChangeList ):
     """
     Modify the admin ChangeList so that items are linked to the readonly
@@ -47,6 +58,30 @@ class ViewFirstChangeList( ChangeList ):
                                                self.opts.module_name),
                        args=(quote(pk),),
                        current_app=self.model_admin.admin_site.name)
+
+    def get_queryset(self, request):
+        """
+        Add the select_related / prefetch_related lookups declared by the
+        table columns (see ViewFirstModelAdmin.columnPlan).
+        """
+        qs = super(ViewFirstChangeList, self).get_queryset(request)
+        return self.model_admin.columnQueryset(qs, self.list_display)
+
+    def get_results(self, request):
+        """
+        Evaluate the current page and attach the aggregates declared by the
+        table columns with one grouped query for the whole page. Fields
+        listed in ModelAdmin.list_defer are not loaded.
+        """
+        ## skip large fields not shown in the table (for the page only --
+        ## admin actions still get the full queryset)
+        defer = getattr(self.model_admin, 'list_defer', ())
+        if defer:
+            self.queryset = self.queryset.defer(*defer)
+
+        super(ViewFirstChangeList, self).get_results(request)
+        self.result_list = self.model_admin.columnAnnotate(self.result_list,
+                                                           self.list_display)
     
 
 class ViewFirstModelAdmin( ModelAdmin ):
@@ -100,6 +135,102 @@ class ViewFirstModelAdmin( ModelAdmin ):
         """
         return ViewFirstChangeList
 
+    def columnPlan(self, list_display):
+        """
+        Collect the relations and aggregates needed by the table columns.
+        Next to allow_tags and short_description, a column method (on the 
+        ModelAdmin or on the model) can declare:
+        
+        * select_related -- tuple of lookups joined into the page query
+        * prefetch_related -- tuple of lookups fetched once for the page
+        * annotate -- dict of {attribute name : aggregate}, evaluated for
+                      the current page and set as attribute on each object
+        * batch -- function(objects) called once with all objects of the 
+                   current page, e.g. to attach data from other tables
+        
+        Example::
+            def showVectorUrl(self, obj): ...
+            showVectorUrl.select_related = ('vectorBackbone',)
+
+        ForeignKey fields listed directly in list_display are added to
+        select_related.
+
+        @return (set, set, dict, [func]) -- select_related, prefetch_related,
+                                            annotate, batch
+        """
+        select, prefetch, annotate, batch = set(), set(), {}, []
+        fks = [ f.name for f in self.model._meta.fields if f.rel ]
+
+        for name in list_display:
+            if name in fks:
+                select.add(name)
+                continue
+            
+            if callable(name):
+                f = name
+            else:
+                f = getattr(self, name, None) or getattr(self.model, name, None)
+
+            select.update( getattr(f, 'select_related', ()) )
+            prefetch.update( getattr(f, 'prefetch_related', ()) )
+            annotate.update( getattr(f, 'annotate', {}) )
+
+            if getattr(f, 'batch', None) and f.batch not in batch:
+                batch.append(f.batch)
+
+        return select, prefetch, annotate, batch
+
+    def columnQueryset(self, queryset, list_display):
+        """
+        Add select_related and prefetch_related lookups requested by the 
+        given table columns to queryset.
+        """
+        select, prefetch, annotate, batch = self.columnPlan(list_display)
+        
+        if select:
+            ## select_related(*fields) replaces (rather than extends) any 
+            ## previous selection in django 1.6
+            current = queryset.query.select_related
+            if isinstance(current, dict):
+                select.update( _lookups(current) )
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def columnAnnotate(self, objects, list_display):
+        """
+        Compute the aggregates requested by the given table columns for 
+        objects (typically one page of the change list) in a single grouped
+        query and assign them as attributes to each object. Then run the
+        batch functions of the table columns.
+        @return [ Model ] -- the evaluated objects
+        """
+        objects = list(objects)
+        select, prefetch, annotate, batch = self.columnPlan(list_display)
+
+        if not objects:
+            return objects
+
+        for f in batch:
+            f(objects)
+
+        if not annotate:
+            return objects
+
+        names = annotate.keys()
+        rows = self.model._default_manager.filter(pk__in=[o.pk for o in objects])
+        ## group by pk only, not by all (large text) columns of the model
+        rows = rows.order_by().values('pk').annotate(**annotate)\
+                   .values_list('pk', *names)
+        values = dict( (r[0], r[1:]) for r in rows )
+        
+        for o in objects:
+            for name, value in zip(names, values.get(o.pk, ())):
+                setattr(o, name, value)
+
+        return objects
+
 
     @csrf_protect_m
     def readonly_view(self, request, object_id, form_url='', extra_context=None):
@@ -194,3 +325,4 @@ class ViewFirstModelAdmin( ModelAdmin ):
     
     showComments.allow_tags = True
     showComments.short_description = ''
+    showComments.batch = commenttags.attach_comment_summaries
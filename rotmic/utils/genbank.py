@@ -13,15 +13,169 @@
 ## GNU Affero General Public License for more details.
 ## You should have received a copy of the GNU Affero General Public
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
-import StringIO
+import StringIO, hashlib, itertools, multiprocessing
 import Bio.SeqIO as SeqIO
 
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 import colorsys
 
 class GenbankError(ValueError):
     pass
 
+def contentHash(gbrecord):
+    """@return str, SHA1 hex digest identifying the content of a genbank record"""
+    if isinstance(gbrecord, unicode):
+        gbrecord = gbrecord.encode('utf-8')
+    return hashlib.sha1(gbrecord).hexdigest()
+
+def prepareRecord(gbrecord):
+    """
+    Parse a single genbank record (runs in worker processes, see parseRecords).
+    @param gbrecord: str, single genbank record
+    @return (dict, None) -- GenbankInMemory(gbrecord).toDict(); or
+            (None, str) -- error message if the record cannot be parsed
+    """
+    try:
+        return GenbankInMemory(gbrecord).toDict(), None
+    except GenbankError, why:
+        return None, str(why)
+    except Exception, why:
+        return None, 'Error reading genbank record: %r' % why
+
+def _streamed(pool, results):
+    try:
+        for r in results:
+            yield r
+    finally:
+        pool.terminate()
+        pool.join()
+
+def parseRecords(gbrecords, processes=1, chunksize=10):
+    """
+    Parse many genbank records, in a pool of worker processes if processes > 1.
+    Results are handed out as soon as they arrive, in the order of the records.
+    The pool is started right away -- close any database connection first.
+    @param gbrecords: [ str ], single genbank records
+    @return iterator of (dict, str) -- see prepareRecord
+    """
+    if processes < 2 or len(gbrecords) <= chunksize:
+        return itertools.imap( prepareRecord, gbrecords )
+
+    pool = multiprocessing.Pool( processes )
+    return _streamed( pool, pool.imap( prepareRecord, gbrecords, chunksize ) )
+
+
+
+## one record of a multi-record library file
+## format -- 'genbank', 'fasta' or None (not a record)
+## name -- LOCUS name or first word of the FASTA header
+## original -- record string
+LibraryRecord = namedtuple('LibraryRecord', ['format', 'name', 'original'])
+
+def _libraryRecord(lines):
+    s = '\n'.join(lines)
+    if lines[0].startswith('LOCUS'):
+        words = lines[0].split()[1:]
+        return LibraryRecord('genbank', words[0] if words else '', s)
+    if lines[0].startswith('>'):
+        words = lines[0][1:].split()
+        return LibraryRecord('fasta', words[0] if words else '', s)
+    return LibraryRecord(None, '', s)
+
+def iterRecords(lines):
+    """
+    Split a multi-record genbank or FASTA file into single records. Lines are
+    consumed one at a time, so only the current record is held in memory.
+    @param lines: iterable of str, e.g. an open file
+    @return iterator of LibraryRecord
+    """
+    current = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if line.startswith('LOCUS') or line.startswith('>'):
+            if current:
+                yield _libraryRecord(current)
+            current = [ line ]
+
+        elif current and current[0].startswith('LOCUS') and line.rstrip() == '//':
+            current.append( '//' )
+            yield _libraryRecord(current)
+            current = []
+
+        elif current or line.strip():
+            current.append( line )
+
+    if current:
+        yield _libraryRecord(current)
+
+def countRecords(lines):
+    """@return int -- number of genbank and FASTA records (see iterRecords)"""
+    return sum( [ 1 for line in lines
+                  if line.startswith('LOCUS') or line.startswith('>') ] )
+
+def prepareLibraryRecord(record):
+    """
+    Parse a LibraryRecord (runs in worker processes, see parseLibrary).
+    @return (dict, None) -- sequence, name and description (and features of
+            genbank records, see prepareRecord); or (None, str) -- error
+    """
+    if record.format == 'genbank':
+        return prepareRecord(record.original)
+
+    if record.format != 'fasta':
+        return None, 'Neither a genbank nor a FASTA record'
+
+    try:
+        seqrecord = SeqIO.read( StringIO.StringIO(record.original), 'fasta' )
+        seq = str(seqrecord.seq)
+        if not seq:
+            return None, 'Empty FASTA record'
+        description = seqrecord.description
+        if description.split(None, 1)[0] == seqrecord.id:
+            description = description[len(seqrecord.id):].strip()
+        return {'sequence': seq, 'name': seqrecord.id,
+                'description': description}, None
+
+    except Exception, why:
+        return None, 'Error reading FASTA record: %r' % why
+
+def _batches(pool, records, batchsize):
+    """parse the next batch while the current one is handed out"""
+    def submit(batch):
+        if pool:
+            return pool.map_async( prepareLibraryRecord, batch ).get
+        r = map( prepareLibraryRecord, batch )
+        return lambda: r
+
+    records = iter(records)
+    try:
+        batch = list( itertools.islice(records, batchsize) )
+        pending = submit(batch)
+        while batch:
+            nextBatch = list( itertools.islice(records, batchsize) )
+            nextPending = submit(nextBatch) if nextBatch else None
+
+            yield zip( batch, pending() )
+            batch, pending = nextBatch, nextPending
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+def parseLibrary(records, processes=1, batchsize=100):
+    """
+    Parse a stream of library records batch by batch, in a pool of worker
+    processes if processes > 1. At most two batches are held in memory.
+    The pool is started right away -- close any database connection first.
+    @param records: iterable of LibraryRecord (see iterRecords)
+    @return iterator of [ (LibraryRecord, (dict, str)) ] -- one list per
+            batch, see prepareLibraryRecord
+    """
+    pool = multiprocessing.Pool( processes ) if processes > 1 else None
+    return _batches( pool, records, batchsize )
+
+
 class GenbankInMemory:
     """
     Creates the following fields:
@@ -41,17 +195,46 @@ class GenbankInMemory:
         ]
     * gb: str, the original genbank record passed in
     * typecolors: dict, {'typestring' : 'colorcode'}  ... as used for features
+    
+    A previously parsed record can be restored from the dict created by 
+    toDict() without running the genbank parser again.
     """
     
-    def __init__(self, gbrecord):
-        """@param gbrecord - str, single gb record as string (not file)"""
+    def __init__(self, gbrecord, parsed=None):
+        """
+        @param gbrecord - str, single gb record as string (not file)
+        @param parsed - dict, result of an earlier toDict() call for 
+                        the same record (optional)
+        """
         self.gb = gbrecord
         self.sequence = ''
         self.features = []
         self.name = ''
         self.description = ''
         self.typecolors = OrderedDict()  ## dictionary of all different feature types : color
-        self.parse()
+        
+        if parsed:
+            self.fromDict(parsed)
+        else:
+            self.parse()
+
+    def toDict(self):
+        """
+        @return dict - parsing result (JSON compatible, without gb record)
+        """
+        return {'sequence': self.sequence,
+                'name': self.name,
+                'description': self.description,
+                'features': self.features,
+                'typecolors': self.typecolors.items() }  ## preserve order
+
+    def fromDict(self, d):
+        """Restore parsing result from dict created by toDict()"""
+        self.sequence = d['sequence']
+        self.name = d['name']
+        self.description = d['description']
+        self.features = d['features']
+        self.typecolors = OrderedDict( d['typecolors'] )
     
     def parse(self):
         try:
@@ -18,38 +18,31 @@
 import rotmic.models as M
 from django.contrib.auth.models import User
 
-import re, string
 
-ex_sampleId = re.compile('([A-Za-z]{0,1})([0-9]+)([a-zA-Z]{0,3})')
-ex_number = re.compile('([0-9]+)')
-
-def _extractNumbers( queryset, pattern ):
-    matches = [ pattern.match( o.displayId ) for o in queryset ]
-    numbers = [ int(x.groups()[0]) for x in matches if x is not None ]
-    numbers.sort()
-    return numbers    
-
-
-def nextId(modelClass, user, category_id=None):
-    """Generic ID generator"""
+def nextId(modelClass, user, category_id=None, session=None):
+    """
+    Generic ID generator.
+    session - dict-like, request.session; remembers the last ID reserved for 
+              each prefix so that re-loading an add form (or switching the 
+              category back and forth) does not burn a new number each time.
+    """
     f = getattr(modelClass, 'nextAvailableId', None)
-    if callable(f):
-        return f(user, category_id=category_id)
-    else:
+    if not callable(f):
         return 'xxx'
 
+    if session is None:
+        return f(user, category_id=category_id)
 
-def __nextSampleInBox( samples ):
-    """
-    """
-    try:
-        if not samples.count(): 
-            return '01'
-        
-        numbers = _extractNumbers( samples, ex_number )
-        return '%02i' % (numbers[-1] + 1)
-    except:
-        return ''    
+    prefix = modelClass.idPrefix(user, category_id=category_id)
+    reserved = session.get('reservedIds', {})
+    
+    r = reserved.get(prefix)
+    if not r or M.Component.objects.filter(displayId=r).exists():
+        r = f(user, prefix=prefix)
+        reserved[prefix] = r
+        session['reservedIds'] = reserved
+    
+    return r
 
 
 def splitSampleId( sampleId ):
@@ -57,52 +50,15 @@ def splitSampleId( sampleId ):
     sampleId - str, like 'A1' or '12' or '12b'
     @return (str, int, str) - letter, number, letter(s)
     """
-    match = ex_sampleId.match(sampleId)
-    if not match:
-        return '', None
-    
-    letter, number, suffix = match.groups()
-    return letter.upper(), int(number), suffix.lower()
-
+    return M.splitPosition( sampleId )
 
-def __nextSampleInPlate( samples, columns=12, rows=8 ):
-    """
-    """
-    if not samples.count(): 
-        return 'A1'
-    assert rows < 26
-    
-    ids = [ o.displayId for o in samples ]
-    ids.sort()
-
-    id_tupples = [ splitSampleId( s )[0:2] for s in ids ]
-    
-    letter, number = id_tupples[-1]
-    if number >= columns:
-        letter = string.ascii_uppercase[ string.ascii_uppercase.find(letter)+1 ]
-        number = 0
-    return letter.upper() + '%02i' % (number + 1)
-    
 
 def suggestSampleId(container_id):
     """
     container_id - int, pk of parent container
+    @return str -- first free position in the container (see ContainerOccupancy)
     """
     try:
-        box = M.Container.objects.get(id=container_id)
-        samples = box.samples.all()
-        
-        try:
-            if box.containerType == '96-well-plate':
-                return __nextSampleInPlate( samples )
-            if box.containerType == '384-well-plate':
-                return __nextSampleInPlate( samples, columns=24, rows=16 )
-            else:
-                return __nextSampleInBox( samples )
-        except:
-            return ''
-        
-    except ValueError:
+        return M.ContainerOccupancy.forContainer( int(container_id) ).nextFree()
+    except (ValueError, M.Container.DoesNotExist):
         return ''
-    
-
@@ -14,11 +14,14 @@
 ## You should have received a copy of the GNU Affero General Public
 ## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
 """Bulk import of records from XLS and/or CSV files"""
-import tempfile, datetime, re
+import tempfile, datetime, re, collections, os
 
 import xlrd as X
 import django.core.files.uploadedfile as U
+from django.forms.models import model_to_dict
 from django.contrib.auth.models import User
+from django.db import transaction
+import django.contrib.messages as messages
 
 import rotmic.models as M
 import rotmic.forms as F
@@ -50,37 +53,60 @@ class ImportXls(object):
     # force integer type if a x.0 number is returned by Excel
     field2int = []  
     
-    def __init__(self, f, user, request=None):
+    # max number of values per IN query during resolveRelations
+    resolveChunk = 500
+    
+    # table columns written by the Excel export, with headers understood by
+    # this parser: OrderedDict of { header : column expression } (see 
+    # utils.csvexport for the expression syntax)
+    xlsColumns = collections.OrderedDict()
+    
+    # fields kept from the existing record if a row updates it
+    keepOnUpdate = ['registeredBy', 'registeredAt']
+    
+    def __init__(self, f, user, request=None, update=False):
         """
         @param f: file handle pointing to Excel file
         @param user: django.auth.models.User instance
+        @param update: bool, rows with the ID of an existing record change
+                       that record (default: report them as errors)
         """
         if isinstance(f, U.File):
-            fname = tempfile.mktemp(prefix='rotmicupload_')
-            ftemp = open(fname, 'w')
-            ftemp.writelines( f.readlines() )
-            ftemp.close()
+            fd, fname = tempfile.mkstemp(prefix='rotmicupload_')
+            with os.fdopen(fd, 'wb') as ftemp:
+                for chunk in f.chunks():
+                    ftemp.write( chunk )
             f = fname
+            self.tempfile = fname
+        else:
+            self.tempfile = None
             
         self.f = f
         self.user = user
         self.request = request
+        self.update = update
         
         self.objects = []
         self.book = None  ## will hold XLRD workbook object
+        self.total = 0    ## number of table rows below header (after openSheet)
+        
+        ## filled by resolveRelations
+        self.resolved = {}   ## { (model, field) : { value : [ instance ] } }
+        self.instances = {}  ## { (model, id) : instance }
 
         
-    def parse(self, keyrow=0, firstrow=1 ):
+    def openSheet(self, keyrow=0, firstrow=1):
         """
-        Extract field names from |keyrow| and extract data for each field from
-        excel workbook starting at row |firstrow|.
+        Open the first sheet of the excel workbook and extract field names
+        from the first row with at least 3 non-empty values starting 
+        from |firstrow|.
         @param keyrow: int, row containing field names
         @param firstrow: int, first row containing data
-        @return: [ {} ], list of dictionaries 
+        @return: (xlrd.Sheet, [ unicode ], int) -- sheet, keys, first data row
         """
         try:
-            self.book = X.open_workbook( self.f )
-            sheet= self.book.sheets()[0]
+            self.book = X.open_workbook( self.f, on_demand=True )
+            sheet= self.book.sheet_by_index(0)
     
             firstrow -= 1
             keys = []
@@ -91,23 +117,38 @@ class ImportXls(object):
     
             if not keys:
                 raise ImportError, 'Could not identify table header row.'
-                
-            r = []
-            for row in range( firstrow, sheet.nrows ):
-                values = sheet.row_values( row )
-    
-                ## ignore rows with empty first column
-                if values[0]:
-                    r += [ dict( zip( keys, values ) ) ] 
             
-            self.rows = r
-            
-            return r
+            self.total = sheet.nrows - firstrow
+            return sheet, keys, firstrow
 
         except Exception as e:
             raise ImportError('Something went terribly wrong during parsing of the file: '+\
                               unicode(e))
-        return []
+        
+    def iterRows(self, keyrow=0, firstrow=1 ):
+        """
+        Read table rows lazily, one at a time (see parse).
+        @return: generator of dict
+        """
+        sheet, keys, firstrow = self.openSheet( keyrow=keyrow, firstrow=firstrow )
+        
+        for row in range( firstrow, sheet.nrows ):
+            values = sheet.row_values( row )
+
+            ## ignore rows with empty first column
+            if values[0]:
+                yield dict( zip( keys, values ) )
+        
+    def parse(self, keyrow=0, firstrow=1 ):
+        """
+        Extract field names from |keyrow| and extract data for each field from
+        excel workbook starting at row |firstrow|.
+        @param keyrow: int, row containing field names
+        @param firstrow: int, first row containing data
+        @return: [ {} ], list of dictionaries 
+        """
+        self.rows = list( self.iterRows( keyrow=keyrow, firstrow=firstrow ) )
+        return self.rows
     
 
     def renameKey( self, d, key, newkey):
@@ -136,12 +177,137 @@ class ImportXls(object):
         
         return d
 
+    def __lookupSpecs(self):
+        """
+        @return [ (field, model, targetfield, targetfield2, many) ] -- all 
+                lookup instructions of xls2foreignkey and xls2many with defaults
+        """
+        r = []
+        for specs, many in ((self.xls2foreignkey, False), (self.xls2many, True)):
+            for x in specs:
+                r += [ (x['field'], x.get('model', M.DnaComponent),
+                        x.get('targetfield', 'displayId'), 
+                        x.get('targetfield2', None), many) ]
+        return r
+    
+    def resolveRelations(self, rows):
+        """
+        Resolution phase before the row-by-row lookupRelations: Collect all
+        distinct values referenced by the foreignKey and Many2Many columns of
+        the table and fetch the matching instances with one IN query per 
+        (model, targetfield). __lookupId then serves lookups from 
+        self.resolved instead of querying the database for each cell.
+        @param rows: [ dict ], rows after cleanDict
+        """
+        values = collections.defaultdict(set)
+
+        for field, model, targetfield, targetfield2, many in self.__lookupSpecs():
+            for d in rows:
+                v = d.get(field, '')
+                if not isinstance(v, basestring):
+                    continue ## __lookupId will report the error
+                
+                v = v.split(',') if many else [v]
+                v = set( x.strip() for x in v ) - set([''])
+                
+                values[ (model, targetfield) ] |= v
+                if targetfield2:
+                    values[ (model, targetfield2) ] |= v
+
+        for (model, field), v in values.items():
+            self.__resolve( model, field, list(v) )
+
+    def __resolve(self, model, field, values):
+        """Fetch all instances with model.field in values (chunk-wise)"""
+        r = self.resolved.setdefault( (model, field), {} )
+        values = [ v for v in values if v not in r ]  ## from previous chunks
+        for v in values:
+            r[v] = []
+
+        for i in range(0, len(values), self.resolveChunk):
+            chunk = values[i : i+self.resolveChunk]
+            for o in model.objects.filter( **{ field + '__in' : chunk } ):
+                key = getattr(o, field)
+                ## the database may match case-insensitively
+                if key not in r:
+                    continue
+                r[key] += [ self.instances.setdefault( (model, o.id), o ) ]
+
+    def existingKey(self, d):
+        """
+        @param d: dict, row after cleanDict
+        @return key identifying the existing record described by row d
+                (matched against instanceKey) or None
+        """
+        r = d.get('displayId', None)
+        if isinstance( r, basestring ):
+            return r.strip() or None
+        return None
+
+    def instanceKey(self, o):
+        """@return key of an existing record (see existingKey)"""
+        return o.displayId
+
+    def existingRecords(self, keys):
+        """@return QuerySet -- existing records matching the given keys"""
+        return self.modelClass.objects.filter( displayId__in=keys )
+
+    def resolveExisting(self, rows):
+        """
+        Update mode: look up the existing records with the IDs given in
+        the table (one query per chunk) and attach each of them to its row
+        as d['instance'] for dict2instance.
+        @param rows: [ dict ], rows after cleanDict
+        """
+        keys = set( self.existingKey(d) for d in rows ) - set([None])
+        if not keys:
+            return
+
+        found = collections.defaultdict(list)
+        for o in self.existingRecords( list(keys) ):
+            found[ self.instanceKey(o) ] += [ o ]
+
+        for d in rows:
+            matches = found.get( self.existingKey(d), [] )
+            if len( matches ) == 1:
+                d['instance'] = matches[0]
+            elif matches:
+                d['ambiguous'] = True
+
+    def cachedInstance(self, model, id):
+        """
+        @return model instance with given id, fetched by resolveRelations
+                or from the database
+        @raise model.DoesNotExist
+        """
+        r = self.instances.get( (model, id), None )
+        if r is None:
+            r = model.objects.get( id=id )
+        return r
+
     def __dbfetchSingle(self, model, **kwarg ):
         matches = model.objects.filter( **kwarg )
         if len( matches ) == 1:
             return matches[0].id
         return None
-        
+    
+    def __fetchSingle(self, model, field, value):
+        """
+        @return int, ID of the only instance with model.field == value among 
+                the instances found by resolveRelations, or None
+        """
+        matches = self.resolved.get( (model, field), {} ).get( value, [] )
+        if len( matches ) == 1:
+            return matches[0].id
+        return None
+    
+    def __isResolved(self, model, value, *fields):
+        """
+        @return True if resolveRelations has found any instance with one of
+                model.fields == value
+        """
+        return any( self.resolved.get( (model, f), {} ).get( value )
+                    for f in fields if f )
 
     def __lookupId(self, value, model=M.DnaComponent, targetfield='displayId', 
                    targetfield2=None ):
@@ -153,12 +319,22 @@ class ImportXls(object):
             if not value:
                 return value, error
         
-            kwarg = { targetfield : value }
-            r = self.__dbfetchSingle( model, **kwarg )
+            r = self.__fetchSingle( model, targetfield, value )
     
             if r is None and targetfield2:
-                kwarg = { targetfield2 : value }
+                r = self.__fetchSingle( model, targetfield2, value )
+            
+            ## Not found at the start of the import -- the entry may have been 
+            ## created by a previous row (or resolveRelations was skipped)
+            if r is None and \
+               not self.__isResolved( model, value, targetfield, targetfield2 ):
+
+                kwarg = { targetfield : value }
                 r = self.__dbfetchSingle( model, **kwarg )
+        
+                if r is None and targetfield2:
+                    kwarg = { targetfield2 : value }
+                    r = self.__dbfetchSingle( model, **kwarg )
             
             if r is None:
                 raise model.DoesNotExist(\
@@ -243,6 +419,9 @@ class ImportXls(object):
         Convert names or displayIds into db IDs to foreignKey instances.
         """
         d['errors'] = {}
+        
+        if d.get('ambiguous', False):
+            d['errors']['displayId'] = [u'Several existing records match this ID.']
 
         for x in self.xls2foreignkey:
             self.__lookup( d, **x )
@@ -290,7 +469,18 @@ class ImportXls(object):
         ## no errors while looking up related fields
         if not d.get('errors', []):
             try:
-                form = self.dataForm( data=d )
+                data = d
+                instance = d.get('instance', None)
+                
+                ## update: start from the current values of the record
+                if instance:
+                    data = model_to_dict( instance )
+                    kept = dict( (k, data[k]) for k in self.keepOnUpdate 
+                                 if k in data )
+                    data.update( d )
+                    data.update( kept )
+                
+                form = self.dataForm( data=data, instance=instance )
                 form.request = self.request  ##This is actually only required for forms derrived from SampleForm
                 
                 valid = form.is_valid()
@@ -306,6 +496,56 @@ class ImportXls(object):
         return d
 
     
+    def processRows( self, rows, commit=False ):
+        """
+        Run cleanup, foreignKey lookup and object creation for a list of
+        rows (e.g. one chunk of the table).
+        @param rows: [ dict ], as returned by parse
+        @return [ dict ] -- processed rows (see getObjects)
+        """
+        rows = [ self.cleanDict(d) for d in rows ]
+        self.resolveRelations( rows )
+        if self.update:
+            self.resolveExisting( rows )
+
+        r = []
+        pending = []  ## rows without ID -- cannot be referenced by other rows
+        for d in rows:
+            entry = self.lookupRelations( d )
+            entry = self.postprocessDict( entry )
+            if entry.get('displayId'):
+                entry = self.dict2instance( entry, commit=commit )
+            else:
+                pending += [ entry ]
+            r += [ entry ]
+        
+        self.assignIds( pending )
+        for entry in pending:
+            self.dict2instance( entry, commit=commit )
+        
+        return r
+
+    def assignIds( self, rows ):
+        """
+        Fill in new IDs for rows without ID (if supported by the record type).
+        @param rows: [ dict ], processed rows without displayId
+        """
+        pass
+
+    def iterChunks( self, chunksize=100 ):
+        """
+        Read the table lazily in chunks of rows.
+        @return generator of [ dict ]
+        """
+        chunk = []
+        for d in self.iterRows():
+            chunk += [ d ]
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
     def getObjects( self, commit=False ):
         """
         Run all parsing, cleanup and object extraction steps.
@@ -321,10 +561,7 @@ class ImportXls(object):
         self.objects = []
         self.failed = []
 
-        for d in r:
-            entry = self.lookupRelations( self.cleanDict(d) )
-            entry = self.postprocessDict( entry )
-            entry = self.dict2instance( entry, commit=commit )
+        for entry in self.processRows( r, commit=commit ):
             
             if entry.get('object', None):
                 self.objects += [ entry['object'] ]
@@ -335,6 +572,101 @@ class ImportXls(object):
             if entry['errors']:
                 self.failed += [ entry ]
 
+    def errorMessage( self, d ):
+        """@return unicode -- summary of the errors of one row"""
+        id = d.get('displayId') or '??'
+        errors = ['%s (%s)' % (k,v) for k,v in d['errors'].items() ]
+        errors = '; '.join(errors)
+        return u'Import error(s) for entry "%s": %s' % (id, errors)
+
+    def __runChunk( self, rows, progress ):
+        """
+        Import one chunk of rows inside its own transaction (or savepoint).
+        Unexpected (database) errors revert the whole chunk.
+        @return [ unicode ] -- names of the imported objects
+        """
+        imported = []
+        try:
+            with transaction.atomic():
+                for d in self.processRows( rows, commit=True ):
+                    if d['errors']:
+                        progress.failed += 1
+                        progress.addMessage( messages.ERROR, self.errorMessage(d) )
+                    elif d.get('object', None) and d.get('instance', None):
+                        imported += [ unicode( d['object'] ) + ' (updated)' ]
+                    elif d.get('object', None):
+                        imported += [ unicode( d['object'] ) ]
+        
+        except Exception as why:
+            progress.failed += len(rows)
+            imported = []
+            progress.addMessage( messages.ERROR, 
+                u'Unforeseen error. %i rows starting from "%s" have been reverted. Reason: %s'\
+                % ( len(rows), rows[0].get('displayId', '??'), unicode(why) ) )
+        
+        progress.processed += len(rows)
+        return imported
+        
+    def __runChunks( self, progress, chunksize ):
+        imported = []
+        
+        for rows in self.iterChunks( chunksize=chunksize ):
+            imported += self.__runChunk( rows, progress )
+            progress.total = self.total
+            
+            if not progress.atomic:
+                progress.imported = len(imported)
+            progress.publish()
+
+        return imported
+
+    def run( self, progress, chunksize=100 ):
+        """
+        Import the whole table chunk by chunk and report the progress after
+        each chunk. progress.atomic selects between two strategies:
+        
+        * all-or-nothing -- the import runs in a single transaction and each
+          chunk within a savepoint. If any row fails, the remaining rows are 
+          still validated (to report all errors) but nothing is imported.
+        * chunk-wise -- each chunk is committed separately. Rows with errors
+          are skipped, all other rows are imported.
+        
+        @param progress: rotmic.models.Job
+        @param chunksize: int, number of rows validated and saved at once
+        """
+        try:
+            if progress.atomic:
+                with transaction.atomic():
+                    imported = self.__runChunks( progress, chunksize )
+                
+                    if progress.failed:
+                        transaction.set_rollback(True)  ## reverts all chunks
+                        imported = []
+                        progress.addMessage( messages.ERROR, 
+                            u'Import of %s failed. Correct errors and try again. (Nothing has been imported.)' 
+                            % progress.title )
+            else:
+                imported = self.__runChunks( progress, chunksize )
+            
+            for o in imported:
+                progress.addMessage( messages.SUCCESS, 
+                                     u'Successfully imported %s.' % o )
+            progress.imported = len(imported)
+            progress.status = 'failed' if progress.atomic and progress.failed \
+                              else 'done'
+        
+        except Exception as why:
+            progress.status = 'failed'
+            if progress.atomic:
+                progress.imported = 0
+            progress.addMessage( messages.ERROR, 
+                u'Some unforeseen error occured. Reason: ' + unicode(why) )
+        
+        progress.save()
+        
+        if self.tempfile:
+            os.remove( self.tempfile )
+        
 
 class ImportXlsComponent( ImportXls ):
     """Base class for Component-derrived import."""
@@ -353,6 +685,16 @@ class ImportXlsComponent( ImportXls ):
 
     typeClass = M.ComponentType  ## abstract base class
 
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( [
+        ('ID', 'displayId'),
+        ('Name', 'name'),
+        ('Status', 'status'),
+        ('Authors', "authors.values_list('username', flat=True)"),
+        ('Type', 'componentType.name'),
+        ('Projects', "projects.values_list('name', flat=True)"),
+        ('Description', 'description') ] )
+
     def generateName(self, d):
         """If missing, compose name from vectorbackbone"""
         ## automatically create name
@@ -376,7 +718,7 @@ class ImportXlsComponent( ImportXls ):
     def setCategory(self, d):
         """Extract category from componentType"""
         try:
-            t = self.typeClass.objects.get( id=d['componentType'])
+            t = self.cachedInstance( self.typeClass, d['componentType'] )
             d['componentCategory'] = t.category().id
         except Exception as e:
             d['errors']['componentType'] = d['errors'].get('componentType', [])
@@ -418,6 +760,29 @@ class ImportXlsComponent( ImportXls ):
         self.cleanType(d)
         return d
 
+    def assignIds( self, rows ):
+        """
+        Reserve new IDs for all rows without ID in one go (one counter 
+        update per ID prefix, see IdCounter).
+        """
+        byprefix = collections.defaultdict(list)
+        
+        for d in rows:
+            if d['errors']:
+                continue
+            try:
+                prefix = self.modelClass.idPrefix( self.user, 
+                                    category_id=d.get('componentCategory') )
+                byprefix[prefix] += [ d ]
+            except Exception as e:
+                d['errors']['displayId'] = [u'Error generating ID: '+unicode(e)]
+        
+        for prefix, entries in byprefix.items():
+            ids = self.modelClass.reserveIds( self.user, len(entries), 
+                                              prefix=prefix )
+            for d, displayId in zip( entries, ids ):
+                d['displayId'] = displayId
+
 
 class ImportXlsDna( ImportXlsComponent ):
     """DNA construct import"""
@@ -451,6 +816,15 @@ class ImportXlsDna( ImportXlsComponent ):
                        'targetfield2' : 'name' } 
                      ]
 
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( 
+        ImportXlsComponent.xlsColumns.items()[:5] + 
+        [ ('Vector', 'vectorBackbone.displayId'),
+          ('Markers', "markers.values_list('displayId', flat=True)"),
+          ('Translates To', 'translatesTo.displayId') ] +
+        ImportXlsComponent.xlsColumns.items()[5:] + 
+        [ ('Sequence', 'sequence') ] )
+
 
 class ImportXlsCell( ImportXlsComponent ):
     """Modifed cell import"""
@@ -478,14 +852,22 @@ class ImportXlsCell( ImportXlsComponent ):
                        'model' : M.DnaComponent, 'targetfield' : 'displayId',
                        'targetfield2' : 'name' } 
                      ]
+
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( 
+        ImportXlsComponent.xlsColumns.items()[:4] + 
+        [ ('Strain', 'componentType.name'),
+          ('Plasmid', 'plasmid.displayId'),
+          ('Markers', "markers.values_list('displayId', flat=True)") ] +
+        ImportXlsComponent.xlsColumns.items()[5:] )
     
     def generateName(self, d):
         """If missing, compose name from plasmid and cell"""
         ## automatically create name
         try:
             if not d.get('name', '') and d.get('plasmid',''):
-                plasmid = M.DnaComponent.objects.get( id=d['plasmid'])
-                cell = M.CellComponentType.objects.get( id=d['componentType'])
+                plasmid = self.cachedInstance( M.DnaComponent, d['plasmid'] )
+                cell = self.cachedInstance( M.CellComponentType, d['componentType'] )
                 
                 d['name'] = plasmid.name + '@' + cell.name
 
@@ -525,6 +907,16 @@ class ImportXlsOligo( ImportXlsComponent ):
                    'model' : M.OligoComponent, 'targetfield' : 'displayId',
                    'targetfield2' : 'name' }                  
                  ]
+
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( 
+        ImportXlsComponent.xlsColumns.items()[:5] + 
+        [ ('Purification', 'purification'),
+          ('Tm', 'meltingTemp'),
+          ('Templates', "templates.values_list('displayId', flat=True)"),
+          ('Reverse Primers', "reversePrimers.values_list('displayId', flat=True)") ] +
+        ImportXlsComponent.xlsColumns.items()[5:] + 
+        [ ('Sequence', 'sequence') ] )
                 
     def correctPurification(self, d):
         """Replace human-readable purification by internal choices value"""
@@ -578,6 +970,12 @@ class ImportXlsChemical( ImportXlsComponent ):
     xls2foreignkey = [  { 'field' : 'componentType', 'model' : M.ChemicalType,
                          'targetfield' : 'name'}
                        ]
+
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( 
+        ImportXlsComponent.xlsColumns.items()[:5] + 
+        [ ('C.A.S.', 'cas') ] +
+        ImportXlsComponent.xlsColumns.items()[5:] )
     
 
 class ImportXlsProtein( ImportXlsComponent ):
@@ -602,12 +1000,16 @@ class ImportXlsProtein( ImportXlsComponent ):
                        { 'field' : 'encodedBy', 'model' : M.DnaComponent }
                        ]
 
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( 
+        ImportXlsComponent.xlsColumns.items() + [ ('Sequence', 'sequence') ] )
+
     def generateName(self, d):
         """If missing, copy name from encodedBy field"""
         ## automatically create name
         try:
             if not d.get('name', '') and d.get('encodedBy',''):
-                dna = M.DnaComponent.objects.get( id=d['encodedBy'])
+                dna = self.cachedInstance( M.DnaComponent, d['encodedBy'] )
                 d['name'] = dna.name
                 
         except Exception as e:
@@ -626,6 +1028,12 @@ class ImportXlsLocation( ImportXls ):
     # lookup instructions for fields (default model=DnaComponent,
     # targetfield=displayId)
     xls2foreignkey = []
+
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( [ ('ID', 'displayId'),
+                                            ('Name', 'name'),
+                                            ('Temperature', 'temperature'),
+                                            ('Room', 'room') ] )
         
     def postprocessDict(self, d):
         d = super(ImportXlsLocation, self).postprocessDict(d)
@@ -660,6 +1068,11 @@ class ImportXlsRack( ImportXls ):
     xls2foreignkey = [  { 'field' : 'location', 'model' : M.Location,
                          'targetfield' : 'displayId'}
                        ]
+
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( [ ('ID', 'displayId'),
+                                            ('Name', 'name'),
+                                            ('Location', 'location.displayId') ] )
     
 
 class ImportXlsContainer( ImportXls ):
@@ -680,6 +1093,13 @@ class ImportXlsContainer( ImportXls ):
                           'targetfield' : 'displayId'},
                        ]
     ## ToDo include type code cleanup
+
+    # Excel export, see ImportXls.xlsColumns
+    xlsColumns = collections.OrderedDict( [ ('ID', 'displayId'),
+                                            ('Name', 'name'),
+                                            ('Rack', 'rack.displayId'),
+                                            ('Type', 'containerType'),
+                                            ('Description', 'description') ] )
     
 
 class ImportXlsSample( ImportXls ):
@@ -713,6 +1133,59 @@ class ImportXlsSample( ImportXls ):
     # enforce integer numbers if it is a number
     field2int = ['aliquotNr', 'displayId', 'experimentNr']
     
+    # Excel export, see ImportXls.xlsColumns; the sample content columns
+    # are inserted by the sub-classes (see contentColumns)
+    xlsColumns = collections.OrderedDict( [
+        ('Position', 'displayId'),
+        ('Container', 'container.displayId'),
+        ('Status', 'status'),
+        ('Prepared', 'preparedAt'),
+        ('By', 'preparedBy.username'),
+        ('experiment #', 'experimentNr'),
+        ('Concentration', 'concentration'),
+        ('Concentration Unit', 'concentrationUnit.name'),
+        ('in Buffer', 'solvent'),
+        ('Amount', 'amount'),
+        ('Amount Unit', 'amountUnit.name'),
+        ('Aliquots', 'aliquotNr'),
+        ('Description', 'description') ] )
+    
+    @classmethod
+    def contentColumns(cls, columns):
+        """
+        @param columns: [ (str, str) ], header and expression of content columns
+        @return OrderedDict -- xlsColumns with content columns after 
+                'experiment #'
+        """
+        r = ImportXlsSample.xlsColumns.items()
+        return collections.OrderedDict( r[:6] + columns + r[6:] )
+
+    def normalizedPosition(self, position):
+        """@return str -- position in the format enforced by SampleForm"""
+        letter, number, suffix = M.splitPosition( unicode(position).strip() )
+        if number is None:
+            return None
+        return letter + '%02i' % number + suffix
+
+    def existingKey(self, d):
+        """@return (str, str) -- container ID and normalized position"""
+        container = d.get('container', None)
+        position = d.get('displayId', None)
+        if not isinstance( container, basestring ) or position in (None, ''):
+            return None
+
+        position = self.normalizedPosition( position )
+        return ( container.strip(), position ) if position else None
+
+    def instanceKey(self, o):
+        return ( o.container.displayId, self.normalizedPosition(o.displayId) )
+
+    def existingRecords(self, keys):
+        """all samples of the given containers (positions may not be normalized)"""
+        containers = set( k[0] for k in keys )
+        return self.modelClass.objects.filter( container__displayId__in=containers )\
+                   .select_related('container')
+    
 
     def correctStatus(self, d):
         """Replace human-readable status by internal status value"""
@@ -756,6 +1229,26 @@ class ImportXlsSample( ImportXls ):
 
         return d
 
+    def assignIds( self, rows ):
+        """
+        Place samples without position into the first free positions of
+        their container (see ContainerOccupancy). Positions given further
+        down the table (in later chunks) are not yet taken into account.
+        """
+        bycontainer = collections.defaultdict(list)
+        for d in rows:
+            if not d['errors'] and d.get('container'):
+                bycontainer[ d['container'] ] += [ d ]
+
+        for container, entries in bycontainer.items():
+            occupancy = M.ContainerOccupancy.forContainer( container )
+            positions = occupancy.firstFree( len(entries) )
+            
+            for d in entries[len(positions):]:
+                d['errors']['displayId'] = [u'No free position left in container.']
+            for d, position in zip( entries, positions ):
+                d['displayId'] = position
+
 
 class ImportXlsDnaSample( ImportXlsSample ):
     """Excel import of DNA samples"""
@@ -771,6 +1264,9 @@ class ImportXlsDnaSample( ImportXlsSample ):
     xls2foreignkey = ImportXlsSample.xls2foreignkey + \
                      [ { 'field' : 'dna', 'model' : M.DnaComponent } ]
 
+    xlsColumns = ImportXlsSample.contentColumns( 
+                     [ ('Dna Construct', 'dna.displayId') ] )
+
 
 
 class ImportXlsOligoSample( ImportXlsSample ):
@@ -787,6 +1283,9 @@ class ImportXlsOligoSample( ImportXlsSample ):
     xls2foreignkey = ImportXlsSample.xls2foreignkey + \
                      [ { 'field' : 'oligo', 'model' : M.OligoComponent } ]
 
+    xlsColumns = ImportXlsSample.contentColumns( 
+                     [ ('Oligo', 'oligo.displayId') ] )
+
 
 class ImportXlsChemicalSample( ImportXlsSample ):
     """Excel import of Oligo nucleotide samples"""
@@ -799,6 +1298,9 @@ class ImportXlsChemicalSample( ImportXlsSample ):
     xls2foreignkey = ImportXlsSample.xls2foreignkey + \
                      [ { 'field' : 'chemical', 'model' : M.ChemicalComponent } ]
 
+    xlsColumns = ImportXlsSample.contentColumns( 
+                     [ ('Chemical', 'chemical.displayId') ] )
+
 
 class ImportXlsCellSample( ImportXlsSample ):
     """Excel import of DNA samples"""
@@ -821,6 +1323,11 @@ class ImportXlsCellSample( ImportXlsSample ):
                        { 'field' : 'plasmid', 'model' : M.DnaComponent}
                        ]
 
+    xlsColumns = ImportXlsSample.contentColumns( 
+                     [ ('modified Cell', 'cell.displayId'),
+                       ('or Plasmid', 'cell.plasmid.displayId'),
+                       ('in Strain', 'cell.componentType.name') ] )
+
     def cleanType( self, d):
         """
         Remove category from type string. Example:
@@ -855,4 +1362,7 @@ class ImportXlsProteinSample( ImportXlsSample ):
     xls2foreignkey = ImportXlsSample.xls2foreignkey + \
                      [ { 'field' : 'protein', 'model' : M.ProteinComponent } ]
 
+    xlsColumns = ImportXlsSample.contentColumns( 
+                     [ ('Protein', 'protein.displayId') ] )
+
     
\ No newline at end of file
@@ -60,8 +60,22 @@ class InheritanceQuerySet(QuerySet):
         return new_qs
 
 
+    def prefetch_subclasses(self):
+        """
+        Alternative to select_subclasses() which avoids LEFT JOINing all
+        sub-class tables into one (wide) query. The base rows are fetched
+        first (including any select_related), then each direct sub-class is
+        loaded with a single query (following its own ForeignKeys) and
+        swapped in for the matching base instance. The number of queries
+        hence depends on the number of sub-classes, not of objects.
+        """
+        new_qs = self._clone()
+        new_qs._prefetch_subclasses = True
+        return new_qs
+
+
     def _clone(self, klass=None, setup=False, **kwargs):
-        for name in ['subclasses', '_annotated']:
+        for name in ['subclasses', '_annotated', '_prefetch_subclasses']:
             if hasattr(self, name):
                 kwargs[name] = getattr(self, name)
         return super(InheritanceQuerySet, self)._clone(klass, setup, **kwargs)
@@ -98,6 +112,56 @@ class InheritanceQuerySet(QuerySet):
                 yield obj
 
 
+    def _fetch_all(self):
+        if self._result_cache is None and \
+           getattr(self, '_prefetch_subclasses', False):
+            self._result_cache = self._load_subclasses(list(self.iterator()))
+        super(InheritanceQuerySet, self)._fetch_all()
+
+
+    def _load_subclasses(self, objects, chunk=500):
+        """
+        Replace base class instances by sub-class instances, with one query
+        per direct sub-class (and per chunk of objects). Cached relations
+        (select_related) and annotations are copied from the base instance.
+        """
+        if not objects:
+            return objects
+
+        pks = [ o.pk for o in objects ]
+        rels = [rel for rel in self.model._meta.get_all_related_objects()
+                      if isinstance(rel.field, OneToOneField)
+                      and issubclass(rel.field.model, self.model)]
+
+        subs = {}
+        for rel in rels:
+            model = rel.field.model
+            fks = [ f.name for f in model._meta.local_fields
+                    if f.rel and not f.primary_key ]
+
+            for i in range(0, len(pks), chunk):
+                qs = model._base_manager.filter(pk__in=pks[i:i+chunk])
+                for sub in qs.order_by().select_related(*fks):
+                    subs[sub.pk] = sub
+
+        caches = [ f.get_cache_name() for f in self.model._meta.fields if f.rel ]
+        caches += getattr(self, '_annotated', None) or []
+
+        r = []
+        for obj in objects:
+            sub = subs.get(obj.pk)
+            if sub is None:
+                r.append(obj)
+                continue
+
+            for name in caches:
+                if name in obj.__dict__:
+                    setattr(sub, name, obj.__dict__[name])
+            r.append(sub)
+
+        return r
+
+
     def _get_subclasses_recurse(self, model, levels=None):
         rels = [rel for rel in model._meta.get_all_related_objects()
                       if isinstance(rel.field, OneToOneField)
@@ -143,5 +207,8 @@ class InheritanceManager(models.Manager):
     def select_subclasses(self, *subclasses):
         return self.get_queryset().select_subclasses(*subclasses)
 
+    def prefetch_subclasses(self):
+        return self.get_queryset().prefetch_subclasses()
+
     def get_subclass(self, *args, **kwargs):
         return self.get_queryset().select_subclasses().get(*args, **kwargs)
@@ -0,0 +1,549 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Database-backed background jobs. Uploads create a Job record with enqueue()
+and hand it to start(). Jobs are then either run in a thread of the web
+server process (default; within the request under ./manage.py test) or,
+with settings.JOBS_IN_WORKER, picked up by separate worker processes::
+
+    ./manage.py runjobs --processes=2
+
+No message broker is needed -- workers claim queued jobs with a
+conditional UPDATE, which is atomic on all database backends. Running jobs
+that stop publishing progress for settings.JOB_TIMEOUT seconds (because
+their worker was killed or restarted) are marked as failed (see failStale).
+"""
+import collections, itertools, multiprocessing, os, socket, threading, time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import connection, transaction
+from django.utils import timezone
+import django.contrib.messages as messages
+
+import rotmic.models as M
+
+## task name -> function(job)
+TASKS = {}
+
+## number of genbank records saved at once
+GENBANK_BATCH = 100
+
+## True in job worker processes (./manage.py runjobs), see poolSize
+IN_WORKER = False
+
+def register(name):
+    """Decorator registering a function(job) as task name"""
+    def wrap(f):
+        TASKS[name] = f
+        return f
+    return wrap
+
+
+class JobRequest(object):
+    """
+    Stand-in for the original upload request inside a background job.
+    Forms only use request.user (and request.method); messages they add
+    (django.contrib.messages) go into the report of the job.
+    """
+    method = 'POST'
+
+    def __init__(self, user, job=None):
+        self.user = user
+        self.job = job
+        self._messages = self  ## message storage expected by contrib.messages
+
+    def add(self, level, message, extra_tags=''):
+        if self.job:
+            self.job.addMessage( level, unicode(message) )
+
+
+def enqueue(task, user, title='', modelName='', files=[], **parameters):
+    """
+    Create a new queued job.
+    @param task: str, name of a registered task
+    @param user: User, owner of the job
+    @param title: str, e.g. name of the uploaded file
+    @param modelName: str, lower-case name of the model affected by the job
+    @param files: [ File ], uploaded files to keep in storage for the job
+    @param parameters: task parameters (JSON-serializable values only)
+    @return Job
+    """
+    assert task in TASKS, 'unknown task %r' % task
+    with transaction.atomic():
+        job = M.Job(task=task, user=user, title=title, modelName=modelName)
+        job.setParameters(**parameters)
+        job.save()
+
+        for f in files:
+            jf = M.JobFile(job=job, name=f.name)
+            jf.f.save(f.name, f, save=True)
+
+    return job
+
+def start(job):
+    """
+    Run the job in a background thread of the current process (or right
+    away with settings.JOBS_SYNCHRONOUS), unless jobs are left to separate
+    workers (settings.JOBS_IN_WORKER).
+    """
+    failStale()
+    if getattr(settings, 'JOBS_IN_WORKER', False):
+        return
+
+    def run():
+        if claim(job.id):
+            runJob( M.Job.objects.get(id=job.id) )
+
+    if getattr(settings, 'JOBS_SYNCHRONOUS', False):
+        run()
+        return
+
+    def thread():
+        try:
+            run()
+        finally:
+            connection.close()
+
+    t = threading.Thread(target=thread)
+    t.daemon = True
+    t.start()
+
+def poolSize(name):
+    """
+    Number of worker processes for a process pool of a job. Pools are only
+    used in job workers -- a thread of the web server must not fork.
+    @param name: str, name of a setting, e.g. 'TRACE_PROCESSES'
+    @return int -- value of the setting in a job worker, otherwise 1
+    """
+    if not IN_WORKER:
+        return 1
+    return max( 1, getattr(settings, name, 1) )
+
+def workerName():
+    return '%s:%i' % (socket.gethostname(), os.getpid())
+
+def claim(pk):
+    """
+    Mark queued job pk as running by this process.
+    @return True if the job was claimed, False if another worker was faster
+    """
+    n = M.Job.objects.filter(id=pk, status='queued').update(
+        status='running', worker=workerName(), startedAt=timezone.now())
+    return n == 1
+
+def failStale():
+    """
+    Fail running jobs without progress for settings.JOB_TIMEOUT seconds.
+    @return int -- number of failed jobs
+    """
+    return M.Job.failStale( getattr(settings, 'JOB_TIMEOUT', 3600) )
+
+def claimNext():
+    """@return Job -- oldest queued job, now claimed by this process, or None"""
+    for pk in M.Job.objects.filter(status='queued').order_by('createdAt')\
+                                  .values_list('id', flat=True)[:10]:
+        if claim(pk):
+            return M.Job.objects.get(id=pk)
+    return None
+
+def runJob(job):
+    """Run a claimed job, record the result and clean up its files"""
+    try:
+        ## update auto-completion indices once, after all job transactions
+        with M.LookupVersion.deferred():
+            TASKS[job.task](job)
+        if job.status == 'running':
+            job.status = 'done'
+
+    except Exception as why:
+        job.status = 'failed'
+        job.addMessage( messages.ERROR,
+                        u'Some unforeseen error occured. Reason: ' + unicode(why) )
+
+    job.save()
+    job.deleteFiles()
+
+def runPending():
+    """
+    Run queued jobs in this process until the queue is empty.
+    @return int -- number of jobs run
+    """
+    failStale()
+    n = 0
+    job = claimNext()
+    while job:
+        runJob(job)
+        n += 1
+        job = claimNext()
+    return n
+
+def work(sleep=5):
+    """Worker loop: run queued jobs, then poll for new ones every sleep seconds"""
+    ## never share a database connection inherited from a parent process
+    connection.close()
+    while True:
+        if not runPending():
+            time.sleep(sleep)
+
+def startWorkers(n, target=work, **kwargs):
+    """
+    Start n worker processes (./manage.py runjobs --processes=n). They are
+    not daemonic, so that their jobs can start process pools of their own
+    (see poolSize) -- stop them with terminate() and join().
+    @param target: func, run by each worker with kwargs (default: work)
+    @return [ multiprocessing.Process ]
+    """
+    workers = [ multiprocessing.Process(target=target, kwargs=kwargs)
+                for i in range(n) ]
+    for p in workers:
+        p.start()
+    return workers
+
+
+@register('xlsimport')
+def xlsImport(job):
+    """
+    Excel table import (see ImportXls.run).
+    Parameters: parser -- name of ImportXls sub-class; chunksize -- int;
+    update -- bool, change existing records with the same ID
+    """
+    import rotmic.utils.importExcel as I
+
+    parser = getattr(I, job.param('parser'))
+    f = job.files.all()[0].f
+
+    p = parser(f, job.user, request=JobRequest(job.user, job),
+               update=job.param('update', False))
+    p.run( job, chunksize=job.param('chunksize', 100) )
+
+
+@register('genbank')
+def attachGenbank(job):
+    """
+    Attach genbank records to existing DNA or protein constructs. Records
+    are parsed in a pool of settings.GENBANK_PROCESSES worker processes (see
+    poolSize) and saved in batches of GENBANK_BATCH as the parsing results
+    come in (see Component.saveMany).
+    Records that cannot be parsed are reported and skipped.
+    Parameters: model -- 'DnaComponent' or 'ProteinComponent';
+    records -- [ (construct id, genbank record string) ]
+    """
+    import rotmic.forms.uploadForms as F
+    import rotmic.utils.genbank as G
+
+    model = getattr(M, job.param('model'))
+    records = job.param('records')
+    job.total = len(records)
+
+    processes = poolSize('GENBANK_PROCESSES')
+    if processes > 1:
+        connection.close()  ## don't share the database connection with workers
+    results = itertools.izip( records, G.parseRecords( [ s for pk, s in records ],
+                                                       processes=processes ) )
+    done = []
+    with transaction.atomic():
+        for i in range( 0, len(records), GENBANK_BATCH ):
+            batch = list( itertools.islice( results, GENBANK_BATCH ) )
+            constructs = model.objects.select_related('componentType__subTypeOf')\
+                                  .in_bulk( [ pk for (pk, s), r in batch ] )
+
+            changed = []
+            for (pk, s), (parsed, error) in batch:
+                dna = constructs[pk]
+                if error:
+                    job.addMessage( messages.ERROR, u'Construct %s: %s' % (unicode(dna), error) )
+                    job.failed += 1
+                    continue
+
+                replaced = F.replaceGenbank( dna, s, parsed )
+                changed.append( dna )
+
+                msg = u'Replaced genbank record in' if replaced else u'Attached new genbank record to'
+                done += [ msg + ' construct %s' % unicode(dna) ]
+
+            model.saveMany( changed )
+            job.processed += len(batch)
+            job.publish()
+
+    ## only report success once the whole upload has been committed
+    for msg in done:
+        job.addMessage( messages.SUCCESS, msg )
+    job.imported = len(done)
+
+
+@register('library')
+def importLibrary(job):
+    """
+    Attach the records of a multi-record genbank or FASTA file to existing
+    DNA or protein constructs (see uploadForms.LibraryMatcher) or register
+    new constructs for records without match. The file is read record by
+    record; records are parsed in a pool of settings.GENBANK_PROCESSES
+    worker processes (see poolSize) and saved in batches of GENBANK_BATCH,
+    each batch in its own transaction (see Component.saveMany). Records
+    that cannot be parsed or fail validation are reported and skipped.
+    Parameters: model -- 'DnaComponent' or 'ProteinComponent'; create --
+    bool, register unmatched records; componentType -- type id and
+    status -- str, of new constructs
+    """
+    import rotmic.forms.uploadForms as F
+    import rotmic.utils.genbank as G
+
+    model = getattr(M, job.param('model'))
+    create = job.param('create', False)
+    matcher = F.LibraryMatcher( model )
+
+    componentType = None
+    if create:
+        Type = model._meta.get_field('componentType').rel.to
+        componentType = Type.objects.get( id=job.param('componentType') )
+
+    ## relations are not changed by the job; IDs of new constructs come later
+    exclude = ['displayId'] + [ f.name for f in model._meta.fields if f.rel ]
+
+    f = job.files.all()[0].f
+    f.open()
+    job.total = G.countRecords( f )
+    f.seek(0)
+
+    processes = poolSize('GENBANK_PROCESSES')
+    if processes > 1:
+        connection.close()  ## don't share the database connection with workers
+    batches = G.parseLibrary( G.iterRecords(f), processes=processes,
+                              batchsize=GENBANK_BATCH )
+
+    seen = set()  ## pks of constructs with a record from this file
+    attached = created = 0
+    try:
+        for batch in batches:
+            matches = [ matcher.match( record.name ) for record, r in batch ]
+
+            with transaction.atomic():
+                constructs = model.objects.select_related('componentType__subTypeOf')\
+                                      .in_bulk( [ pk for pk in matches if pk ] )
+
+                changed, new = [], []
+                for (record, (parsed, error)), pk in zip( batch, matches ):
+                    job.processed += 1
+                    label = record.name or u'#%i' % job.processed
+
+                    if error:
+                        job.addMessage( messages.ERROR, u'Record %s: %s' % (label, error) )
+                        job.failed += 1
+                        continue
+
+                    if pk in seen:
+                        job.addMessage( messages.ERROR, u'Record %s: duplicate entry for construct %s'
+                                        % (label, constructs[pk].displayId) )
+                        job.failed += 1
+                        continue
+
+                    if pk:
+                        o = constructs[pk]
+                    elif create:
+                        o = model( registeredBy=job.user, registeredAt=timezone.now(),
+                                   modifiedBy=job.user, modifiedAt=timezone.now(),
+                                   componentType=componentType,
+                                   status=job.param('status') or 'available' )
+                    else:
+                        job.addMessage( messages.WARNING, u'Record %s: no matching construct'
+                                        % label )
+                        job.failed += 1
+                        continue
+
+                    if record.format == 'genbank':
+                        F.replaceGenbank( o, record.original, parsed )
+                    else:
+                        F.replaceFasta( o, parsed )
+
+                    try:
+                        o.full_clean( exclude=exclude )
+                    except ValidationError as e:
+                        errors = [ u'%s: %s' % (field, u' '.join(msgs))
+                                   for field, msgs in sorted( e.message_dict.items() ) ]
+                        job.addMessage( messages.ERROR, u'Record %s: %s'
+                                        % (label, u'; '.join(errors)) )
+                        job.failed += 1
+                        continue
+
+                    if pk:
+                        seen.add( pk )
+                    else:
+                        new.append( o )
+                    changed.append( o )
+
+                if new:
+                    ids = model.reserveIds( job.user, len(new),
+                                            category_id=componentType.category().id )
+                    for o, displayId in zip( new, ids ):
+                        o.displayId = displayId
+
+                model.saveMany( changed )
+
+                if new:
+                    Authors = model.authors.through
+                    Authors.objects.bulk_create( [ Authors(component_id=o.pk, user_id=job.user.id)
+                                                   for o in new ] )
+                for o in new:
+                    matcher.add( o )
+                    seen.add( o.pk )
+
+            attached += len(changed) - len(new)
+            created += len(new)
+            job.publish()
+    finally:
+        f.close()
+
+    if attached:
+        job.addMessage( messages.SUCCESS, u'Attached %i records to existing constructs.' % attached )
+    if created:
+        job.addMessage( messages.SUCCESS, u'Registered %i new constructs.' % created )
+    job.imported = attached + created
+
+
+@register('traces')
+def attachTraces(job):
+    """
+    Create new sequencing records from uploaded trace files and analyse
+    the traces (see analyseTraces).
+    Parameters: samples -- { sample id : [ index of trace in job.files ] }; 
+    matchPrimer;
+    orderedBy (user id); orderedAt (iso date); evaluation; comments
+    """
+    import rotmic.forms.uploadForms as F
+
+    samples = job.param('samples')
+    job.total = len(samples)
+
+    kwargs = { 'orderedBy' : User.objects.get(id=job.param('orderedBy')),
+               'orderedAt' : job.param('orderedAt'),
+               'evaluation' : job.param('evaluation'),
+               'comments' : job.param('comments') }
+
+    files = list( job.files.order_by('id') )
+
+    done, created = [], []
+    with transaction.atomic():
+        for pk, index in samples.items():
+            sample = M.DnaSample.objects.get(id=pk)
+            traces = [ File(files[i].f, name=files[i].name) for i in index ]
+
+            r = F.createSequencing( sample, traces, job.user,
+                                    matchPrimer=job.param('matchPrimer'), **kwargs )
+            created.append( r.id )
+
+            done += [ u'Attached new sequencing record with %i trace files to sample %s' \
+                      % (len(traces), unicode(sample)) ]
+            job.processed += 1
+            job.publish()
+
+    for msg in done:
+        job.addMessage( messages.SUCCESS, msg )
+    job.imported = len(done)
+
+    try:
+        reportAnalysis( job, M.Sequencing.objects.filter(id__in=created) )
+    except Exception as why:
+        job.addMessage( messages.WARNING,
+                        u'Trace files could not be analysed. Reason: ' + unicode(why) )
+
+
+def reportAnalysis(job, sequencings):
+    """
+    Analyse all trace files of several sequencing records in a pool of
+    settings.TRACE_PROCESSES worker processes (see utils.traces and poolSize)
+    and report the proposed evaluations.
+    """
+    import rotmic.utils.traces as T
+
+    runs = M.SequencingRun.objects.filter(parent__in=sequencings)
+    results = T.analyseRuns( runs, processes=poolSize('TRACE_PROCESSES') )
+
+    counts = collections.Counter( [ r.evaluation for r in results ] )
+    job.addMessage( messages.INFO, u'Analysed %i trace files: %s' % (len(results),
+                    u', '.join( [ u'%i %s' % (n, e) for e, n in sorted(counts.items()) ] )) )
+
+    for s in sequencings.select_related('sample__container'):
+        job.addMessage( messages.INFO, u'%s: %s' % (unicode(s), s.get_evaluation_display()) )
+
+
+@register('traceanalysis')
+def analyseTraces(job):
+    """
+    (Re-)analyse the trace files of existing sequencing records. The
+    evaluation of a sequencing is only set if it has not been evaluated yet.
+    Parameters: sequencings -- [ sequencing id ]
+    """
+    sequencings = M.Sequencing.objects.filter(id__in=job.param('sequencings'))
+    job.total = job.processed = len(sequencings)
+    job.publish()
+
+    reportAnalysis( job, sequencings )
+    job.imported = job.total
+
+
+@register('primersites')
+def findPrimerSites(job):
+    """
+    Find binding sites of oligos in all DNA constructs (see utils.primers).
+    Parameters: oligos -- [ oligo id ]; mismatches -- int; link -- bool, add
+    constructs with binding sites to the templates of each oligo.
+    The sequence scan uses settings.PRIMER_PROCESSES worker processes
+    (see poolSize).
+    """
+    import rotmic.utils.primers as P
+
+    oligos = M.OligoComponent.objects.filter(id__in=job.param('oligos'))
+    job.total = len(oligos)
+    job.publish()
+
+    sites = P.findBindingSites( oligos, mismatches=job.param('mismatches', 2),
+                                processes=poolSize('PRIMER_PROCESSES') )
+
+    dnas = M.DnaComponent.objects.in_bulk(
+        set( [ s.dna_id for r in sites.values() for s in r ] ) )
+    
+    with transaction.atomic():
+        for o in oligos:
+            found = sites.get(o.id)
+            if found is None:
+                job.addMessage( messages.WARNING, u'%s: no DNA sequence of at least %i nucleotides' 
+                                % (o.displayId, P.MIN_LENGTH) )
+                job.failed += 1
+                continue
+            
+            for s in found[:20]:
+                job.addMessage( messages.INFO, 
+                    u'%s anneals to %s at %i (%s strand, %i mismatches, Tm %s C)'
+                    % (o.displayId, dnas[s.dna_id].displayId, s.position, 
+                       s.strand, s.mismatches, s.tm) )
+            if len(found) > 20:
+                job.addMessage( messages.INFO, u'%s: %i more binding sites' 
+                                % (o.displayId, len(found) - 20) )
+            if not found:
+                job.addMessage( messages.INFO, u'%s: no binding sites found' % o.displayId )
+
+            if job.param('link') and found:
+                new = set( [ s.dna_id for s in found ] ) - \
+                      set( o.templates.values_list('id', flat=True) )
+                o.templates.add( *new )
+                job.addMessage( messages.SUCCESS, u'Linked %i new templates to oligo %s'
+                                % (len(new), o.displayId) )
+                job.imported += bool(new)
+
+            job.processed += 1
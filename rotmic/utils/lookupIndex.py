@@ -0,0 +1,180 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+In-memory index of component IDs and names for auto-completion fields.
+
+Each process loads ID, name and type of all records of a component model
+once and keeps them until the version stamp of the model changes (see
+rotmic.models.lookupVersion). IDs are kept sorted for prefix search;
+lower-case names are joined into a single string that is searched for
+the term as a whole. A keystroke then costs one look-up of the stamp
+rather than a scan of the component table::
+
+    entries = search( M.DnaComponent, 'gfp',
+                      {'componentType__subTypeOf': T.dcPlasmid} )
+"""
+import bisect, collections, threading
+
+import rotmic.models as M
+
+## characters after which a name match counts as start of a word
+WORD_START = u' -_/(.,:;+'
+
+## lookup filters supported by search() -> Entry attribute
+FILTERS = { 'componentType' : 'typeId',
+            'componentType__subTypeOf' : 'subTypeOf' }
+
+
+class Entry(collections.namedtuple('Entry', ['pk', 'displayId', 'name',
+                                             'typeId', 'subTypeOf'])):
+    """One indexed record, printed like Component.__unicode__"""
+    __slots__ = ()
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.displayId, self.name or '')
+
+
+class LookupIndex(object):
+    """
+    IDs and names of all records of one component model.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        ## read the stamp first -- later changes trigger another reload
+        self.version = M.LookupVersion.current( model )
+
+        fields = ['id', 'displayId', 'name', 'componentType']
+        typeClass = model._meta.get_field('componentType').rel.to
+        if 'subTypeOf' in typeClass._meta.get_all_field_names():
+            fields.append( 'componentType__subTypeOf' )
+
+        rows = model.objects.values_list( *fields )
+
+        self.entries = sorted( [ Entry(*(tuple(r) + (None,))[:5]) for r in rows ],
+                               key=lambda e: e.displayId.lower() )
+        self.keys = [ e.displayId.lower() for e in self.entries ]
+
+        names = [ (e.name or u'').lower().replace(u'\n', u' ')
+                  for e in self.entries ]
+        self.starts = []
+        pos = 0
+        for name in names:
+            self.starts.append( pos )
+            pos += len( name ) + 1
+        self.names = u'\n'.join( names )
+
+    def _end(self, k):
+        """@return int -- end of the k-th name in self.names"""
+        return self.starts[k+1] - 1 if k + 1 < len(self.starts) else len(self.names)
+
+    def _wordStart(self, t, pos, end):
+        """@return True if any match of t in names[pos:end] starts a word"""
+        while pos != -1:
+            if pos == 0 or self.names[pos-1] in WORD_START or \
+               self.names[pos-1] == u'\n':
+                return True
+            pos = self.names.find( t, pos + 1, end )
+        return False
+
+    def search(self, term, accept=None):
+        """
+        @param term: str, start of an ID or part of a name (case-insensitive)
+        @param accept: function( Entry ) -> bool, filter (default: all)
+        @return [ Entry ] -- matching records: exact ID match, ID prefix
+                matches, names with a word starting with term, other name
+                matches; each group sorted by ID. All records for empty term.
+        """
+        t = term.strip().lower()
+        if not t:
+            r = self.entries
+        else:
+            ## IDs starting with t are a continuous range of the sorted keys
+            i = bisect.bisect_left( self.keys, t )
+            j = bisect.bisect_left( self.keys, t + u'\uffff' )
+            exact = i < j and self.keys[i] == t
+
+            words, others = [], []
+            pos = self.names.find( t ) if u'\n' not in t else -1
+            while pos != -1:
+                k = bisect.bisect_right( self.starts, pos ) - 1
+                end = self._end( k )
+                if not i <= k < j:
+                    if self._wordStart( t, pos, end ):
+                        words.append( self.entries[k] )
+                    else:
+                        others.append( self.entries[k] )
+                pos = self.names.find( t, end + 1 )
+
+            r = self.entries[i:i+exact] + self.entries[i+exact:j] + words + others
+
+        if accept is None:
+            return list( r )
+        return [ e for e in r if accept(e) ]
+
+
+## model -> LookupIndex of this process
+_indices = {}
+_lock = threading.Lock()
+
+def index(model):
+    """@return LookupIndex -- up-to-date index of a component model"""
+    version = M.LookupVersion.current( model )
+
+    r = _indices.get( model )
+    if r is None or r.version != version:
+        with _lock:
+            r = _indices.get( model )
+            if r is None or r.version != version:
+                r = _indices[model] = LookupIndex( model )
+    return r
+
+
+def accepting(filters):
+    """
+    Translate lookup filters into a test of index entries.
+    @param filters: dict, e.g. { 'componentType__subTypeOf__in' : [..] }
+                    with keys from FILTERS (optionally ending in '__in') and
+                    model instances or pks as values
+    @return function( Entry ) -> bool, or None if there are no filters
+    @raise ValueError, for unsupported filters
+    """
+    if not filters:
+        return None
+
+    tests = []
+    for key, value in filters.items():
+        field, values = key, [value]
+        if key.endswith('__in'):
+            field, values = key[:-4], value
+
+        if field not in FILTERS:
+            raise ValueError('unsupported lookup filter %r' % key)
+
+        tests.append( (FILTERS[field], set( [ getattr(v, 'pk', v)
+                                              for v in values ] )) )
+
+    return lambda entry: all( [ getattr(entry, attr) in pks
+                                for attr, pks in tests ] )
+
+
+def search(model, term, filters={}):
+    """
+    Find records of a component model by start of ID or part of name.
+    @param filters: dict, see accepting()
+    @return [ Entry ] -- ranked matches (see LookupIndex.search)
+    """
+    return index( model ).search( term, accepting(filters) )
@@ -0,0 +1,216 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Primer binding sites -- find all DNA constructs where an oligo anneals.
+
+A primer anneals where its 3' end (the seed, at least MIN_LENGTH
+nucleotides) matches the template exactly, on either strand, and the
+remaining 5' part has at most a given number of mismatches. Candidate
+constructs of a whole batch of primers are looked up in the K-mer index
+(see rotmic.models.kmerIndex) with a handful of queries; the candidate
+sequences are then scanned, optionally in a pool of worker processes::
+
+    sites = findBindingSites( M.OligoComponent.objects.filter(...),
+                              mismatches=2, processes=4 )
+"""
+import collections, multiprocessing
+
+from django.db import connection
+
+import rotmic.models as M
+from rotmic.models.kmerIndex import K, MIN_LENGTH, findAll, isCircular
+import rotmic.utils.sequtils as sequtils
+
+## number of primers per sequence above which a table of all its K-mers is used
+TABLE_MIN = 30
+
+## one binding site of an oligo
+## position -- 1-based first template nucleotide covered by the primer
+##             (forward strand coordinates)
+## strand -- '+' if the primer sequence is found on the forward strand
+## annealed -- length of the perfectly matching 3' stretch of the primer
+## tm -- melting temperature of this stretch (see OligoComponent.tm_nn)
+Site = collections.namedtuple('Site', ['oligo_id', 'dna_id', 'position',
+                                       'strand', 'mismatches', 'annealed', 'tm'])
+
+
+def _cleaned( seq ):
+    return sequtils.cleanseq( seq or '' ).encode('ascii', 'replace')
+
+
+def _anneal( primer, site, strand='+' ):
+    """
+    Compare primer and template stretch (same length; template positions
+    outside a linear sequence are given as 'N').
+    @param strand: str, '+' -- primer and site 5' -> 3'; '-' -- primer 
+                   given as reverse complement (3' end first)
+    @return (int, int) -- number of mismatches, length of 3' perfect match
+    """
+    if primer == site:
+        return 0, len( primer )
+
+    mismatches = sum( [ a != b for a, b in zip(primer, site) ] )
+    pairs = zip( primer, site )
+    if strand == '+':
+        pairs.reverse()
+
+    annealed = 0
+    for a, b in pairs:
+        if a != b:
+            break
+        annealed += 1
+    return mismatches, annealed
+
+
+def _window( seq, start, length, circular ):
+    """@return str -- seq[start:start+length], wrapped or padded with 'N'"""
+    n = len( seq )
+    if 0 <= start and start + length <= n:
+        return seq[start:start+length]
+    if circular:
+        return ''.join( [ seq[i % n] for i in range(start, start + length) ] )
+    return ''.join( [ seq[i] if 0 <= i < n else 'N'
+                      for i in range(start, start + length) ] )
+
+
+def _positions( seq, circular ):
+    """@return { str : [int] } -- start positions of every K-mer in seq"""
+    if circular:
+        seq = seq + seq[:K-1]
+    r = collections.defaultdict(list)
+    for i in xrange( len(seq) - K + 1 ):
+        r[ seq[i:i+K] ].append( i )
+    return r
+
+
+def scan( task ):
+    """
+    Find binding sites of primers in DNA sequences (no database access,
+    runs in worker processes).
+    @param task: (dnas, primers, mismatches, seed, dnaconc, saltconc) with
+                 dnas -- [ (int, str, bool, [int]) ] pk, sequence, circular,
+                 pks of primers to test; primers -- { pk : str }
+    @return [ Site ]
+    """
+    dnas, primers, mismatches, seed, dnaconc, saltconc = task
+    r = []
+    tms = {}  ## (primer pk, annealed length) -> Tm
+
+    ## primer as found on the forward / reverse strand (5' -> 3' of the
+    ## forward strand) and offset of its seed (3' end of the primer)
+    probes = {}
+    for pk, primer in primers.items():
+        l = min( seed, len(primer) )
+        revcomp = sequtils.dna2revcomplement( primer )
+        probes[pk] = [ ('+', primer, len(primer) - l, l),
+                       ('-', revcomp, 0, l) ]
+
+    for dna, seq, circular, candidates in dnas:
+        ## K-mer table pays off if many primers are tested against seq
+        positions = None
+        if len( candidates ) > TABLE_MIN:
+            positions = _positions( seq, circular )
+
+        for pk in candidates:
+            for strand, probe, offset, l in probes[pk]:
+                probeSeed = probe[offset:offset+l]
+
+                if positions is None:
+                    hits = findAll( seq, probeSeed, circular )
+                else:
+                    hits = [ i for i in positions.get( probeSeed[:K], [] )
+                             if _window( seq, i, l, circular ) == probeSeed ]
+
+                for i in hits:
+                    start = i - offset
+                    site = _window( seq, start, len(probe), circular )
+                    mm, annealed = _anneal( probe, site, strand )
+                    if mm > mismatches:
+                        continue
+
+                    if (pk, annealed) not in tms:
+                        primer = primers[pk]
+                        tms[pk, annealed] = sequtils.tm_nn( primer[-annealed:],
+                                                            dnaconc=dnaconc, 
+                                                            saltconc=saltconc )
+
+                    start = start % len(seq) if circular else max( start, 0 )
+                    r.append( Site( pk, dna, start + 1, strand, mm, annealed,
+                                    tms[pk, annealed] ) )
+    return r
+
+
+def findBindingSites( oligos, mismatches=2, seed=MIN_LENGTH, dnas=None,
+                      processes=1, chunksize=200, dnaconc=500, saltconc=50 ):
+    """
+    Find all binding sites of one or more oligos in the DNA construct library.
+    @param oligos: OligoComponent QuerySet or list
+    @param mismatches: int, max. number of mismatches in the 5' part
+    @param seed: int, length of the 3' end that has to match exactly
+                 (at least MIN_LENGTH)
+    @param dnas: DnaComponent QuerySet, restrict search (default: all)
+    @param processes: int, number of worker processes for the sequence scan
+    @param dnaconc: float, [DNA] nM for Tm (see OligoComponent.tm_nn)
+    @param saltconc: float, [salt] mM for Tm
+    @return { int : [ Site ] } -- binding sites by oligo pk, sorted by
+            number of mismatches and construct
+    """
+    seed = max( seed, MIN_LENGTH )
+    primers = {}
+    for o in oligos:
+        s = _cleaned( o.sequence )
+        if len( s ) >= MIN_LENGTH and sequtils.isdna( s ):
+            primers[o.pk] = s
+
+    pks = primers.keys()
+    seeds = [ primers[pk][-seed:] for pk in pks ]
+
+    candidates = collections.defaultdict(list)  ## dna pk -> [ primer pk ]
+    for pk, found in zip( pks, M.KmerIndex.candidateSets(seeds) ):
+        for dna in found:
+            candidates[dna].append( pk )
+
+    if dnas is None:
+        dnas = M.DnaComponent.objects.all()
+    ids = sorted( candidates.keys() )
+
+    tasks = []
+    for i in range( 0, len(ids), chunksize ):
+        chunk = dnas.filter(pk__in=ids[i:i+chunksize])\
+                .select_related('componentType__subTypeOf')
+        entries = [ (d.pk, _cleaned(d.sequence), isCircular(d), candidates[d.pk])
+                    for d in chunk ]
+        tasks.append( (entries, primers, mismatches, seed, dnaconc, saltconc) )
+
+    if processes > 1 and len( tasks ) > 1:
+        connection.close()  ## don't share the database connection with workers
+        pool = multiprocessing.Pool( processes )
+        try:
+            results = pool.map( scan, tasks )
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map( scan, tasks )
+
+    r = dict( [ (pk, []) for pk in pks ] )
+    for sites in results:
+        for site in sites:
+            r[site.oligo_id].append( site )
+
+    for sites in r.values():
+        sites.sort( key=lambda s: (s.mismatches, s.dna_id, s.position) )
+    return r
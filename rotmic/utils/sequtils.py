@@ -17,8 +17,12 @@
 """
 General purpose sequence utility methods.
 """
-import re
+import re, hashlib
+import numpy as N
 from Bio.Seq import Seq, translate
+import Bio.SeqUtils.MeltingTemp as TM
+import Bio.SeqUtils.IsoelectricPoint as IP
+from Bio.Data import IUPACData
 import os.path as osp
 
 def isdna( seq ):
@@ -66,6 +70,17 @@ def dna2prot( seq ):
     """Translate DNA sequence to protein sequence"""
     return translate( Seq(seq) ).tostring()
 
+def tm_nn( seq, dnaconc=500, saltconc=50 ):
+    """
+    dnaconc - float, [DNA] nM
+    saltconc - float, [salt] mM
+    @return float, nearest neighbor DNA/DNA melting temperature of seq
+    """
+    if not seq:
+        return 0
+    r = TM.Tm_staluc(seq, dnac=dnaconc, saltc=saltconc)
+    return round(r,1)
+
 def dna2complement( seq ):
     """Convert DNA sequence to complement dna sequence"""
     return Seq.complement( Seq( str(seq) )).tostring()
@@ -80,6 +95,150 @@ def cleanseq( seq ):
     return re.sub('\s','', seq.upper())
 
 
+## byte value -> 1 for G, C or S (strong) in either case / for whitespace
+_GC = N.zeros( 256, N.uint8 )
+_GC[ [ ord(c) for c in 'GCSgcs' ] ] = 1
+_WS = N.zeros( 256, N.uint8 )
+_WS[ [ ord(c) for c in ' \t\n\r\f\v' ] ] = 1
+
+def seqstats( seqs ):
+    """
+    Length, GC content and hash of many sequences at once, counted over a
+    single byte array. Whitespace is ignored (see cleanseq).
+    @param seqs: [ str ], sequences (None counts as empty)
+    @return [ (int, float, str) ] -- length, GC content in % (1 decimal,
+            0 for empty sequences) and SHA1 hex digest of the cleaned-up
+            sequence ('' for empty sequences) for each sequence
+    """
+    seqs = [ (s or '').encode('ascii', 'replace') for s in seqs ]
+    if not seqs:
+        return []
+
+    sizes = N.array( [ len(s) for s in seqs ], N.int64 )
+    starts = N.cumsum( sizes ) - sizes
+    used = sizes > 0
+
+    gc = N.zeros( len(seqs), N.int64 )
+    ws = N.zeros( len(seqs), N.int64 )
+    if used.any():
+        data = N.frombuffer( ''.join(seqs), N.uint8 )
+        gc[used] = N.add.reduceat( _GC[data], starts[used], dtype=N.int64 )
+        ws[used] = N.add.reduceat( _WS[data], starts[used], dtype=N.int64 )
+
+    lengths = sizes - ws
+    percent = N.round( gc * 100.0 / N.maximum( lengths, 1 ), 1 )
+
+    r = []
+    for s, l, p, w in zip( seqs, lengths, percent, ws ):
+        s = cleanseq( s ) if w else s.upper()
+        r.append( (int(l), float(p), hashlib.sha1(s).hexdigest() if l else '') )
+    return r
+
+
+## average residue weights (as Bio.SeqUtils.molecular_weight) by byte value,
+## in units of 0.0001 Da so that sums are exact
+_WEIGHT = N.zeros( 256, N.int64 )
+_WEIGHT[ [ ord(aa) for aa in IUPACData.protein_weights ] ] = \
+    [ int( round( w * 10000 ) ) for w in IUPACData.protein_weights.values() ]
+_NOWEIGHT = _WEIGHT == 0
+_WATER = 180153
+
+def _terminalpKs( table, default, residues ):
+    """@return array -- pK of the N- or C-terminus for given residue bytes"""
+    pK = N.zeros( 256 ) + default
+    for aa, value in table.items():
+        pK[ ord(aa) ] = value
+    return pK[ residues ]
+
+def _charge( pH, counts, pKn, pKc ):
+    """
+    @return array -- net charge of proteins at pH (Bjellqvist pKs as
+            Bio.SeqUtils.IsoelectricPoint)
+    """
+    r = 1.0 / (1.0 + 10 ** (pH - pKn)) - 1.0 / (1.0 + 10 ** (pKc - pH))
+    for aa, pK in IP.positive_pKs.items():
+        if aa != 'Nterm':
+            r += counts[:, ord(aa)] / (1.0 + 10 ** (pH - pK))
+    for aa, pK in IP.negative_pKs.items():
+        if aa != 'Cterm':
+            r -= counts[:, ord(aa)] / (1.0 + 10 ** (pK - pH))
+    return r
+
+def _isoelectric( counts, pKn, pKc ):
+    """
+    Iso-electric points of many proteins at once. Same steps as 
+    Bio.SeqUtils.IsoelectricPoint: bracket the pI between integer pH values
+    (starting from 7) and bisect to a precision of 0.0001.
+    @return array
+    """
+    charge = lambda pH: _charge( pH, counts, pKn, pKc )
+
+    low = N.zeros( len(counts) ) + 7.0
+    up = charge( low ) > 0
+    low[~up] -= 1  ## bracket [6, 7] unless the charge at 6 is negative, too
+
+    active = N.ones( len(counts), bool )
+    while active.any():
+        c = charge( low + up )
+        step = active & N.where( up, c > 0, c < 0 )
+        low[step] += N.where( up, 1, -1 )[step]
+        active = step
+
+    high = low + 1
+    pH = low
+    while (high - low).max() > 0.0001:
+        pH = (low + high) / 2.0
+        positive = charge( pH ) > 0
+        low = N.where( positive, pH, low )
+        high = N.where( positive, high, pH )
+    return pH
+
+def protstats( seqs ):
+    """
+    Physico-chemical properties of many protein sequences at once,
+    calculated from a single composition matrix (same values as
+    Bio.SeqUtils.ProtParam). Whitespace is ignored (see cleanseq).
+    @param seqs: [ str ], amino acid sequences (None counts as empty)
+    @return [ (int, float, float, int, int, int) ] -- length, molecular
+            weight (0 if the sequence contains non-standard letters), 
+            iso-electric point, max. number of S-S bonds, extinction at
+            280 nm without and with all possible S-S bonds; all 0 for 
+            empty sequences
+    """
+    seqs = [ cleanseq( s or '' ).encode('ascii', 'replace') for s in seqs ]
+    if not seqs:
+        return []
+
+    lengths = N.array( [ len(s) for s in seqs ], N.int64 )
+    data = N.frombuffer( ''.join(seqs), N.uint8 ).astype( N.int64 )
+    protein = N.repeat( N.arange( len(seqs) ), lengths )
+
+    counts = N.bincount( protein * 256 + data, minlength=256 * len(seqs) )
+    counts = counts.reshape( len(seqs), 256 ).astype( float )
+
+    used = lengths > 0
+    ends = N.cumsum( lengths )
+    first = data[ (ends - lengths)[used] ]
+    last = data[ (ends - 1)[used] ]
+
+    mass = N.dot( counts.astype( N.int64 ), _WEIGHT ) - (lengths - 1) * _WATER
+    mass = (mass + 50) // 100 / 100.0  ## round to 2 decimals
+    mass[ counts[:, _NOWEIGHT].sum(1) > 0 ] = 0.0
+
+    pI = N.zeros( len(seqs) )
+    if used.any():
+        pI[used] = _isoelectric( counts[used],
+            _terminalpKs( IP.pKnterminal, IP.positive_pKs['Nterm'], first ),
+            _terminalpKs( IP.pKcterminal, IP.negative_pKs['Cterm'], last ) )
+
+    maxSS = counts[:, ord('C')].astype( N.int64 ) // 2
+    reduced = (1490 * counts[:, ord('Y')] + 5500 * counts[:, ord('W')]).astype( N.int64 )
+
+    return [ (int(l), float(m) if l else 0.0, round(p, 2), int(ss),
+              int(e), int(e + 125 * ss))
+             for l, m, p, ss, e in zip( lengths, mass, pI, maxSS, reduced ) ]
+
+
 def recenter_sequence( seq, recenter=0, start=0, stop=None ):
     """
     Move starting point of a (assumed) circular sequence by |recenter| to the 
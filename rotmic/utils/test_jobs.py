@@ -0,0 +1,62 @@
+import os.path, multiprocessing
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+import rotmic.models as M
+import rotmic.utils.jobs as J
+import rotmic.utils.genbank as G
+
+F = os.path.join( os.path.dirname(__file__), '..', 'fixtures', 'testdata',
+                  'dna', 'pJ603c.gbk' )
+
+
+def parse( records, queue ):
+    """worker task parsing genbank records in a process pool of its own"""
+    try:
+        r = [ error for parsed, error in
+              G.parseRecords( records, processes=J.poolSize('GENBANK_PROCESSES') ) ]
+    except Exception as e:
+        r = repr( e )
+    queue.put( r )
+
+
+class WorkersTest(SimpleTestCase):
+    """Job worker processes (./manage.py runjobs --processes=2)"""
+
+    def test_pool(self):
+        """jobs of several workers can start process pools"""
+        records = [ open( F ).read() ] * 12  ## more than one chunk of the pool
+        queue = multiprocessing.Queue()
+
+        J.IN_WORKER = True
+        try:
+            with self.settings( GENBANK_PROCESSES=2 ):
+                workers = J.startWorkers( 2, target=parse, records=records,
+                                          queue=queue )
+                results = [ queue.get( timeout=60 ) for p in workers ]
+                for p in workers:
+                    p.join()
+        finally:
+            J.IN_WORKER = False
+
+        self.assertEqual( results, [ [None] * len(records) ] * 2 )
+
+
+class StartTest(TestCase):
+    """Jobs started by uploads (without separate workers)"""
+
+    def test_start(self):
+        """a started job has run to completion under ./manage.py test"""
+        user = User.objects.create( username='tester', is_superuser=True )
+        t = M.DnaComponentType.objects.create( name='plasmid' )
+        dna = M.DnaComponent.objects.create( displayId='rg0001', componentType=t,
+                                             registeredBy=user, modifiedBy=user )
+
+        job = J.enqueue( 'genbank', user, model='DnaComponent',
+                         records=[ (dna.id, open( F ).read()) ] )
+        J.start( job )
+
+        job = M.Job.objects.get( id=job.id )
+        self.assertEqual( (job.status, job.imported, job.failed), ('done', 1, 0) )
+        self.assertEqual( len( M.DnaComponent.objects.get( id=dna.id ).sequence ), 4968 )
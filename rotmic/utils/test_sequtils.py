@@ -0,0 +1,43 @@
+from django.test import SimpleTestCase
+from Bio.SeqUtils.ProtParam import ProteinAnalysis
+
+import rotmic.utils.sequtils as sequtils
+
+GFP = 'MSKGEELFTGVVPILVELDGDVNGHKFSVSGEGEGDATYGKLTLKFICTTGKLPVPWPTLVTTFSYGVQCFSRY'\
+      'PDHMKQHDFFKSAMPEGYVQERTIFFKDDGNYKTRAEVKFEGDTLVNRIELKGIDFKEDGNILGHKLEYNYNSH'\
+      'NVYIMADKQKNGIKVNFKIRHNIEDGSVQLADHYQQNTPIGDGPVLLPDNHYLSTQSALSKDPNEKRDHMVLLE'\
+      'FVTAAGITHGMDELYK'
+
+## human preproinsulin
+INSULIN = 'MALWMRLLPLLALLALWGPDPAAAFVNQHLCGSHLVEALYLVCGERGFFYTPKTRREAEDLQVGQVELGGGPG'\
+          'AGSLQPLALEGSLQKRGIVEQCCTSICSLYQLENYCN'
+
+
+class ProtstatsTest(SimpleTestCase):
+    """Protein length, MW, pI, S-S bonds and extinction coefficients"""
+
+    def test_values(self):
+        """known proteins and corner cases"""
+        r = sequtils.protstats( [GFP, INSULIN, 'ACDEFGHIKLMNPQRSTVWY', 'K',
+                                 'DDDD', 'CC\nCW Y'] )
+        self.assertEqual( r, [ (238, 26885.99, 5.67, 1, 21890, 22015),
+                               (110, 11980.79, 5.22, 3, 16960, 17335),
+                               (20, 2395.71, 6.78, 0, 6990, 6990),
+                               (1, 146.19, 8.75, 0, 0, 0),
+                               (4, 478.36, 3.52, 0, 0, 0),
+                               (5, 676.83, 5.5, 1, 6990, 7115) ] )
+
+    def test_protparam(self):
+        """same MW and pI as Bio.SeqUtils.ProtParam"""
+        seqs = [GFP, INSULIN, GFP[100:], INSULIN[:30], 'MKW']
+        for s, r in zip( seqs, sequtils.protstats( seqs ) ):
+            p = ProteinAnalysis( s )
+            self.assertAlmostEqual( r[1], p.molecular_weight(), places=2 )
+            self.assertAlmostEqual( r[2], p.isoelectric_point(), places=2 )
+
+    def test_empty(self):
+        """empty, missing and non-standard sequences"""
+        self.assertEqual( sequtils.protstats( [] ), [] )
+        r = sequtils.protstats( ['', None, 'MAXB'] )
+        self.assertEqual( r[:2], [(0, 0.0, 0.0, 0, 0, 0)] * 2 )
+        self.assertEqual( r[2][:2], (4, 0.0) )
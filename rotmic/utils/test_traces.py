@@ -0,0 +1,151 @@
+import os.path, random, struct
+
+from django.test import SimpleTestCase
+
+import rotmic.utils.traces as T
+import rotmic.utils.sequtils as sequtils
+
+D = os.path.join( os.path.dirname(__file__), '..', 'fixtures', 'testdata',
+                  'seq', 'rg2132-rg2133_pJ411' )
+
+
+def scf( bases, quals, version ):
+    """@return str -- minimal SCF file with base calls and their quality"""
+    n, offset = len( bases ), 128
+    probs = [ ''.join( [ chr(q if b == x else 0) for b, q in zip(bases, quals) ] )
+              for x in 'ACGT' ]
+    if version >= '3.00':
+        body = '\0' * 4 * n + ''.join( probs ) + bases + '\0' * 3 * n
+    else:
+        body = ''.join( [ '\0' * 4 + ''.join( [ p[i] for p in probs ] ) + b + '\0' * 3
+                          for i, b in enumerate( bases ) ] )
+    header = T._SCF_HEADER.pack( '.scf', 0, offset, n, 0, 0, offset, 0, offset,
+                                 version )
+    return header.ljust( offset, '\0' ) + body
+
+
+class ReadTraceTest(SimpleTestCase):
+    """Reading of SCF and ABI trace files"""
+
+    def test_scf(self):
+        """SCF version 2 and 3 base calls and qualities"""
+        for version in ('2.00', '3.00', '3.10'):
+            r = T.readScf( scf( 'ACGTNGA', [10, 20, 30, 40, 5, 50, 60], version ) )
+            self.assertEqual( r, ('ACGTNGA', [10, 20, 30, 40, 0, 50, 60]) )
+
+    def test_scf_invalid(self):
+        """not an SCF file"""
+        self.assertRaises( ValueError, T.readScf, 'x' * 128 )
+
+    def test_abi(self):
+        """ABI file base calls, qualities and quality trimming"""
+        seq, quals = T.readTrace( open(os.path.join(D, '01_rg2132_pJ411-T7.ab1'),
+                                       'rb').read(), '01_rg2132_pJ411-T7.ab1' )
+        self.assertEqual( len(seq), 1132 )
+        self.assertEqual( len(quals), 1132 )
+        self.assertEqual( T.trim( quals ), (32, 1020) )
+
+
+class CompareTest(SimpleTestCase):
+    """Location and alignment of reads with known differences"""
+
+    def setUp(self):
+        random.seed( 1 )
+        self.ref = ''.join( [ random.choice('ACGT') for i in range(2000) ] )
+
+        f = self.ref[500:900]
+        self.sub = f[:100] + 'A' + f[101:]  ## G -> A at 601
+        self.deletion = f[:150] + f[151:]   ## A deleted at 651
+        self.insertion = f[:200] + 'G' + f[200:]  ## G inserted after 700
+        self.all = self.sub[:150] + self.sub[151:200] + 'G' + self.sub[200:]
+
+    def compare(self, frag, strand='+', circular=False):
+        read = frag if strand == '+' else sequtils.dna2revcomplement( frag )
+        quals = [40] * len( read )
+
+        found = T.locate( read, self.ref, circular )
+        self.assertEqual( found[0], strand )
+        return T.compare( read, quals, self.ref, found[0], found[1], circular )
+
+    def test_exact(self):
+        """identical read"""
+        self.assertEqual( self.compare( self.ref[500:900] ),
+                          (501, 900, 400, 100.0, []) )
+
+    def test_substitution(self):
+        """single substitution"""
+        start, end, coverage, identity, diff = self.compare( self.sub )
+        self.assertEqual( (start, end, coverage), (501, 900, 400) )
+        self.assertAlmostEqual( identity, 99.75 )
+        self.assertEqual( diff, [(601, 'G', 'A', 40)] )
+
+    def test_deletion(self):
+        """single deletion"""
+        r = self.compare( self.deletion )
+        self.assertEqual( r[:3], (501, 900, 400) )
+        self.assertEqual( r[4], [(651, 'A', '-', 40)] )
+
+    def test_insertion(self):
+        """single insertion"""
+        r = self.compare( self.insertion )
+        self.assertEqual( r[:3], (501, 900, 400) )
+        self.assertEqual( r[4], [(700, '-', 'G', 40)] )
+
+    def test_strands(self):
+        """all three differences, read from either strand"""
+        for strand in '+-':
+            start, end, coverage, identity, diff = self.compare( self.all, strand )
+            self.assertEqual( (start, end, coverage), (501, 900, 400) )
+            self.assertAlmostEqual( identity, 100. * 398 / 401 )
+            self.assertEqual( diff, [(601, 'G', 'A', 40), (651, 'A', '-', 40),
+                                     (700, '-', 'G', 40)] )
+
+    def test_origin(self):
+        """read across the origin of a circular reference"""
+        f = self.ref[-150:] + self.ref[:150]
+        f = f[:100] + 'C' + f[101:]  ## A -> C at 1951
+        for strand in '+-':
+            r = self.compare( f, strand, circular=True )
+            self.assertEqual( r[:3], (1851, 150, 300) )
+            self.assertEqual( r[4], [(1951, 'A', 'C', 40)] )
+
+    def test_evaluate(self):
+        """verdict depends on the quality at differences"""
+        self.assertEqual( T.evaluate( [] ), 'confirmed' )
+        self.assertEqual( T.evaluate( [(601, 'G', 'A', 10)] ), 'ambiguous' )
+        self.assertEqual( T.evaluate( [(601, 'G', 'A', 10), (651, 'A', '-', 30)] ),
+                          'inconsistent' )
+
+
+class AnalyseTest(SimpleTestCase):
+    """Analysis of a real trace file"""
+
+    def setUp(self):
+        self.data = open(os.path.join(D, '01_rg2132_pJ411-T7.ab1'), 'rb').read()
+        seq, quals = T.readTrace( self.data, 'x.ab1' )
+        start, end = T.trim( quals )
+
+        random.seed( 1 )
+        rnd = lambda n: ''.join( [ random.choice('ACGT') for i in range(n) ] )
+        self.ref = rnd(500) + seq[start:end] + rnd(500)
+        self.other = rnd(3000)
+
+    def test_confirmed(self):
+        """read matching either strand of the reference"""
+        for ref, strand in ((self.ref, '+'),
+                            (sequtils.dna2revcomplement(self.ref), '-')):
+            r = T.analyse( (1, 'x.ab1', self.data, ref, False) )
+            self.assertEqual( r[1:8], (988, 50.8, strand, 501, 1488, 988, 100.0) )
+            self.assertEqual( r.evaluation, 'confirmed' )
+
+    def test_unrelated(self):
+        """read not found in the reference"""
+        r = T.analyse( (1, 'x.ab1', self.data, self.other, False) )
+        self.assertEqual( r.evaluation, 'inconsistent' )
+
+    def test_problems(self):
+        """unreadable file, no reference"""
+        self.assertEqual( T.analyse( (1, 'x.ab1', 'x', self.ref, False) ).evaluation,
+                          'problems' )
+        self.assertEqual( T.analyse( (1, 'x.ab1', self.data, '', False) ).evaluation,
+                          'none' )
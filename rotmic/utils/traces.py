@@ -0,0 +1,392 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Sequencing trace analysis -- compare trace files with the expected sequence.
+
+The base calls of each trace (ABI, SCF or PHD file) are quality-trimmed
+(Mott's algorithm), located in the sequence of the sample's DNA construct
+by K-mer seeds (either strand, across the origin of circular sequences) and
+aligned to this stretch. Differences at well-resolved bases make a run
+'inconsistent', differences at low-quality bases only 'ambiguous'. Traces
+are analysed in a pool of worker processes::
+
+    analyseRuns( M.SequencingRun.objects.filter(parent=sequencing),
+                 processes=4 )
+"""
+import collections, json, multiprocessing, os.path, struct, StringIO
+
+import numpy as N
+from Bio import SeqIO
+
+from django.db import connection
+from django.utils import timezone
+
+import rotmic.models as M
+from rotmic.models.kmerIndex import isCircular
+import rotmic.utils.sequtils as sequtils
+
+## accepted base calling error probability of the trimmed read
+TRIM_CUTOFF = 0.05
+
+## shortest trimmed read that is analysed
+MIN_READ = 50
+
+## differences at bases of at least this phred quality count as real
+MIN_QUALITY = 20
+
+## seed length and minimal number of seeds locating a read in the reference
+SEED = 12
+MIN_SEEDS = 3
+
+## reference nucleotides added on either side of the located read -- the
+## alignment allows for up to BAND net insertions or deletions
+BAND = 30
+
+## alignment scores
+MATCH, MISMATCH, GAP_OPEN, GAP_EXTEND = 2, -3, -5, -2
+
+## file extension -> Bio.SeqIO format
+FORMATS = { 'abi' : 'abi', 'ab' : 'abi', 'ab1' : 'abi', 'phd' : 'phd' }
+
+## result of one trace analysis
+## readLength -- number of quality-trimmed base calls
+## quality -- mean phred quality of the trimmed read
+## strand -- '+' if the read matches the forward strand of the reference
+## start, end -- 1-based first and last aligned reference position
+## coverage -- number of aligned reference nucleotides
+## identity -- % identical alignment columns
+## differences -- [ (int, str, str, int) ] reference position, reference
+##                base, read base ('-' for gaps) and phred quality
+Analysis = collections.namedtuple('Analysis', ['run_id', 'readLength',
+                                   'quality', 'strand', 'start', 'end', 'coverage',
+                                   'identity', 'differences', 'evaluation'])
+
+_SCF_HEADER = struct.Struct('>4sIIIIIIII4s')
+
+
+def readScf( data ):
+    """
+    Base calls of an SCF trace file (version 2 and 3).
+    @param data: str, file content
+    @return (str, [int]) -- base calls, phred quality of each call
+    """
+    magic, samples, sOffset, n, lclip, rclip, offset, cSize, cOffset, \
+           version = _SCF_HEADER.unpack_from( data )
+    if magic != '.scf':
+        raise ValueError('not an SCF trace file')
+
+    if version >= '3.00':
+        probs = [ data[offset + (4+i)*n : offset + (5+i)*n] for i in range(4) ]
+        bases = data[offset + 8*n : offset + 9*n]
+    else:
+        records = [ data[offset + 12*i + 4 : offset + 12*i + 9] for i in range(n) ]
+        probs = [ ''.join( [ r[i] for r in records ] ) for i in range(4) ]
+        bases = ''.join( [ r[4] for r in records ] )
+
+    bases = bases.upper()
+    quals = [ ord( probs['ACGT'.index(b)][i] ) if b in 'ACGT' else 0
+              for i, b in enumerate( bases ) ]
+    return bases, quals
+
+
+def readTrace( data, name ):
+    """
+    @param data: str, content of a trace file
+    @param name: str, file name (the extension determines the format)
+    @return (str, [int]) -- upper-case base calls, phred quality of each call
+    """
+    ext = os.path.splitext( name )[1][1:].lower()
+    if ext == 'scf':
+        return readScf( data )
+
+    if ext not in FORMATS:
+        raise ValueError('unknown trace file format: %s' % name)
+
+    r = SeqIO.read( StringIO.StringIO(data), FORMATS[ext] )
+    return str( r.seq ).upper(), list( r.letter_annotations['phred_quality'] )
+
+
+def trim( quals, cutoff=TRIM_CUTOFF ):
+    """
+    Mott's trimming algorithm -- the stretch with maximal sum of
+    (cutoff - error probability).
+    @param quals: [int], phred qualities
+    @return (int, int) -- start and end (exclusive) of the trimmed read
+    """
+    if not len( quals ):
+        return 0, 0
+    scores = cutoff - 10 ** (N.array( quals, float ) / -10.)
+    s = N.concatenate( ([0.], N.cumsum( scores )) )
+    lowest = N.minimum.accumulate( s )
+    end = int( N.argmax( s - lowest ) )
+    start = int( N.argmin( s[:end+1] ) )
+    return start, end
+
+
+def locate( read, ref, circular=False ):
+    """
+    Find the most likely position of a read by counting shared K-mers.
+    @param read: str, base calls (forward orientation of the read)
+    @param ref: str, reference sequence (upper case)
+    @return (str, int) -- strand and start of the read in the reference
+            (forward strand coordinates, the read is reverse-complemented
+            for strand '-'); None if fewer than MIN_SEEDS K-mers are shared
+    """
+    n = len( ref )
+    if circular:
+        ref = ref + ref[:SEED-1]
+
+    seeds = {}
+    for strand, s in (('+', read), ('-', sequtils.dna2revcomplement( read ))):
+        for i in xrange( len(s) - SEED + 1 ):
+            seeds.setdefault( s[i:i+SEED], [] ).append( (strand, i) )
+
+    votes = collections.Counter()
+    for j in xrange( len(ref) - SEED + 1 ):
+        for strand, i in seeds.get( ref[j:j+SEED], () ):
+            votes[ strand, (j - i) % n if circular else j - i ] += 1
+
+    if not votes:
+        return None
+    (strand, start), count = votes.most_common( 1 )[0]
+    if count < MIN_SEEDS:
+        return None
+    return strand, start
+
+
+def _window( ref, start, length, circular ):
+    """
+    @return str -- ref[start:start+length], wrapped around the origin of a
+            circular sequence or padded with '\\0' beyond the ends of a
+            linear one
+    """
+    n = len( ref )
+    if circular:
+        return ''.join( [ ref[i % n] for i in xrange( start, start + length ) ] )
+    return ''.join( [ ref[i] if 0 <= i < n else '\0'
+                      for i in xrange( start, start + length ) ] )
+
+
+_NEG = -10**6
+
+def align( read, window ):
+    """
+    Banded global alignment (affine gaps) of a read to a reference window
+    of len(read) + 2 * BAND nucleotides; leading and trailing window
+    nucleotides are free. The read is expected to start at window[BAND].
+    @param read: str
+    @param window: str, reference stretch ('\\0' for positions outside
+                   a linear reference)
+    @return (int, str, str) -- number of window nucleotides before the
+            alignment, aligned read, aligned window ('-' for gaps)
+    """
+    m, W = len( read ), 2 * BAND + 1
+    r = N.frombuffer( read, N.uint8 )
+    w = N.frombuffer( window, N.uint8 )
+    outside = w == 0
+    steps = N.arange( W )
+
+    src = N.zeros( (m+1, W), N.int8 )      ## 0 -- match, 1 -- read gap, 2 -- window gap
+    fext = N.zeros( (m+1, W), bool )       ## read gap extended
+    eext = N.zeros( (m+1, W), bool )       ## window gap extended
+
+    ## diagonal d of row i = alignment of read[:i] to window[:i+d]
+    H = N.zeros( W, N.int64 )
+    F = N.zeros( W, N.int64 ) + _NEG
+    E = N.zeros( W, N.int64 ) + _NEG
+    for i in xrange( 1, m + 1 ):
+        score = N.where( w[i-1 : i-1+W] == r[i-1], MATCH, MISMATCH )
+        score[ outside[i-1 : i-1+W] ] = _NEG
+        Mrow = H + score
+
+        Fopen = N.concatenate( (H[1:] + GAP_OPEN, [_NEG]) )
+        Fext = N.concatenate( (F[1:] + GAP_EXTEND, [_NEG]) )
+        F = N.maximum( Fopen, Fext )
+        fext[i] = Fext > Fopen
+
+        best = N.maximum( Mrow, F )
+        src[i] = F > Mrow
+
+        ## window gaps run along the row; as opening costs more than
+        ## extending, the best gap into diagonal d opens after the best
+        ## max(M, F) cell to its left (penalized by the distance)
+        E[1:] = N.maximum.accumulate( best - GAP_EXTEND * steps )[:-1] \
+                + GAP_OPEN + GAP_EXTEND * (steps[1:] - 1)
+        H = N.maximum( best, E )
+        src[i][ E > best ] = 2
+        eext[i][1:] = E[:-1] + GAP_EXTEND > H[:-1] + GAP_OPEN
+
+    i, d = m, int( N.argmax( H ) )
+    a, b = [], []
+    state = None
+    while i > 0:
+        if state is None:
+            state = src[i, d]
+        if state == 0:
+            a.append( read[i-1] ); b.append( window[i-1+d] )
+            i -= 1
+            state = None
+        elif state == 1:
+            a.append( read[i-1] ); b.append( '-' )
+            state = 1 if fext[i, d] else None
+            i -= 1; d += 1
+        else:
+            a.append( '-' ); b.append( window[i-1+d] )
+            state = 2 if eext[i, d] else None
+            d -= 1
+
+    return d, ''.join( reversed(a) ), ''.join( reversed(b) )
+
+
+def compare( read, quals, ref, strand, start, circular=False ):
+    """
+    Align a located read to its stretch of the reference.
+    @param read: str, base calls; quals: [int], phred quality of each call
+    @param strand: str, '+' or '-' (see locate())
+    @param start: int, 0-based start of the read in the reference
+    @return (start, end, coverage, identity, differences) -- see Analysis
+    """
+    n = len( ref )
+    if strand == '-':
+        read = sequtils.dna2revcomplement( read )
+        quals = quals[::-1]
+
+    first = start - BAND
+    offset, a, b = align( read, _window( ref, first, len(read) + 2 * BAND, circular ) )
+
+    pos = first + offset  ## reference position
+    q = 0  ## read position
+    matches, differences = 0, []
+    for x, y in zip( a, b ):
+        if x == y:
+            matches += 1
+        else:
+            ## quality of a deletion -- the weaker of the flanking base calls
+            quality = quals[q] if x != '-' else min( quals[max(q-1, 0):q+1] )
+            p = (pos - (y == '-')) % n + 1
+            differences.append( (p, y, x, quality) )
+
+        pos += y != '-'
+        q += x != '-'
+
+    begin = first + offset
+    coverage = len( b ) - b.count( '-' )
+    return (begin % n + 1, (begin + coverage - 1) % n + 1, coverage,
+            100. * matches / len( a ), differences)
+
+
+def evaluate( differences ):
+    """@return str -- proposed evaluation of an aligned read"""
+    if [ d for d in differences if d[3] >= MIN_QUALITY ]:
+        return 'inconsistent'
+    return 'ambiguous' if differences else 'confirmed'
+
+
+def analyse( task ):
+    """
+    Analyse one trace file (no database access, runs in worker processes).
+    @param task: (int, str, str, str, bool) -- pk of SequencingRun, file name,
+                 file content, reference sequence, True if circular
+    @return Analysis
+    """
+    pk, name, data, ref, circular = task
+    none = Analysis( pk, None, None, '', None, None, None, None, [], 'none' )
+
+    try:
+        seq, quals = readTrace( data, name )
+    except Exception:
+        return none._replace( evaluation='problems' )
+
+    start, end = trim( quals )
+    seq, quals = seq[start:end], quals[start:end]
+    none = none._replace( readLength=len(seq),
+                          quality=round( float(N.mean(quals)), 1 ) if quals else None )
+
+    if len( seq ) < MIN_READ:
+        return none._replace( evaluation='problems' )
+    if not ref:
+        return none
+
+    found = locate( seq, ref, circular )
+    if found is None:
+        return none._replace( evaluation='inconsistent' )
+
+    strand = found[0]
+    start, end, coverage, identity, differences = compare( seq, quals, ref,
+                                                          strand, found[1], circular )
+    return none._replace( strand=strand, start=start, end=end, coverage=coverage,
+                          identity=round( identity, 2 ), differences=differences,
+                          evaluation=evaluate( differences ) )
+
+
+def combine( evaluations ):
+    """
+    @param evaluations: [ str ], proposed evaluations of the runs of one sequencing
+    @return str -- proposed evaluation of the whole sequencing
+    """
+    for verdict in ('inconsistent', 'ambiguous', 'confirmed', 'problems'):
+        if verdict in evaluations:
+            return verdict
+    return 'none'
+
+
+def analyseRuns( runs, processes=1 ):
+    """
+    Analyse trace files and store the results with each SequencingRun. The
+    evaluation of a Sequencing is set to the combined proposal of its runs
+    unless it has been evaluated already.
+    @param runs: SequencingRun QuerySet
+    @param processes: int, number of worker processes
+    @return [ Analysis ]
+    """
+    runs = runs.select_related('parent__sample__dna__componentType__subTypeOf')
+
+    tasks = []
+    for run in runs:
+        dna = run.parent.sample.dna
+        ref = sequtils.cleanseq( dna.sequence or '' ).encode('ascii', 'replace')
+        run.f.open('rb')
+        try:
+            data = run.f.read()
+        finally:
+            run.f.close()
+        tasks.append( (run.pk, run.f.name, data, ref, isCircular(dna)) )
+
+    if processes > 1 and len( tasks ) > 1:
+        connection.close()  ## don't share the database connection with workers
+        pool = multiprocessing.Pool( processes )
+        try:
+            results = pool.map( analyse, tasks )
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map( analyse, tasks )
+
+    now = timezone.now()
+    bySequencing = collections.defaultdict(list)
+    for run, r in zip( runs, results ):
+        M.SequencingRun.objects.filter(pk=r.run_id).update(
+            analysedAt=now, readLength=r.readLength, quality=r.quality,
+            strand=r.strand, alignStart=r.start, alignEnd=r.end,
+            coverage=r.coverage, identity=r.identity,
+            differences=json.dumps( r.differences ), evaluation=r.evaluation )
+        bySequencing[ run.parent_id ].append( r.evaluation )
+
+    for pk, evaluations in bySequencing.items():
+        M.Sequencing.objects.filter(pk=pk, evaluation='none')\
+                            .update(evaluation=combine( evaluations ))
+    return results
@@ -0,0 +1,234 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+"""
+Streaming export of querysets into Excel (.xlsx) workbooks.
+
+Rows are produced by csvexport.iterValues (chunk-wise, with the related
+data of each chunk loaded in bulk) and written one at a time into a single
+work sheet. Text is written as inline strings so that no shared string
+table has to be kept in memory. The zip container is compressed on the fly
+and handed out block by block (sizes and checksums follow each file in a
+data descriptor), so that memory use does not grow with the number of rows.
+"""
+import datetime, decimal, re, struct, time, zlib
+from xml.sax.saxutils import escape
+
+from rotmic.utils.csvexport import iterValues
+
+CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>'''
+
+_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+
+_WORKBOOK = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="%s" sheetId="1" r:id="rId1"/></sheets>
+</workbook>'''
+
+_WORKBOOK_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>'''
+
+## style 0 -- default; style 1 -- bold (table header)
+_STYLES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>
+</styleSheet>'''
+
+_SHEET_START = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<sheetData>
+'''
+
+_SHEET_END = '''</sheetData>
+</worksheet>'''
+
+## characters not allowed in XML 1.0
+ex_control = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+## characters not allowed in sheet names
+ex_sheetname = re.compile(r'[\[\]\*\?/\\:]')
+
+
+def columnName( i ):
+    """@return str -- Excel column name of 0-based column index i (A..Z, AA..)"""
+    r = ''
+    i += 1
+    while i:
+        i, rest = divmod( i - 1, 26 )
+        r = chr( ord('A') + rest ) + r
+    return r
+
+
+def _cell( ref, value, style=0 ):
+    """@return unicode -- XML of a single cell ('' for empty values)"""
+    s = ' s="%i"' % style if style else ''
+
+    if value is None or value == '':
+        return u''
+
+    if isinstance( value, float ):
+        if value != value or value in (float('inf'), float('-inf')):
+            return u''
+        return u'<c r="%s"%s><v>%r</v></c>' % (ref, s, value)
+
+    if isinstance( value, (int, long, decimal.Decimal) ) and \
+       not isinstance( value, bool ):
+        return u'<c r="%s"%s><v>%s</v></c>' % (ref, s, value)
+
+    if isinstance( value, (datetime.date, datetime.datetime) ):
+        value = value.isoformat()
+
+    value = ex_control.sub( u'', unicode(value) )
+    return u'<c r="%s" t="inlineStr"%s><is><t xml:space="preserve">%s</t></is></c>'\
+           % (ref, s, escape(value))
+
+
+def _row( i, values, style=0 ):
+    """@return str -- utf-8 encoded XML of table row i (0-based)"""
+    cells = [ _cell( columnName(j) + str(i+1), v, style )
+              for j, v in enumerate(values) ]
+    r = u'<row r="%i">%s</row>\n' % (i+1, u''.join(cells))
+    return r.encode('utf-8')
+
+
+class ZipStream( object ):
+    """
+    Minimal zip archive writer for streaming. Compressed data are handed
+    out as soon as they are produced; checksum and sizes of each member
+    follow its data in a data descriptor (rather than preceding it in the
+    local header), so the output never needs to be rewound.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.members = []  ## [ (name, crc, compressed size, size, offset) ]
+
+        t = time.localtime()
+        self.dostime = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+        self.dosdate = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+
+    def __out(self, data):
+        self.offset += len(data)
+        return data
+
+    def member(self, name, chunks):
+        """
+        Compress one archive member.
+        @param name: str, path of the file within the archive
+        @param chunks: iterable of str, file content
+        @return generator of str -- archive blocks
+        """
+        offset = self.offset
+        yield self.__out( struct.pack('<4s2B4HL2L2H', 'PK\003\004', 20, 0,
+                                      0x08, 8, self.dostime, self.dosdate,
+                                      0, 0, 0, len(name), 0) + name )
+
+        z = zlib.compressobj( zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15 )
+        crc, size, csize = 0, 0, 0
+
+        for data in chunks:
+            crc = zlib.crc32( data, crc )
+            size += len( data )
+            data = z.compress( data )
+            if data:
+                csize += len( data )
+                yield self.__out( data )
+
+        data = z.flush()
+        csize += len( data )
+        crc &= 0xffffffff
+        yield self.__out( data + struct.pack('<4s3L', 'PK\007\010',
+                                             crc, csize, size) )
+
+        self.members.append( (name, crc, csize, size, offset) )
+
+    def close(self):
+        """@return str -- central directory (end of archive)"""
+        start = self.offset
+        r = ''
+        for name, crc, csize, size, offset in self.members:
+            r += struct.pack('<4s4B4HL2L5H2L', 'PK\001\002', 20, 0, 20, 0,
+                             0x08, 8, self.dostime, self.dosdate,
+                             crc, csize, size, len(name), 0, 0, 0, 0, 0,
+                             offset) + name
+
+        n = len( self.members )
+        r += struct.pack('<4s4H2LH', 'PK\005\006', 0, 0, n, n,
+                         len(r), start, 0)
+        return self.__out( r )
+
+
+def iterSheet( queryset, fields, chunksize=500 ):
+    """
+    Generate the work sheet XML, one table row at a time.
+    @return generator of str
+    """
+    yield _SHEET_START
+    yield _row( 0, fields.keys(), style=1 )
+
+    for i, values in enumerate( iterValues( queryset, fields.values(),
+                                            chunksize=chunksize ) ):
+        yield _row( i+1, values )
+
+    yield _SHEET_END
+
+
+def iterXlsx( queryset, fields, chunksize=500, title='' ):
+    """
+    Generate an Excel workbook with a single sheet listing all objects
+    of a queryset.
+    @param queryset: QuerySet
+    @param fields: OrderedDict of { column title : column expression }
+                   (see csvexport)
+    @param chunksize: int, number of objects loaded from the database at once
+    @param title: str, sheet name (default: verbose model name)
+    @return generator of str -- blocks of the .xlsx file
+    """
+    title = title or unicode( queryset.model._meta.verbose_name_plural )
+    title = escape( ex_sheetname.sub( '', title )[:31] ).encode('utf-8')
+
+    z = ZipStream()
+    for name, content in [ ('[Content_Types].xml', _CONTENT_TYPES),
+                           ('_rels/.rels', _RELS),
+                           ('xl/workbook.xml', _WORKBOOK % title),
+                           ('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS),
+                           ('xl/styles.xml', _STYLES) ]:
+        for block in z.member( name, [content] ):
+            yield block
+
+    for block in z.member( 'xl/worksheets/sheet1.xml',
+                           iterSheet( queryset, fields, chunksize=chunksize ) ):
+        yield block
+
+    yield z.close()
@@ -4,3 +4,4 @@ from .xlsUpload import *
 from .uploads import *
 from .updates import *
 from .searchviews import *
+from .jobviews import *
@@ -0,0 +1,48 @@
+## Rotten Microbes (rotmic) -- Laboratory Sequence and Sample Management
+## Copyright 2013 - 2014 Raik Gruenberg
+
+## This file is part of the rotmic project (https://github.com/graik/rotmic).
+## rotmic is free software: you can redistribute it and/or modify
+## it under the terms of the GNU Affero General Public License as
+## published by the Free Software Foundation, either version 3 of the
+## License, or (at your option) any later version.
+
+## rotmic is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU Affero General Public License for more details.
+## You should have received a copy of the GNU Affero General Public
+## License along with rotmic. If not, see <http://www.gnu.org/licenses/>.
+from django.core.urlresolvers import reverse
+
+from django.http import HttpResponseRedirect
+from django.views.generic import TemplateView
+from django.shortcuts import render, get_object_or_404
+
+import django.contrib.messages as messages
+
+import rotmic.models as M
+
+
+class JobView(TemplateView):
+    """
+    Status page of a queued or running background job. Once the job has
+    finished, its report is converted into messages and the user is 
+    redirected to the table of affected records.
+    """
+    template_name = 'rotmic/job.html'
+    
+    def get(self, request, pk):
+        job = get_object_or_404(M.Job, pk=pk, user=request.user)
+        
+        if not job.isFinished():
+            return render( request, self.template_name, 
+                           {'job':job, 'model_name':job.modelName} )
+        
+        for level, msg in job.reportedMessages():
+            messages.add_message(request, level, msg)
+        
+        if job.modelName:
+            return HttpResponseRedirect(
+                reverse('admin:rotmic_%s_changelist' % job.modelName) )
+        return HttpResponseRedirect( reverse('admin:index') )
@@ -1,6 +1,7 @@
 from django.core import serializers
 import json
 from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
 
 import rotmic.models as M
 
@@ -27,7 +28,8 @@ def nextId(request, modelclass):
     mclass = M.__dict__[modelclass]
     cat = int(request.GET.get('category_id', -1))
     
-    r = {'id': I.nextId( mclass, request.user, category_id=cat )}
+    r = {'id': I.nextId( mclass, request.user, category_id=cat,
+                         session=request.session )}
     
     json_models = json.dumps(r)
     return HttpResponse(json_models, mimetype="application/json") 
@@ -49,4 +51,80 @@ def nextSampleId(request, container):
     """
     r = {'id': I.suggestSampleId( container ) }
     json_models = json.dumps(r)
-    return HttpResponse(json_models, mimetype="application/json") 
\ No newline at end of file
+    return HttpResponse(json_models, mimetype="application/json") 
+
+
+def containerGrid(request, pk):
+    """
+    request - request object
+    pk - int, pk of Container
+    @return json, samples arranged by position (see Container.sampleGrid)
+    """
+    o = get_object_or_404(M.Container, pk=pk)
+    grid = o.sampleGrid()
+    
+    def cell(position, samples):
+        return {'position': position, 
+                'samples': [ s.asDict() for s in samples ]}
+    
+    r = {'id': o.id, 'displayId': o.displayId, 'name': o.name,
+         'containerType': o.containerType,
+         'columns': grid['columns'],
+         'rows': [ {'label': label, 'cells': [ cell(*c) for c in cells ]}
+                   for label, cells in grid['rows'] ],
+         'unplaced': [ s.asDict() for s in grid['unplaced'] ] }
+
+    json_models = json.dumps(r)
+    return HttpResponse(json_models, mimetype="application/json")
+
+
+## upper limit of generations returned by samplePedigree
+MAX_PEDIGREE_DEPTH = 50
+
+def samplePedigree(request, pk):
+    """
+    request - request object, optional GET parameter depth (number of
+              generations in either direction, default M.PEDIGREE_DEPTH)
+    pk - int, pk of Sample
+    @return json, ancestors and descendants of the sample as graph of
+            samples (nodes) and provenance records (links)
+    """
+    o = get_object_or_404(M.Sample, pk=pk)
+    try:
+        depth = min( max( int(request.GET.get('depth', M.PEDIGREE_DEPTH)), 1 ),
+                     MAX_PEDIGREE_DEPTH )
+    except ValueError:
+        depth = M.PEDIGREE_DEPTH
+
+    p = o.pedigree( depth=depth )
+
+    nodes = []
+    for generation, samples in p['generations']:
+        for s in samples:
+            d = s.asDict()
+            d.update( {'label': unicode(s), 'generation': generation} )
+            nodes.append( d )
+
+    links = [ {'id': l.id, 'source': l.sourceSample_id, 'target': l.sample_id,
+               'generation': generation,
+               'type': unicode(l.provenanceType),
+               'description': l.description}
+              for l, generation in p['links'] ]
+
+    r = {'id': o.id, 'depth': depth, 'truncated': p['truncated'],
+         'nodes': nodes, 'links': links}
+
+    json_models = json.dumps(r)
+    return HttpResponse(json_models, mimetype="application/json")
+
+
+def jobStatus(request, pk):
+    """
+    request - request object
+    pk - int, pk of Job record
+    @return json, state of background job (see Job.asDict)
+    """
+    job = get_object_or_404(M.Job, pk=pk, user=request.user)
+    
+    json_models = json.dumps(job.asDict())
+    return HttpResponse(json_models, mimetype="application/json") 
@@ -15,4 +15,21 @@ def search_dnacomponent(request, model='dnacomponent'):
     context = {'filter': f,
                'model_name':model,
                'verbose_name':modelclass._meta.verbose_name}
-    return D.render_to_response('rotmic/rotmic_search.html', context)
\ No newline at end of file
+    return D.render_to_response('rotmic/rotmic_search.html', context)
+
+def search_sequence(request):
+    """Sequence search (see KmerIndex.search) in DNA constructs and oligos"""
+    form = S.SequenceSearchForm(request.GET or None)
+    hits = None
+
+    if form.is_valid():
+        models = [M.DnaComponent]
+        if form.cleaned_data['oligos']:
+            models += [M.OligoComponent]
+        hits = M.KmerIndex.search(form.cleaned_data['sequence'], models=models)
+
+    context = {'form': form,
+               'hits': hits,
+               'model_name':'dnacomponent',
+               'verbose_name':M.DnaComponent._meta.verbose_name}
+    return D.render_to_response('rotmic/rotmic_sequencesearch.html', context)
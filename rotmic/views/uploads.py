@@ -21,12 +21,13 @@ from django.shortcuts import render
 from django.forms import ValidationError
 
 import django.contrib.messages as messages
-from django.db import transaction
 import django.db.utils as U
 
 import rotmic.models as M
+import rotmic.utils.jobs as J
 
-from rotmic.forms import TracesUploadForm, GenbankUploadForm, GenbankProteinUploadForm
+from rotmic.forms import TracesUploadForm, GenbankUploadForm, GenbankProteinUploadForm,\
+     LibraryUploadForm, ProteinLibraryUploadForm
 
 class TracesUploadView(TemplateView):
     """Attach ABL sequencing trace files to existing Sequencing records"""
@@ -74,25 +75,29 @@ class TracesUploadView(TemplateView):
             if form._errors:
                 raise ValidationError('post-form mapping error')
             
-            try:
-                with transaction.atomic():
-                    
-                    for sample, traces in d.items():
-                        form.createSeq(sample, traces)
-                        messages.success(request, 
-                            u'Attached new sequencing record with %i trace files to sample %s' \
-                            % (len(traces), unicode(sample)), 
-                            extra_tags='', 
-                            fail_silently=False)
-                
-            except Exception, why:
-                messages.error(request, 'Some unforeseen error occured. All imports are reverted. Reason: ' + str(why))
+            ## keep matched trace files for the background job
+            traces, samples = [], {}
+            for sample, sfiles in d.items():
+                samples[sample.id] = range(len(traces), len(traces) + len(sfiles))
+                traces += sfiles
+            
+            data = form.cleaned_data
+            job = J.enqueue('traces', request.user, 
+                            title='%i trace files' % len(traces),
+                            modelName=self.model._meta.object_name.lower(),
+                            files=traces, samples=samples,
+                            matchPrimer=data['matchPrimer'],
+                            orderedBy=data['orderedBy'].id,
+                            orderedAt=data['orderedAt'].isoformat(),
+                            evaluation=data['evaluation'],
+                            comments=data['comments'] )
+            J.start(job)
 
         except ValidationError, why:
             ## re-display with error messages
             return self.renderForm(request, form)
                 
-        return HttpResponseRedirect(reverse(self.returnto()))
+        return HttpResponseRedirect(job.get_absolute_url())
 
 
 
@@ -141,26 +146,19 @@ class GbkUploadView(TemplateView):
             if form._errors:
                 raise ValidationError('post-form mapping error')
             
-            try:
-                with transaction.atomic():
-                    
-                    for dna, gb in d.items():
-                        replaced = form.replaceGenbank(dna, gb)
-                        msg = u'Replaced genbank record in' if replaced else u'Attached new genbank record to'
-                        
-                        messages.success(request, 
-                            msg + ' construct %s' % unicode(dna), 
-                            extra_tags='', 
-                            fail_silently=False)
-                
-            except Exception, why:
-                messages.error(request, 'Some unforeseen error occured. All imports are reverted. Reason: ' + str(why))
+            records = [ (dna.id, gb.original) for dna, gb in d.items() ]
+            
+            job = J.enqueue('genbank', request.user, 
+                            title='%i genbank records' % len(records),
+                            modelName=self.model._meta.object_name.lower(),
+                            model=self.model.__name__, records=records )
+            J.start(job)
 
         except ValidationError, why:
             ## re-display with error messages
             return self.renderForm(request, form)
                 
-        return HttpResponseRedirect(reverse(self.returnto()))
+        return HttpResponseRedirect(job.get_absolute_url())
 
 
 class GbkProteinUploadView(GbkUploadView):
@@ -170,3 +168,48 @@ class GbkProteinUploadView(GbkUploadView):
     form_class = GenbankProteinUploadForm
     
     model = M.ProteinComponent
+
+
+class LibraryUploadView(GbkUploadView):
+    """
+    Attach the records of one multi-record genbank or FASTA file to existing
+    dnacomponent records or register them as new records
+    """
+    template_name = 'rotmic/upload/uploadLibrary.html'
+
+    form_class = LibraryUploadForm
+
+    model = M.DnaComponent
+
+    def get(self, request):
+        """Create new form"""
+        form = self.form_class(request=request)
+        return self.renderForm(request, form)
+
+    def post(self, request, *args, **kwargs):
+        form = self.form_class(request.POST, request.FILES, request=request)
+
+        if not form.is_valid():
+            ## re-display with error messages
+            return self.renderForm(request, form)
+
+        data = form.cleaned_data
+        f = data['library']
+        job = J.enqueue('library', request.user, title=f.name,
+                        modelName=self.model._meta.object_name.lower(),
+                        files=[f], model=self.model.__name__,
+                        create=data['create'],
+                        componentType=data['componentType'].id if data['componentType'] else None,
+                        status=data['status'] )
+        J.start(job)
+
+        return HttpResponseRedirect(job.get_absolute_url())
+
+
+class ProteinLibraryUploadView(LibraryUploadView):
+
+    template_name = 'rotmic/upload/uploadProteinLibrary.html'
+
+    form_class = ProteinLibraryUploadForm
+
+    model = M.ProteinComponent
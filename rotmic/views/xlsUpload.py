@@ -20,11 +20,11 @@ from django.views.generic import TemplateView
 from django.shortcuts import render
 
 import django.contrib.messages as messages
-from django.db import transaction
 import django.db.utils as U
 
 import rotmic.models as M
 import rotmic.utils.importExcel as I
+import rotmic.utils.jobs as J
 
 from rotmic.forms import TableUploadForm
 
@@ -53,6 +53,9 @@ class XlsUploadView(TemplateView):
                                         self.model._meta.object_name.lower())
         return s
     
+    ## number of table rows validated and saved at once
+    chunksize = 100
+    
     ## see: https://github.com/axelpale/minimal-django-file-upload-example/blob/master/src/for_django_1-5/myproject/myproject/myapp/views.py
     def post(self, request, *args, **kwargs):
         form = self.form_class(request.POST, request.FILES)
@@ -60,36 +63,16 @@ class XlsUploadView(TemplateView):
             
             f = request.FILES['tableFile']
             
-            try:
-                with transaction.atomic():
-                    
-                    p = self.parser_class(f, request.user, request=request)
-                    p.getObjects(commit=True)
-                
-                    if p.failed:
-                        s = 'Import of %s failed. Correct errors and try again. (Nothing has been imported.)\n' \
-                            % (f.name)
-                        messages.error(request, s)
-                        
-                        for d in p.failed:
-                            id = d.get('displayId', '??')
-                            errors = ['%s (%s)' % (k,v) for k,v in d['errors'].items() ]
-                            errors = '; '.join(errors)
-        
-                            msg = 'Import error(s) for entry "%s": %s' % (id, errors)
-                            messages.error(request, msg)
-                        
-                        raise I.ImportError  ## reverts all transactions
-        
-                    for o in p.objects:
-                        msg = 'Successfully imported %s.' % unicode(o)
-                        messages.success(request, msg )
+            job = J.enqueue('xlsimport', request.user, title=f.name,
+                            modelName=self.model._meta.object_name.lower(),
+                            files=[f], 
+                            parser=self.parser_class.__name__,
+                            atomic=form.cleaned_data['atomic'],
+                            update=form.cleaned_data['update'],
+                            chunksize=self.chunksize )
+            J.start(job)
             
-            except I.ImportError:
-                pass  ## error message is already on top of messages stack
-                
-            except Exception, why:
-                messages.error(request, 'Some unforeseen error occured. All imports are reverted. Reason: ' + str(why))
+            return HttpResponseRedirect( job.get_absolute_url() )
 
         else:
             messages.error(request, 'No Excel file given.')
@@ -11,6 +11,7 @@ PROJECT_ROOT = osp.dirname(osp.dirname(__file__))
 # distinguish development from production server
 import sys
 RUNNING_DEV_SERVER = ('runserver' in sys.argv)
+RUNNING_TESTS = (sys.argv[1:2] == ['test'])
 
 TEMPLATE_DEBUG = RUNNING_DEV_SERVER
 
@@ -24,6 +25,36 @@ USE_S3_STORAGE = not RUNNING_DEV_SERVER
 
 #USE_S3_STORAGE = True
 
+def envFlag(name, default=False):
+    """True unless environment variable name is empty, 0, false, no or off"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+# background jobs (uploads) run in a thread of the web server by default;
+# JOBS_IN_WORKER=1 leaves them to a separate worker process instead
+# (./manage.py runjobs -- e.g. a worker dyno running this command)
+JOBS_IN_WORKER = envFlag('JOBS_IN_WORKER', False)
+
+# run jobs within the request -- a thread would not see the test database
+JOBS_SYNCHRONOUS = RUNNING_TESTS
+
+# seconds without progress after which a running job counts as interrupted
+# (e.g. by a restart of its worker) and is marked as failed
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 3600))
+
+# process pools of background jobs -- only used in job workers (runjobs)
+
+# worker processes analysing uploaded sequencing trace files
+TRACE_PROCESSES = int(os.environ.get('TRACE_PROCESSES', 4))
+
+# worker processes parsing uploaded genbank records
+GENBANK_PROCESSES = int(os.environ.get('GENBANK_PROCESSES', 4))
+
+# worker processes scanning DNA sequences for primer binding sites
+PRIMER_PROCESSES = int(os.environ.get('PRIMER_PROCESSES', 1))
+
 ###############################
 ## Database and related config
 
@@ -20,6 +20,15 @@ urlpatterns = patterns('',
 
     url(r'^rotmic/ajax/nextSampleId/(?P<container>.+)/$', 
         V.nextSampleId, name='nextSampleId' ),
+
+    url(r'^rotmic/ajax/containerGrid/(?P<pk>\d+)/$', 
+        V.containerGrid, name='containerGrid' ),
+
+    url(r'^rotmic/ajax/samplePedigree/(?P<pk>\d+)/$', 
+        V.samplePedigree, name='samplePedigree' ),
+
+    url(r'^rotmic/ajax/job/(?P<pk>\d+)/$', 
+        V.jobStatus, name='jobStatus' ),
     
     ## autocomplete fields javascript
     url(r'^selectable/', include('selectable.urls')),
@@ -48,8 +57,13 @@ urlpatterns = patterns('',
     ## genbank and trace file bulk upload
     url(r'^rotmic/upload/genbank/$', V.GbkUploadView.as_view(), name='upload_genbank'),
     url(r'^rotmic/upload/genbankaa/$', V.GbkProteinUploadView.as_view(), name='upload_proteingenbank'),
+    url(r'^rotmic/upload/library/$', V.LibraryUploadView.as_view(), name='upload_library'),
+    url(r'^rotmic/upload/libraryaa/$', V.ProteinLibraryUploadView.as_view(), name='upload_proteinlibrary'),
     url(r'^rotmic/upload/tracefiles/$', V.TracesUploadView.as_view(), name='upload_tracefiles'),
 
+    ## status of background jobs (uploads)
+    url(r'^rotmic/job/(?P<pk>\d+)/$', V.JobView.as_view(), name='job'),
+
     ## other
     (r'^comments/', include('ratedcomments.urls')),
 
@@ -57,6 +71,7 @@ urlpatterns = patterns('',
     url(r'^rotmic/update/(?P<model>.+)/$', V.UpdateManyView.as_view(), name='update_many'),  
     
     ## search dialog
+    url(r'^rotmic/search/sequence/$', V.search_sequence, name='search_sequence'),
     url(r'^rotmic/search/(?P<model>.+)/$', V.search_dnacomponent, name='search'),
 
     url(r'^', include(admin.site.urls)),